@@ -0,0 +1,60 @@
+import base64
+
+from app.services.pose_scoring.pose_scorer import PoseScorer
+from app.services.pose_scoring.template_store import TemplateStore
+from app.services.weapon_detection.weapon_detector import WeaponFrameTap
+
+
+class VideoAnalyzer:
+    """Nhận diện vũ khí và chấm pose trên cùng một lần giải mã video (/analyze).
+
+    Frame của pipeline chấm pose được chia sẻ cho nhận diện vũ khí qua
+    WeaponFrameTap (lấy mẫu theo WEAPON_SAMPLE_STRIDE / WEAPON_MAX_SAMPLES,
+    dừng sớm khi đủ phiếu). Không chấm được pose thì "pose" là None kèm
+    "pose_error", kết quả vũ khí vẫn được trả về; model vũ khí không nạp được
+    thì "weapon" là None kèm "weapon_error".
+    """
+
+    @classmethod
+    def analyze(cls, student_video_path: str, teacher_template_path: str, target_fps: float = None,
+                max_frames: int = None, teacher_fps: float = None, teacher_bundle_path: str = None,
+                dtw_backend: str = None, return_keypoints: bool = False) -> dict:
+        """ValueError nếu không mở được video học viên."""
+        weapon_error = None
+        try:
+            tap = WeaponFrameTap(student_video_path)
+        except ValueError:
+            raise
+        except Exception as e:
+            # Model vũ khí không nạp được thì vẫn chấm pose
+            tap, weapon_error = None, str(e)
+            print(f"[Analyze] Weapon model unavailable: {e}", flush=True)
+
+        pose, pose_error = None, None
+        try:
+            pose = PoseScorer.score_video(
+                student_video_path,
+                teacher_template_path,
+                target_fps=target_fps,
+                max_frames=max_frames,
+                teacher_fps=teacher_fps,
+                teacher_bundle_path=teacher_bundle_path,
+                dtw_backend=dtw_backend,
+                return_keypoints=return_keypoints,
+                on_batch=tap,
+            )
+        except ValueError as e:
+            pose_error = str(e)
+            print(f"[Analyze] Pose scoring failed: {e}", flush=True)
+
+        if pose is not None and return_keypoints:
+            keypoints_bytes = TemplateStore.template_to_bytes(pose.pop("keypoints"))
+            pose["keypoints"] = base64.b64encode(keypoints_bytes).decode("utf-8")
+            pose["keypoints_format"] = "normalized"
+
+        result = {"weapon": tap.result() if tap is not None else None, "pose": pose}
+        if pose_error is not None:
+            result["pose_error"] = pose_error
+        if weapon_error is not None:
+            result["weapon_error"] = weapon_error
+        return result
@@ -0,0 +1,110 @@
+import os
+import numpy as np
+from config import ModalConfig
+
+# Kết quả suy luận dạng numpy, chung cho mọi backend:
+# xyxy (K, 4) và keypoints (K, 17, 3) theo toạ độ pixel của frame gốc,
+# sắp theo confidence giảm dần như Ultralytics.
+
+
+class Predictions:
+    __slots__ = ("xyxy", "conf", "cls", "keypoints")
+
+    def __init__(self, xyxy, conf, cls, keypoints=None):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.keypoints = keypoints
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class TorchBackend:
+    """Suy luận qua Ultralytics/PyTorch (mặc định, dùng GPU nếu có)."""
+    name = "torch"
+
+    def __init__(self, weights, variant: str = "fp32", imgsz: int = 640):
+        from ultralytics import YOLO
+        if variant not in ("fp32", "fp16"):
+            raise ValueError(f"Variant '{variant}' is only available with the onnx backend")
+        self.model = YOLO(weights)
+        self.names = self.model.names
+        # fp16 chỉ có tác dụng trên GPU, Ultralytics tự bỏ qua khi chạy CPU
+        self.half = variant == "fp16"
+        self.imgsz = imgsz
+
+    @staticmethod
+    def _convert(r) -> Predictions:
+        boxes = r.boxes
+        if boxes is None:
+            empty = np.zeros((0,), dtype=np.float32)
+            pred = Predictions(np.zeros((0, 4), dtype=np.float32), empty, empty.astype(np.int64))
+        else:
+            # Chuyển cả tensor sang numpy một lần thay vì từng box
+            pred = Predictions(
+                boxes.xyxy.cpu().numpy(),
+                boxes.conf.cpu().numpy(),
+                boxes.cls.cpu().numpy().astype(np.int64),
+            )
+        if r.keypoints is not None:
+            pred.keypoints = r.keypoints.data.cpu().numpy()
+        return pred
+
+    def predict(self, source):
+        return [self._convert(r) for r in self.model(source, verbose=False, half=self.half, imgsz=self.imgsz)]
+
+
+def _onnx_artifact(weights, variant: str, imgsz: int, build: bool) -> str:
+    from app.services.inference.onnx_runtime import export_onnx
+    from app.services.inference.quantization import ensure_variant
+    return ensure_variant(export_onnx(weights, imgsz, build=build), variant, build=build)
+
+
+def _onnx_backend(weights, variant: str = "fp32", imgsz: int = 640):
+    # onnxruntime chỉ cần khi chọn backend này
+    from app.services.inference.onnx_runtime import OnnxBackend
+    # File .onnx / variant được tạo lúc build image; lúc chạy chỉ nạp (trừ khi QUANT_BUILD_ON_LOAD)
+    path = _onnx_artifact(weights, variant, imgsz, build=ModalConfig.QUANT_BUILD_ON_LOAD)
+    return OnnxBackend(path, imgsz=imgsz)
+
+
+_BACKENDS = {
+    "torch": TorchBackend,
+    "onnx": _onnx_backend,
+}
+
+
+def available_backends():
+    return sorted(_BACKENDS)
+
+
+def prepare_backend(weights, backend: str = None, variant: str = None, imgsz: int = None):
+    """Tạo trước các file model cần cho backend/variant (xuất ONNX, lượng tử hoá).
+
+    Gọi lúc build image để container chỉ phải nạp file có sẵn. Trả về đường dẫn
+    file sẽ được nạp, None nếu backend không cần file phụ (torch).
+    """
+    backend = (backend or ModalConfig.INFERENCE_BACKEND).lower()
+    variant = (variant or "fp32").lower()
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Available: {', '.join(available_backends())}")
+    if backend != "onnx":
+        return None
+    return _onnx_artifact(weights, variant, int(imgsz or 640), build=True)
+
+
+def load_backend(weights, backend: str = None, variant: str = None, imgsz: int = None):
+    """Nạp model YOLO (.pt hoặc tên model Ultralytics) qua backend và variant đã cấu hình.
+
+    imgsz là cạnh dài của ảnh đưa vào model (frame được letterbox về kích thước này).
+    """
+    backend = (backend or ModalConfig.INFERENCE_BACKEND).lower()
+    variant = (variant or "fp32").lower()
+    imgsz = int(imgsz or 640)
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Available: {', '.join(available_backends())}")
+    model = _BACKENDS[backend](weights, variant, imgsz)
+    model.variant = variant
+    print(f"[Inference] {os.path.basename(str(weights))} -> {model.name} ({variant}, imgsz={imgsz})", flush=True)
+    return model
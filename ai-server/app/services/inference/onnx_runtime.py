@@ -0,0 +1,150 @@
+import ast
+import os
+import cv2
+import numpy as np
+import onnxruntime as ort
+from config import ModalConfig
+from app.services.inference.backends import Predictions
+
+# Giống tham số predict mặc định của Ultralytics để kết quả khớp với backend torch
+CONF_THRES = 0.25
+IOU_THRES = 0.7
+MAX_DET = 300
+MAX_WH = 7680
+STRIDE = 32
+# Ultralytics đặt x, y = 0 cho keypoint có độ tin cậy < 0.5
+KPT_VISIBLE_THRES = 0.5
+
+
+def export_onnx(weights, imgsz: int = 640, build: bool = True) -> str:
+    """Xuất .pt sang .onnx cạnh file weights; bỏ qua nếu đã có sẵn.
+
+    build=False: chỉ trả về file đã xuất sẵn (lúc build image), không xuất lúc chạy.
+    """
+    onnx_path = os.path.splitext(str(weights))[0] + ".onnx"
+    if os.path.exists(onnx_path):
+        return onnx_path
+    if not build:
+        raise FileNotFoundError(
+            f"ONNX model not found: {onnx_path}. Build it ahead of time (build_model_variants "
+            f"in deploy.py) or set QUANT_BUILD_ON_LOAD=true"
+        )
+    from ultralytics import YOLO
+    print(f"[Inference] Exporting {weights} to ONNX", flush=True)
+    # dynamic: batch và kích thước ảnh tuỳ ý, để letterbox chỉ pad tới bội số của stride
+    return str(YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True))
+
+
+def read_metadata(session) -> dict:
+    """names / kpt_shape / imgsz mà Ultralytics ghi vào metadata khi export."""
+    meta = session.get_modelmeta().custom_metadata_map
+    return {
+        "names": ast.literal_eval(meta["names"]) if "names" in meta else {},
+        "kpt_shape": tuple(ast.literal_eval(meta["kpt_shape"])) if "kpt_shape" in meta else None,
+        "imgsz": max(ast.literal_eval(meta["imgsz"])) if "imgsz" in meta else 640,
+    }
+
+
+def letterbox(img, imgsz: int):
+    """Resize giữ tỉ lệ + pad (114) như LetterBox(auto=True) của Ultralytics."""
+    h, w = img.shape[:2]
+    r = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * r)), int(round(h * r))
+    dw, dh = (imgsz - new_w) % STRIDE / 2, (imgsz - new_h) % STRIDE / 2
+    if (new_w, new_h) != (w, h):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return img, r, (left, top)
+
+
+class OnnxBackend:
+    """Suy luận YOLOv8 (detect/pose) bằng ONNX Runtime, hậu xử lý bằng numpy."""
+    name = "onnx"
+
+    def __init__(self, onnx_path, threads: int = None, providers=None, imgsz: int = None):
+        opts = ort.SessionOptions()
+        threads = ModalConfig.ONNX_INTRA_OP_THREADS if threads is None else threads
+        if threads > 0:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            onnx_path, sess_options=opts, providers=providers or ModalConfig.ONNX_PROVIDERS
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        meta = read_metadata(self.session)
+        self.names = meta["names"]
+        self.kpt_shape = meta["kpt_shape"]
+        # Model xuất với dynamic=True nên có thể chạy ở imgsz khác lúc export
+        self.imgsz = imgsz or meta["imgsz"]
+
+    @staticmethod
+    def _load_frames(source):
+        if isinstance(source, str):
+            img = cv2.imread(source)
+            if img is None:
+                raise ValueError(f"Cannot read image: {source}")
+            return [img]
+        if isinstance(source, np.ndarray) and source.ndim == 3:
+            return [source]
+        return list(source)
+
+    def _preprocess(self, frames):
+        boxed = [letterbox(f, self.imgsz) for f in frames]
+        # Các frame cùng video cùng kích thước; khác kích thước thì chạy riêng từng ảnh
+        if len({b[0].shape for b in boxed}) > 1:
+            return None, boxed
+        x = np.stack([b[0] for b in boxed])[..., ::-1].transpose(0, 3, 1, 2)
+        return np.ascontiguousarray(x, dtype=np.float32) / 255.0, boxed
+
+    def _postprocess(self, out, frame_shape, gain, pad) -> Predictions:
+        nc = len(self.names)
+        pred = out.T
+        scores = pred[:, 4:4 + nc]
+        cls = scores.argmax(axis=1)
+        conf = scores[np.arange(len(pred)), cls]
+        keep = conf > CONF_THRES
+        pred, cls, conf = pred[keep], cls[keep], conf[keep]
+
+        xy, wh = pred[:, :2], pred[:, 2:4]
+        xyxy = np.concatenate([xy - wh / 2, xy + wh / 2], axis=1)
+        if len(pred):
+            # NMS theo từng lớp: dịch box của mỗi lớp ra một vùng riêng
+            shifted = xyxy + (cls * MAX_WH)[:, None]
+            rects = np.concatenate([shifted[:, :2], shifted[:, 2:] - shifted[:, :2]], axis=1)
+            idx = cv2.dnn.NMSBoxes(rects.tolist(), conf.tolist(), CONF_THRES, IOU_THRES)
+            idx = np.asarray(idx, dtype=np.int64).reshape(-1)[:MAX_DET]
+        else:
+            idx = np.zeros((0,), dtype=np.int64)
+
+        h, w = frame_shape[:2]
+        xyxy = xyxy[idx]
+        xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - pad[0]) / gain).clip(0, w)
+        xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - pad[1]) / gain).clip(0, h)
+        result = Predictions(xyxy.astype(np.float32), conf[idx].astype(np.float32), cls[idx].astype(np.int64))
+
+        if self.kpt_shape:
+            kpts = pred[idx, 4 + nc:].reshape(len(idx), *self.kpt_shape).astype(np.float32)
+            kpts[..., 0] = ((kpts[..., 0] - pad[0]) / gain).clip(0, w)
+            kpts[..., 1] = ((kpts[..., 1] - pad[1]) / gain).clip(0, h)
+            if self.kpt_shape[1] == 3:
+                kpts[..., :2][kpts[..., 2] < KPT_VISIBLE_THRES] = 0
+            result.keypoints = kpts
+        return result
+
+    def _run(self, x):
+        return self.session.run(None, {self.input_name: x})[0]
+
+    def predict(self, source):
+        frames = self._load_frames(source)
+        if not frames:
+            return []
+        x, boxed = self._preprocess(frames)
+        if x is not None:
+            outs = self._run(x)
+        else:
+            outs = [self._run(self._preprocess([f])[0])[0] for f in frames]
+        return [
+            self._postprocess(out, f.shape, gain, pad)
+            for out, f, (_, gain, pad) in zip(outs, frames, boxed)
+        ]
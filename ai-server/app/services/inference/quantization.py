@@ -0,0 +1,121 @@
+import glob
+import os
+import cv2
+import numpy as np
+from config import ModalConfig
+from app.services.inference.onnx_runtime import letterbox, read_metadata
+
+# fp32: model xuất gốc; fp16: cho GPU (CUDAExecutionProvider);
+# int8_dynamic / int8_static: cho CPU, static cần frame hiệu chỉnh từ video giáo viên
+VARIANTS = ("fp32", "fp16", "int8_dynamic", "int8_static")
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+
+
+def variant_path(onnx_path: str, variant: str) -> str:
+    if variant == "fp32":
+        return onnx_path
+    return f"{os.path.splitext(onnx_path)[0]}_{variant}.onnx"
+
+
+def calibration_frames(source, count: int = None):
+    """Lấy đều `count` frame từ các video giáo viên (thư mục hoặc danh sách file)."""
+    count = count or ModalConfig.QUANT_CALIBRATION_FRAMES
+    if isinstance(source, str):
+        paths = sorted(p for p in glob.glob(os.path.join(source, "**", "*"), recursive=True)
+                       if p.lower().endswith(VIDEO_EXTS))
+    else:
+        paths = list(source)
+    if not paths:
+        raise ValueError(f"No calibration videos found in {source}")
+    per_video = max(1, count // len(paths))
+    frames = []
+    for path in paths:
+        cap = cv2.VideoCapture(path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        for idx in np.linspace(0, max(total - 1, 0), per_video).astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(idx))
+            ok, frame = cap.read()
+            if ok:
+                frames.append(frame)
+        cap.release()
+    if not frames:
+        raise ValueError(f"Could not read calibration frames from {source}")
+    return frames[:count]
+
+
+class _CalibrationReader:
+    # Giao diện CalibrationDataReader của onnxruntime.quantization
+    def __init__(self, input_name, frames, imgsz):
+        self.input_name = input_name
+        self.frames = frames
+        self.imgsz = imgsz
+        self._it = iter(frames)
+
+    def get_next(self):
+        frame = next(self._it, None)
+        if frame is None:
+            return None
+        img = letterbox(frame, self.imgsz)[0][..., ::-1].transpose(2, 0, 1)[None]
+        return {self.input_name: np.ascontiguousarray(img, dtype=np.float32) / 255.0}
+
+    def rewind(self):
+        self._it = iter(self.frames)
+
+
+def _build_fp16(src, dst):
+    import onnx
+    from onnxconverter_common import float16
+    model = float16.convert_float_to_float16(onnx.load(src), keep_io_types=True)
+    onnx.save(model, dst)
+
+
+def _build_int8_dynamic(src, dst):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(src, dst, weight_type=QuantType.QUInt8)
+
+
+def _build_int8_static(src, dst, frames=None):
+    import onnxruntime as ort
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+    if frames is None:
+        if not ModalConfig.QUANT_CALIBRATION_DIR:
+            raise ValueError("int8_static needs calibration videos (QUANT_CALIBRATION_DIR)")
+        frames = calibration_frames(ModalConfig.QUANT_CALIBRATION_DIR)
+    session = ort.InferenceSession(src, providers=["CPUExecutionProvider"])
+    imgsz = read_metadata(session)["imgsz"]
+    print(f"[Inference] Calibrating {os.path.basename(src)} on {len(frames)} frames", flush=True)
+    quantize_static(
+        src, dst, _CalibrationReader(session.get_inputs()[0].name, frames, imgsz),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+
+
+_BUILDERS = {
+    "fp16": _build_fp16,
+    "int8_dynamic": _build_int8_dynamic,
+    "int8_static": _build_int8_static,
+}
+
+
+def ensure_variant(onnx_path: str, variant: str, rebuild: bool = False, build: bool = True, **options) -> str:
+    """Trả về file .onnx của variant, tạo từ bản fp32 nếu chưa có.
+
+    build=False: chỉ nạp file đã tạo sẵn, thiếu thì báo lỗi thay vì lượng tử hoá
+    (và hiệu chỉnh int8_static) ngay trên đường khởi động container.
+    """
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown model variant '{variant}'. Available: {', '.join(VARIANTS)}")
+    path = variant_path(onnx_path, variant)
+    if variant == "fp32" or (os.path.exists(path) and not rebuild):
+        return path
+    if not build:
+        raise FileNotFoundError(
+            f"Model variant not found: {path}. Build it ahead of time (build_model_variants "
+            f"in deploy.py) or set QUANT_BUILD_ON_LOAD=true"
+        )
+    print(f"[Inference] Building {variant} variant of {os.path.basename(onnx_path)}", flush=True)
+    _BUILDERS[variant](onnx_path, path, **options)
+    return path
@@ -0,0 +1,186 @@
+import numpy as np
+
+
+def frame_distance_matrix(seqA, seqB):
+    # ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b  -> một lần gọi BLAS thay vì n*m lần np.linalg.norm
+    a = np.asarray(seqA, dtype=np.float64).reshape(len(seqA), -1)
+    b = np.asarray(seqB, dtype=np.float64).reshape(len(seqB), -1)
+    sq = np.einsum('ij,ij->i', a, a)[:, None] + np.einsum('ij,ij->i', b, b)[None, :] - 2.0 * (a @ b.T)
+    np.maximum(sq, 0.0, out=sq)
+    return np.sqrt(sq, out=sq)
+
+
+def band_limits(n, m, band=None):
+    # Sakoe-Chiba: |i - j| <= w, w nới ra ít nhất |n - m| để (n, m) luôn tới được
+    if not band:
+        return np.zeros(n, dtype=np.int64), np.full(n, m - 1, dtype=np.int64)
+    w = max(int(band), abs(n - m))
+    rows = np.arange(n)
+    lo = np.clip(rows - w, 0, m - 1)
+    hi = np.clip(rows + w, 0, m - 1)
+    return lo, hi
+
+
+def accumulate_cost(dist, lo, hi, keep_rows=False):
+    """Trả về chi phí DTW tích lũy tại ô cuối của hàng cuối.
+
+    `dist(i, lo, hi)` trả về khoảng cách khung i tới các khung lo..hi của chuỗi
+    còn lại. Mỗi hàng được tính bằng NumPy: phần phụ thuộc trong hàng
+    cost[i, j - 1] là một phép quét min-plus, viết lại thành
+    S[j] + min_{k<=j}(c[k] - S[k]) với S là tổng tích lũy của hàng.
+
+    Với `keep_rows=True` trả thêm danh sách các hàng chi phí để dò ngược đường đi.
+    """
+    rows = [] if keep_rows else None
+    prev = None
+    prev_lo = prev_hi = 0
+    for i in range(len(lo)):
+        l, h = int(lo[i]), int(hi[i])
+        d = dist(i, l, h)
+        c = np.full(h - l + 1, np.inf)
+        if i == 0:
+            # hàng đầu chỉ đi được từ trái sang
+            if l == 0:
+                c[0] = d[0]
+        else:
+            # cost[i-1, j]
+            a, b = max(l, prev_lo), min(h, prev_hi)
+            if a <= b:
+                c[a - l:b - l + 1] = prev[a - prev_lo:b - prev_lo + 1]
+            # cost[i-1, j-1]
+            a, b = max(l, prev_lo + 1), min(h, prev_hi + 1)
+            if a <= b:
+                np.minimum(c[a - l:b - l + 1], prev[a - 1 - prev_lo:b - prev_lo], out=c[a - l:b - l + 1])
+            c += d
+        s = np.cumsum(d)
+        prev = s + np.minimum.accumulate(c - s)
+        prev_lo, prev_hi = l, h
+        if keep_rows:
+            rows.append(prev)
+    if keep_rows:
+        return float(prev[-1]), rows
+    return float(prev[-1])
+
+
+def dtw_step(prev, d):
+    """Thêm một hàng vào ma trận chi phí DTW (không band): `prev` là hàng trước (None nếu là hàng đầu),
+    `d` là khoảng cách của khung mới tới mọi khung của chuỗi còn lại. Cùng phép tính với accumulate_cost."""
+    c = np.full(len(d), np.inf)
+    if prev is None:
+        c[0] = d[0]
+    else:
+        c[:] = prev
+        np.minimum(c[1:], prev[:-1], out=c[1:])
+        c += d
+    s = np.cumsum(d)
+    return s + np.minimum.accumulate(c - s)
+
+
+def backtrack(rows, lo, hi):
+    """Dò ngược đường đi tối ưu từ các hàng chi phí, trả về mảng (k, 2) cặp (i, j)."""
+
+    def cost(i, j):
+        if i < 0 or j < lo[i] or j > hi[i]:
+            return np.inf
+        return rows[i][j - lo[i]]
+
+    i, j = len(rows) - 1, int(hi[-1])
+    path = [(i, j)]
+    while i > 0 or j > 0:
+        candidates = ((cost(i - 1, j - 1), i - 1, j - 1), (cost(i - 1, j), i - 1, j), (cost(i, j - 1), i, j - 1))
+        _, i, j = min(candidates, key=lambda c: c[0])
+        path.append((i, j))
+    return np.array(path[::-1], dtype=np.int64)
+
+
+def dtw_distance(seqA, seqB, band=None, return_path=False):
+    n, m = len(seqA), len(seqB)
+    if n == 0 or m == 0:
+        return (np.inf, None) if return_path else np.inf
+    D = frame_distance_matrix(seqA, seqB)
+    lo, hi = band_limits(n, m, band)
+    dist = lambda i, l, h: D[i, l:h + 1]  # noqa: E731
+    if not return_path:
+        return accumulate_cost(dist, lo, hi) / (n + m)
+    total, rows = accumulate_cost(dist, lo, hi, keep_rows=True)
+    return total / (n + m), backtrack(rows, lo, hi)
+
+
+def downsample(seq, factor=2):
+    """Gộp mỗi `factor` frame liên tiếp thành trung bình của chúng (frame lẻ cuối được giữ riêng)."""
+    seq = np.asarray(seq, dtype=np.float64).reshape(len(seq), -1)
+    n = len(seq)
+    full = n // factor * factor
+    out = seq[:full].reshape(-1, factor, seq.shape[1]).mean(axis=1)
+    if full < n:
+        out = np.vstack([out, seq[full:].mean(axis=0, keepdims=True)])
+    return out
+
+
+def project_corridor(path, n, m, factor=2, radius=1):
+    """Hành lang (lo, hi) trên lưới n x m quanh đường đi của tầng thô hơn `factor` lần.
+
+    Mỗi ô (i, j) của đường đi thô phủ khối factor x factor ô ở tầng mịn; hành
+    lang được nới thêm `radius` ô theo cả hai chiều, giống FastDTW.
+    """
+    lo = np.full(n, m, dtype=np.int64)
+    hi = np.full(n, -1, dtype=np.int64)
+    for k in range(factor):
+        rows = np.minimum(path[:, 0] * factor + k, n - 1)
+        np.minimum.at(lo, rows, path[:, 1] * factor)
+        np.maximum.at(hi, rows, np.minimum(path[:, 1] * factor + factor - 1, m - 1))
+    if radius > 0:
+        pad_lo = np.concatenate([np.full(radius, m), lo, np.full(radius, m)])
+        pad_hi = np.concatenate([np.full(radius, -1), hi, np.full(radius, -1)])
+        window = 2 * radius + 1
+        lo = np.lib.stride_tricks.sliding_window_view(pad_lo, window).min(axis=1) - radius
+        hi = np.lib.stride_tricks.sliding_window_view(pad_hi, window).max(axis=1) + radius
+    return np.clip(lo, 0, m - 1), np.clip(hi, 0, m - 1)
+
+
+def corridor_distances(a, b, lo, hi, chunk_cells=1 << 16):
+    """Khoảng cách của mọi ô trong hành lang, trải phẳng theo hàng: hàng i là cells[offsets[i]:offsets[i + 1]]."""
+    widths = hi - lo + 1
+    offsets = np.concatenate([[0], np.cumsum(widths)])
+    rows = np.repeat(np.arange(len(lo)), widths)
+    cols = lo[rows] + np.arange(offsets[-1]) - offsets[rows]
+    sq_a = np.einsum('ij,ij->i', a, a)
+    sq_b = np.einsum('ij,ij->i', b, b)
+    cells = np.empty(offsets[-1])
+    # Chia khối để mảng gom (cells, d) không chiếm quá nhiều bộ nhớ
+    for s in range(0, len(cells), chunk_cells):
+        r, c = rows[s:s + chunk_cells], cols[s:s + chunk_cells]
+        cells[s:s + chunk_cells] = sq_a[r] + sq_b[c] - 2.0 * np.einsum('ij,ij->i', a[r], b[c])
+    np.maximum(cells, 0.0, out=cells)
+    return np.sqrt(cells, out=cells), offsets
+
+
+def multiscale_dtw(seqA, seqB, radius=8, min_length=64, factor=2, return_path=False):
+    """DTW thô-đến-mịn cho chuỗi dài.
+
+    Dựng kim tự tháp bằng cách gộp `factor` frame một lần tới khi chuỗi ngắn hơn
+    `min_length`, chạy DTW đầy đủ ở tầng thô nhất rồi ở mỗi tầng mịn hơn chỉ tính
+    trong hành lang quanh đường đi chiếu xuống. Khoảng cách ở tầng gốc chia n + m,
+    cùng thang với dtw_distance.
+    """
+    n, m = len(seqA), len(seqB)
+    if n == 0 or m == 0:
+        return (np.inf, None) if return_path else np.inf
+    pyramid = [(np.asarray(seqA, dtype=np.float64).reshape(n, -1), np.asarray(seqB, dtype=np.float64).reshape(m, -1))]
+    while min(len(pyramid[-1][0]), len(pyramid[-1][1])) >= max(2, min_length) * factor:
+        a, b = pyramid[-1]
+        pyramid.append((downsample(a, factor), downsample(b, factor)))
+    if len(pyramid) == 1:
+        return dtw_distance(seqA, seqB, return_path=return_path)
+
+    _, path = dtw_distance(*pyramid[-1], return_path=True)
+    for level in range(len(pyramid) - 2, -1, -1):
+        a, b = pyramid[level]
+        lo, hi = project_corridor(path, len(a), len(b), factor, radius)
+        cells, offsets = corridor_distances(a, b, lo, hi)
+        dist = lambda i, l, h, cells=cells, offsets=offsets: cells[offsets[i]:offsets[i + 1]]  # noqa: E731
+        if level == 0 and not return_path:
+            return accumulate_cost(dist, lo, hi) / (n + m)
+        total, rows = accumulate_cost(dist, lo, hi, keep_rows=True)
+        path = backtrack(rows, lo, hi)
+    return total / (n + m), path
@@ -0,0 +1,80 @@
+import numpy as np
+from fastdtw import fastdtw
+from config import ModalConfig
+from app.services.pose_scoring import dtw
+
+# Mỗi backend: fn(seqA, seqB, return_path=False, **options) -> (khoảng cách đã chia n + m, đường đi hoặc None)
+_BACKENDS = {}
+
+
+def register_backend(name: str):
+    def decorator(fn):
+        _BACKENDS[name] = fn
+        return fn
+    return decorator
+
+
+def get_backend(name: str = None):
+    if not name:
+        name = ModalConfig.POSE_DTW_BACKEND
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown DTW backend: {name} (available: {', '.join(available_backends())})")
+    return _BACKENDS[name]
+
+
+def available_backends():
+    return sorted(_BACKENDS)
+
+
+def compute(seqA, seqB, backend: str = None, return_path: bool = False, **options):
+    if not backend:
+        backend = auto_backend(len(seqA), len(seqB))
+    return get_backend(backend)(seqA, seqB, return_path=return_path, **options)
+
+
+def auto_backend(n: int, m: int) -> str:
+    # Routine dài thì DTW đầy đủ (n * m ô) quá chậm -> tự chuyển sang multiscale
+    threshold = ModalConfig.POSE_DTW_MULTISCALE_MIN_LENGTH
+    if threshold and max(n, m) >= threshold:
+        return "multiscale"
+    return ModalConfig.POSE_DTW_BACKEND
+
+
+@register_backend("exact")
+def exact(seqA, seqB, return_path=False, band=None, **_):
+    # band vẫn được tôn trọng để giữ tương thích với POSE_DTW_BAND
+    if return_path:
+        return dtw.dtw_distance(seqA, seqB, band=band, return_path=True)
+    return dtw.dtw_distance(seqA, seqB, band=band), None
+
+
+@register_backend("banded")
+def banded(seqA, seqB, return_path=False, band=None, **_):
+    if not band:
+        band = ModalConfig.POSE_DTW_BAND or max(1, int(round(max(len(seqA), len(seqB)) * ModalConfig.POSE_DTW_BAND_RATIO)))
+    return exact(seqA, seqB, return_path=return_path, band=band)
+
+
+@register_backend("fastdtw")
+def fast(seqA, seqB, return_path=False, radius=None, **_):
+    if radius is None:
+        radius = ModalConfig.POSE_FASTDTW_RADIUS
+    a = np.asarray(seqA, dtype=np.float64)
+    b = np.asarray(seqB, dtype=np.float64)
+    # dist=2: chuẩn Euclid, được tính trong phần C của fastdtw
+    distance, path = fastdtw(a, b, radius=int(radius), dist=2)
+    distance = distance / (len(a) + len(b))
+    if return_path:
+        return distance, np.asarray(path, dtype=np.int64)
+    return distance, None
+
+
+@register_backend("multiscale")
+def multiscale(seqA, seqB, return_path=False, radius=None, min_length=None, **_):
+    if radius is None:
+        radius = ModalConfig.POSE_DTW_MULTISCALE_RADIUS
+    if min_length is None:
+        min_length = ModalConfig.POSE_DTW_MULTISCALE_COARSEST
+    if return_path:
+        return dtw.multiscale_dtw(seqA, seqB, radius=int(radius), min_length=int(min_length), return_path=True)
+    return dtw.multiscale_dtw(seqA, seqB, radius=int(radius), min_length=int(min_length)), None
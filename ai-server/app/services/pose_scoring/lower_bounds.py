@@ -0,0 +1,46 @@
+import numpy as np
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
+
+# Cận dưới của dtw.dtw_distance (đã chia cho n + m), rẻ hơn nhiều so với DTW đầy đủ.
+
+
+def lb_kim(seqA, seqB) -> float:
+    # Đường đi DTW luôn đi qua (0, 0) và (n-1, m-1)
+    n, m = len(seqA), len(seqB)
+    d = float(np.linalg.norm(seqA[0] - seqB[0]))
+    if n > 1 or m > 1:
+        d += float(np.linalg.norm(seqA[-1] - seqB[-1]))
+    return d / (n + m)
+
+
+def envelope(seq, window: int):
+    """Đường bao trên/dưới của chuỗi trong cửa sổ +-window frame."""
+    if window >= len(seq) - 1:
+        upper = np.broadcast_to(seq.max(axis=0), seq.shape)
+        lower = np.broadcast_to(seq.min(axis=0), seq.shape)
+        return upper, lower
+    size = 2 * int(window) + 1
+    return maximum_filter1d(seq, size, axis=0), minimum_filter1d(seq, size, axis=0)
+
+
+def lb_keogh(seqA, seqB, band=None) -> float:
+    """LB_Keogh của seqA so với đường bao của seqB.
+
+    Chỉ là cận dưới hợp lệ khi cửa sổ bao trùm dải Sakoe-Chiba mà DTW dùng;
+    không có band thì cửa sổ là cả chuỗi.
+    """
+    n, m = len(seqA), len(seqB)
+    if band and n == m:
+        window = int(band)
+    else:
+        window = max(n, m)
+    a = np.asarray(seqA, dtype=np.float32)
+    upper, lower = envelope(np.asarray(seqB, dtype=np.float32), window)
+    if window < max(n, m):
+        upper, lower = upper[:n], lower[:n]
+    else:
+        upper, lower = upper[:1], lower[:1]
+    over = np.maximum(a - upper, 0)
+    under = np.maximum(lower - a, 0)
+    per_frame = np.sqrt(np.einsum('ij,ij->i', over, over) + np.einsum('ij,ij->i', under, under))
+    return float(per_frame.sum()) / (n + m)
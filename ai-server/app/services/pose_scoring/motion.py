@@ -0,0 +1,104 @@
+import cv2
+import numpy as np
+from config import ModalConfig
+from app.utils.video_pipeline import iter_frames, plan_frame_indices
+
+
+def small_gray(frame, width: int = None):
+    """Ảnh xám thu nhỏ (cạnh ngang `width`) dùng để so chuyển động giữa các frame."""
+    width = width or ModalConfig.POSE_MOTION_WIDTH
+    h, w = frame.shape[:2]
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    if w > width:
+        gray = cv2.resize(gray, (width, max(1, int(round(h * width / w)))), interpolation=cv2.INTER_AREA)
+    return gray.astype(np.int16)
+
+
+def frame_difference(a, b) -> float:
+    return float(np.mean(np.abs(a - b)))
+
+
+def motion_profile(video_path: str, sample_fps: float = None, width: int = None):
+    """Độ chuyển động giữa các frame lấy mẫu thưa: (chỉ số frame, năng lượng, fps gốc)."""
+    sample_fps = sample_fps or ModalConfig.POSE_MOTION_SAMPLE_FPS
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video file: {video_path}")
+    indices, src_fps, _ = plan_frame_indices(cap, sample_fps, None)
+    positions, energy = [], []
+    prev = None
+    try:
+        for idx, frame in iter_frames(cap, indices):
+            cur = small_gray(frame, width)
+            if prev is not None:
+                positions.append(idx)
+                energy.append(frame_difference(cur, prev))
+            prev = cur
+    finally:
+        cap.release()
+    return np.array(positions, dtype=np.int64), np.array(energy, dtype=np.float32), src_fps
+
+
+def motion_window(video_path: str, threshold: float = None, pad_seconds: float = None):
+    """Đoạn [start, stop) có chuyển động, bỏ phần đứng yên ở đầu và cuối video.
+
+    Trả về None khi không xác định được (video quá ngắn hoặc không có đoạn nào
+    vượt ngưỡng), khi đó vẫn xử lý cả video.
+    """
+    threshold = ModalConfig.POSE_MOTION_TRIM_THRESHOLD if threshold is None else threshold
+    pad_seconds = ModalConfig.POSE_MOTION_PAD_SECONDS if pad_seconds is None else pad_seconds
+    positions, energy, src_fps = motion_profile(video_path)
+    if len(energy) < 3:
+        return None
+    # Trung bình trượt 3 mẫu để một frame nhiễu (nén, đổi sáng) không mở cửa sổ
+    smooth = np.convolve(energy, np.ones(3) / 3, mode="same")
+    active = np.nonzero(smooth > threshold)[0]
+    if len(active) == 0:
+        return None
+    pad = int(round(pad_seconds * src_fps))
+    # positions[i] là frame sau của cặp thứ i, chuyển động bắt đầu từ frame lấy mẫu trước đó
+    first = positions[active[0] - 1] if active[0] > 0 else 0
+    start = max(0, int(first) - pad)
+    stop = int(positions[active[-1]]) + 1 + pad
+    return start, stop
+
+
+class StaticFrameGate:
+    """Bỏ qua suy luận cho frame gần như không đổi so với frame đã suy luận gần nhất.
+
+    Frame bị bỏ qua dùng lại keypoints của frame đó. So với frame đã suy luận
+    (không phải frame liền trước) để chuyển động chậm không bị cộng dồn mà lọt qua.
+    """
+    STAT_KEYS = ("static_skipped",)
+
+    def __init__(self, threshold: float = None, width: int = None):
+        self.threshold = ModalConfig.POSE_STATIC_THRESHOLD if threshold is None else threshold
+        self.width = width or ModalConfig.POSE_MOTION_WIDTH
+        self._ref = None
+        self._last = None
+        self.skipped = 0
+
+    def select(self, frames):
+        """Chỉ số các frame trong batch cần chạy model."""
+        infer = []
+        for i, frame in enumerate(frames):
+            cur = small_gray(frame, self.width)
+            if self._ref is None or frame_difference(cur, self._ref) > self.threshold:
+                infer.append(i)
+                self._ref = cur
+        self.skipped += len(frames) - len(infer)
+        return infer
+
+    def fill(self, results, infer, n):
+        """Ghép kết quả của các frame đã chạy model vào đủ n frame."""
+        out = []
+        j = 0
+        for i in range(n):
+            if j < len(infer) and infer[j] == i:
+                self._last = results[j]
+                j += 1
+            out.append(self._last)
+        return out
+
+    def stats(self) -> dict:
+        return {"static_skipped": self.skipped}
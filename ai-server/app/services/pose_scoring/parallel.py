@@ -0,0 +1,82 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from app.utils.video_pipeline import FramePipeline, merge_stats
+from app.services.pose_scoring.roi import RoiTracker
+from app.services.pose_scoring.motion import StaticFrameGate
+
+_pool = None
+_pool_workers = 0
+
+
+def _init_worker():
+    # Mỗi tiến trình con nạp model đúng một lần, dùng lại cho mọi đoạn video
+    from app.services.pose_scoring.pose_scorer import PoseScorer
+    PoseScorer._load_pose_model()
+
+
+def _extract_chunk(video_path, frame_range, batch_size, target_fps, max_frames):
+    from app.services.pose_scoring.pose_scorer import PoseScorer
+    model = PoseScorer._load_pose_model()
+    # Mỗi đoạn tự bám theo người biểu diễn, bắt đầu bằng một lần detect cả frame
+    tracker = PoseScorer._new_tracker()
+    gate = PoseScorer._new_gate()
+    chunks = []
+    with FramePipeline(video_path, batch_size, target_fps=target_fps, max_frames=max_frames,
+                       frame_range=frame_range) as pipe:
+        for _, batch in pipe.batches():
+            chunks.extend(PoseScorer._keypoints_batch(model, batch, tracker, gate))
+        stats = pipe.stats()
+    if tracker is not None:
+        stats.update(tracker.stats())
+    if gate is not None:
+        stats.update(gate.stats())
+    kpts = np.array(chunks, dtype=np.float32).reshape(-1, 51)
+    return kpts, stats
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        # spawn thay vì fork: an toàn với CUDA và các thread của torch/OpenCV
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+        _pool_workers = workers
+    return _pool
+
+
+def split_ranges(indices, total, parts):
+    """Chia các frame cần đọc thành `parts` đoạn liên tiếp [start, stop)."""
+    pool = np.arange(total) if indices is None else np.asarray(indices)
+    ranges = []
+    for chunk in np.array_split(pool, parts):
+        if len(chunk):
+            ranges.append((int(chunk[0]), int(chunk[-1]) + 1))
+    return ranges
+
+
+def extract_keypoints_parallel(video_path, indices, total, workers, batch_size, target_fps, max_frames):
+    """Trích keypoints (đã chuẩn hoá, chưa làm mượt) theo từng đoạn trên nhiều tiến trình.
+
+    Kết quả được nối lại đúng thứ tự thời gian.
+    """
+    pool = _get_pool(workers)
+    ranges = split_ranges(indices, total, workers)
+    futures = [
+        pool.submit(_extract_chunk, video_path, r, batch_size, target_fps, max_frames)
+        for r in ranges
+    ]
+    results = [f.result() for f in futures]
+    kpts = np.concatenate([r[0] for r in results]) if results else np.empty((0, 51), dtype=np.float32)
+    stats = merge_stats([r[1] for r in results])
+    for key in RoiTracker.STAT_KEYS + StaticFrameGate.STAT_KEYS:
+        if results and key in results[0][1]:
+            stats[key] = sum(r[1][key] for r in results)
+    stats["workers"] = workers
+    stats["chunks"] = len(ranges)
+    return kpts, stats
@@ -1,12 +1,18 @@
 import os
+import io
+import threading
 import cv2
 import numpy as np
 import math
-from ultralytics import YOLO
-from scipy.signal import savgol_filter, resample
-from scipy.spatial.distance import cosine, euclidean
-from fastdtw import fastdtw
+from scipy.signal import savgol_filter, resample, lfilter
 import gc
+from config import ModalConfig
+from app.services.pose_scoring import dtw_backends, scoring_kernel, teacher_features, lower_bounds, template_format
+from app.utils.video_pipeline import FramePipeline, plan_frame_indices
+from app.services.pose_scoring.parallel import extract_keypoints_parallel
+from app.services.inference.backends import load_backend
+from app.services.pose_scoring.roi import RoiTracker, offset_keypoints
+from app.services.pose_scoring.motion import StaticFrameGate, motion_window
 
 MODELS_DIR = os.environ.get('YOLO_MODELS_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))), 'models'))
 os.makedirs(MODELS_DIR, exist_ok=True)
@@ -15,97 +21,310 @@ if 'YOLO_MODELS_DIR' not in os.environ:
 
 class PoseScorer:
     _pose_model = None
+    # Warm-up chạy nền và request đến cùng lúc chỉ được nạp weights một lần
+    _load_lock = threading.Lock()
     _model_name = "yolov8n-pose.pt"
     SMOOTH_WINDOW = 21
     SMOOTH_POLY = 3
+    # Tăng mỗi khi đổi trọng số / ngưỡng trong evaluate để biết điểm nào cần chấm lại
+    SCORER_VERSION = "1"
+    # Dưới ngưỡng này coi như học viên tập bài khác
+    ACTION_SIMILARITY_MIN = 0.55
     
     @classmethod
     def _load_pose_model(cls):
-        if cls._pose_model is None:
-            model_path = os.path.join(MODELS_DIR, cls._model_name)
-            if os.path.exists(model_path):
-                cls._pose_model = YOLO(model_path)
-            else:
-                cls._pose_model = YOLO(cls._model_name)
-                import shutil
-                try:
-                    from pathlib import Path
-                    ultralytics_home = Path.home() / '.ultralytics'
-                    source_path = ultralytics_home / 'weights' / cls._model_name
-                    if source_path.exists():
-                        os.makedirs(os.path.dirname(model_path), exist_ok=True)
-                        shutil.copy2(str(source_path), model_path)
-                except Exception:
-                    pass
+        if cls._pose_model is not None:
+            return cls._pose_model
+        with cls._load_lock:
+            if cls._pose_model is None:
+                model_path = os.path.join(MODELS_DIR, cls._model_name)
+                if not os.path.exists(model_path):
+                    cls._download_pose_weights(model_path)
+                cls._pose_model = load_backend(
+                    model_path if os.path.exists(model_path) else cls._model_name,
+                    variant=ModalConfig.POSE_MODEL_VARIANT,
+                    imgsz=ModalConfig.POSE_IMGSZ,
+                )
         return cls._pose_model
     
+    @classmethod
+    def _download_pose_weights(cls, model_path):
+        # Ultralytics tự tải weights theo tên model, sau đó chép vào MODELS_DIR
+        from ultralytics import YOLO
+        YOLO(cls._model_name)
+        import shutil
+        try:
+            from pathlib import Path
+            ultralytics_home = Path.home() / '.ultralytics'
+            source_path = ultralytics_home / 'weights' / cls._model_name
+            if source_path.exists():
+                os.makedirs(os.path.dirname(model_path), exist_ok=True)
+                shutil.copy2(str(source_path), model_path)
+        except Exception:
+            pass
+    
     @classmethod
     def normalize_keypoints(cls, kpts):
-        k = np.array(kpts).reshape(-1, 3)
-        hip = (k[11, :2] + k[12, :2]) / 2
-        k[:, :2] -= hip
-        torso = np.linalg.norm(k[11, :2] - k[0, :2])
-        if torso < 1:
-            torso = 1
-        k[:, :2] /= torso
-        return k.flatten()
+        return cls.normalize_keypoints_batch(np.asarray(kpts).reshape(1, -1))[0]
+
+    @classmethod
+    def normalize_keypoints_batch(cls, kpts):
+        # (N, 51) -> (N, 51): gốc toạ độ ở giữa hông, chia cho độ dài thân (hông trái - mũi)
+        k = np.array(kpts).reshape(len(kpts), -1, 3)
+        hip = (k[:, 11, :2] + k[:, 12, :2]) / 2
+        k[:, :, :2] -= hip[:, None, :]
+        torso = np.linalg.norm(k[:, 11, :2] - k[:, 0, :2], axis=1)
+        torso[torso < 1] = 1
+        k[:, :, :2] /= torso[:, None, None]
+        return k.reshape(len(k), -1)
 
     @classmethod
     def smooth_sequence(cls, seq):
         if len(seq) < cls.SMOOTH_WINDOW:
             return seq
-        out = np.zeros_like(seq)
-        for i in range(seq.shape[1]):
-            out[:, i] = savgol_filter(seq[:, i], cls.SMOOTH_WINDOW, cls.SMOOTH_POLY)
-        return out
+        return savgol_filter(seq, cls.SMOOTH_WINDOW, cls.SMOOTH_POLY, axis=0).astype(seq.dtype, copy=False)
     
     @classmethod
     def smooth_ema(cls, data, alpha=0.25):
-        out = data.copy()
-        for i in range(1, len(data)):
-            out[i] = alpha * out[i] + (1 - alpha) * out[i - 1]
-        return out
+        # y[i] = alpha * x[i] + (1 - alpha) * y[i - 1], y[0] = x[0]
+        if len(data) == 0:
+            return data.copy()
+        return cls.smooth_ema_block(data, alpha=alpha)[0]
+
+    @classmethod
+    def smooth_ema_block(cls, data, zi=None, alpha=0.25):
+        # Lọc từng khối nối tiếp nhau: truyền trạng thái trả về vào khối sau, kết quả như lọc cả chuỗi
+        if zi is None:
+            zi = (1 - alpha) * data[:1]
+        out, zf = lfilter([alpha], [1.0, alpha - 1.0], data, axis=0, zi=zi)
+        return out.astype(data.dtype, copy=False), zf
     
     @classmethod
-    def extract_template_from_video(cls, video_path: str) -> np.ndarray:
+    def _keypoints_from_result(cls, res):
+        if res.keypoints is None or len(res.keypoints) == 0:
+            return None
+        k = res.keypoints[0].flatten()
+        if np.sum(k == 0) > 10:
+            return None
+        return k
+
+    @classmethod
+    def resample_fps(cls, seq, src_fps, dst_fps):
+        if not src_fps or not dst_fps or abs(src_fps - dst_fps) < 1e-3 or len(seq) < 2:
+            return seq
+        n = max(2, int(round(len(seq) * dst_fps / src_fps)))
+        t = np.linspace(0, len(seq) - 1, n)
+        i0 = np.floor(t).astype(np.int64)
+        i1 = np.minimum(i0 + 1, len(seq) - 1)
+        w = (t - i0)[:, None].astype(seq.dtype)
+        return seq[i0] * (1 - w) + seq[i1] * w
+
+    @classmethod
+    def _detect_keypoints(cls, model, frames, tracker=None, gate=None):
+        """Keypoints thô (51,) hoặc None cho từng frame, theo toạ độ frame gốc."""
+        if gate is not None:
+            infer = gate.select(frames)
+            results = cls._detect_keypoints(model, [frames[i] for i in infer], tracker) if infer else []
+            return gate.fill(results, infer, len(frames))
+        if not frames:
+            return []
+        if tracker is None or tracker.box is None:
+            out = [cls._keypoints_from_result(r) for r in model.predict(frames)]
+            if tracker is not None:
+                tracker.full_frames += len(frames)
+        else:
+            # Cả batch dùng chung một vùng cắt nên các ảnh vẫn cùng kích thước
+            x0, y0, x1, y1 = tracker.box
+            out = []
+            for r in model.predict([f[y0:y1, x0:x1] for f in frames]):
+                k = cls._keypoints_from_result(r)
+                out.append(None if k is None else offset_keypoints(k, x0, y0))
+            lost = [i for i, k in enumerate(out) if k is None or tracker.touches_edge(k, frames[i].shape)]
+            if lost:
+                for i, r in zip(lost, model.predict([frames[i] for i in lost])):
+                    out[i] = cls._keypoints_from_result(r)
+            tracker.roi_frames += len(frames) - len(lost)
+            tracker.full_frames += len(lost)
+            tracker.redetects += len(lost)
+        if tracker is not None:
+            last = next((k for k in reversed(out) if k is not None), None)
+            if last is None:
+                tracker.reset()
+            else:
+                tracker.update(last, frames[-1].shape)
+        return out
+
+    @classmethod
+    def _keypoints_batch(cls, model, frames, tracker=None, gate=None):
+        raw = [k for k in cls._detect_keypoints(model, frames, tracker, gate) if k is not None]
+        if not raw:
+            return []
+        return list(cls.normalize_keypoints_batch(np.stack(raw)))
+
+    @classmethod
+    def _new_tracker(cls):
+        return RoiTracker() if ModalConfig.POSE_ROI_TRACKING else None
+
+    @classmethod
+    def _new_gate(cls):
+        return StaticFrameGate() if ModalConfig.POSE_STATIC_SKIP else None
+
+    @classmethod
+    def _extract_keypoints_serial(cls, video_path, batch_size, target_fps, max_frames, frame_range=None,
+                                  on_batch=None):
+        model = cls._load_pose_model()
+        tracker = cls._new_tracker()
+        gate = cls._new_gate()
+        with FramePipeline(video_path, batch_size, target_fps=target_fps, max_frames=max_frames,
+                           frame_range=frame_range) as pipe:
+            # CAP_PROP_FRAME_COUNT chỉ là ước lượng với một số container, nên vẫn cho phép nới mảng
+            frames = np.empty((max(pipe.expected_frames, batch_size), 51), dtype=np.float32)
+            count = 0
+            for idxs, batch in pipe.batches():
+                if on_batch is not None:
+                    on_batch(idxs, batch)
+                for k in cls._keypoints_batch(model, batch, tracker, gate):
+                    if count == len(frames):
+                        frames = np.concatenate([frames, np.empty_like(frames)])
+                    frames[count] = k
+                    count += 1
+            stats = pipe.stats()
+        if tracker is not None:
+            stats.update(tracker.stats())
+        if gate is not None:
+            stats.update(gate.stats())
+        return frames[:count], stats
+
+    @classmethod
+    def extract_template_from_video(cls, video_path: str, batch_size: int = None, target_fps: float = None,
+                                    max_frames: int = None, workers: int = None, return_info: bool = False,
+                                    on_batch=None):
         if not os.path.exists(video_path):
             raise FileNotFoundError(f"Video file not found: {video_path}")
-        model = cls._load_pose_model()
+        if batch_size is None:
+            batch_size = ModalConfig.POSE_BATCH_SIZE
+        batch_size = max(1, int(batch_size))
+        if target_fps is None:
+            target_fps = ModalConfig.POSE_TARGET_FPS
+        if max_frames is None:
+            max_frames = ModalConfig.POSE_MAX_FRAMES
+        if workers is None:
+            workers = ModalConfig.POSE_PARALLEL_WORKERS
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
             raise ValueError(f"Cannot open video file: {video_path}")
-        frames = []
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            res = model(frame, verbose=False)
-            if len(res[0].keypoints) == 0:
-                continue
-            k = res[0].keypoints[0].data.cpu().numpy().flatten()
-            if np.sum(k == 0) > 10:
-                continue
-            frames.append(cls.normalize_keypoints(k))
-            del k, res
-            gc.collect()
+        indices, src_fps, effective_fps = plan_frame_indices(cap, target_fps, max_frames)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         cap.release()
+        expected = len(indices) if indices is not None else total
+        pool, window, trimmed = indices, None, 0
+        if ModalConfig.POSE_MOTION_TRIM and total > 0:
+            # Bỏ đoạn đứng yên trước/sau bài biểu diễn, không chạy model trên đó
+            window = motion_window(video_path)
+            if window is not None:
+                pool = np.arange(total) if indices is None else indices
+                pool = pool[(pool >= window[0]) & (pool < window[1])]
+                trimmed = expected - len(pool)
+                expected = len(pool)
+        # Video ngắn thì chi phí khởi động tiến trình lớn hơn phần lợi, chạy tuần tự.
+        # on_batch (vd. lấy frame cho nhận diện vũ khí) cần frame giải mã trong tiến trình này
+        if on_batch is None and workers and workers > 1 and total > 0 and expected >= ModalConfig.POSE_PARALLEL_MIN_FRAMES:
+            frames, stats = extract_keypoints_parallel(
+                video_path, pool, total, int(workers), batch_size, target_fps, max_frames
+            )
+        else:
+            frames, stats = cls._extract_keypoints_serial(
+                video_path, batch_size, target_fps, max_frames, window, on_batch=on_batch
+            )
+        stats["motion_trimmed"] = trimmed
+        if window is not None:
+            stats["motion_window"] = [int(window[0]), int(min(window[1], total))]
+        if ModalConfig.PIPELINE_DEBUG:
+            print(f"[PoseScorer] Pipeline: {stats}", flush=True)
         if len(frames) == 0:
             raise ValueError("No valid pose frames found in video")
-        frames = np.array(frames, dtype=np.float32)
+        count = len(frames)
         frames = cls.smooth_sequence(frames)
         frames = cls.smooth_ema(frames)
+        if return_info:
+            return frames, {
+                "source_fps": float(src_fps),
+                "effective_fps": float(effective_fps),
+                "sampled": indices is not None,
+                "frames_sampled": stats["decode_frames"],
+                "frames_valid": count,
+                "frames_skipped": {
+                    "trimmed": stats["motion_trimmed"],
+                    "static": stats.get("static_skipped", 0),
+                },
+                "pipeline": stats,
+            }
         return frames
     
     @classmethod
     def load_teacher_template(cls, template_path: str) -> np.ndarray:
         if not os.path.exists(template_path):
             raise FileNotFoundError(f"Template file not found: {template_path}")
-        teacher_raw = np.load(template_path)
+        if template_format.is_container_file(template_path):
+            return cls._template_from_container(*template_format.load(template_path))
+        # File .npy cũ: không có header nên vẫn phải đoán theo số cột
+        return cls.prepare_teacher_template(np.load(template_path, mmap_mode="r"))
+
+    @classmethod
+    def decode_teacher_template(cls, data: bytes) -> np.ndarray:
+        # Giống load_teacher_template nhưng từ nội dung file đã đọc vào bộ nhớ
+        if template_format.is_container(data):
+            return cls._template_from_container(*template_format.decode(data))
+        return cls.prepare_teacher_template(np.load(io.BytesIO(data)))
+
+    @classmethod
+    def _template_from_container(cls, header, template):
+        if header["version"] < 2 or not header["normalized"]:
+            # Version 1 lưu template trước bước normalize lúc nạp: xử lý như file .npy cũ
+            template = cls.prepare_teacher_template(template)
+        # float32 đã ở dạng chấm điểm: trả thẳng memmap / frombuffer, không copy
+        return template.astype(np.float32, copy=False)
+
+    @classmethod
+    def teacher_template_fps(cls, template_path: str):
+        header = template_format.read_header(template_path) if template_path else None
+        return header["fps"] if header else None
+
+    @classmethod
+    def teacher_resample_fps(cls, template_path: str, student_fps: float = None, teacher_fps: float = None):
+        """fps của template khi phải resample theo chuỗi học viên; None nếu không cần resample.
+
+        Template cũ (.npy) không lưu fps: chỉ dùng POSE_TEMPLATE_FPS khi được cấu hình,
+        không thì bỏ qua resample thay vì đoán fps.
+        """
+        if not student_fps:
+            return None
+        if teacher_fps is None:
+            teacher_fps = cls.teacher_template_fps(template_path) or ModalConfig.POSE_TEMPLATE_FPS
+        if not teacher_fps:
+            print(f"[PoseScorer] Template fps unknown, skip resampling to {student_fps:.2f} fps", flush=True)
+            return None
+        return teacher_fps if abs(teacher_fps - student_fps) >= 1e-3 else None
+
+    @classmethod
+    def encode_teacher_template(cls, template, fps: float, dtype: str = None) -> bytes:
+        # Lưu đúng mảng load_teacher_template trả về cho file .npy cùng nội dung (qua
+        # prepare_teacher_template), nên hai định dạng chấm ra cùng điểm và lúc nạp không phải tính lại
+        template = cls.prepare_teacher_template(np.asarray(template, dtype=np.float32))
+        return template_format.encode(template, fps, normalized=True, dtype=dtype or ModalConfig.POSE_TEMPLATE_DTYPE)
+
+    @classmethod
+    def prepare_teacher_template(cls, teacher_raw):
         if teacher_raw.shape[1] == 51:
-            teacher = np.apply_along_axis(cls.normalize_keypoints, 1, teacher_raw)
+            teacher = cls.normalize_keypoints_batch(teacher_raw)
         else:
             teacher = teacher_raw
         return teacher
+
+    @classmethod
+    def build_teacher_bundle(cls, template):
+        # Bundle phải dựng từ đúng template mà load_teacher_template sẽ trả về
+        return teacher_features.build_bundle(cls.prepare_teacher_template(template))
     
     @classmethod
     def align_length(cls, teacher_kpts: np.ndarray, student_kpts: np.ndarray) -> np.ndarray:
@@ -116,85 +335,126 @@ class PoseScorer:
     # ===== New scoring helpers =====
     @classmethod
     def shape_penalty(cls, student, teacher):
-        d1 = np.std(student, axis=1)
-        d2 = np.std(teacher, axis=1)
-        diff = np.mean(np.abs(d1 - d2))
-        return np.exp(-diff * 8)
+        return scoring_kernel.shape_penalty(
+            scoring_kernel.sequence_features(student), scoring_kernel.sequence_features(teacher)
+        )
 
     @classmethod
     def score_cosine(cls, a, b):
-        base = np.mean([
-            np.dot(a[i], b[i]) / (np.linalg.norm(a[i]) * np.linalg.norm(b[i]) + 1e-8)
-            for i in range(len(a))
-        ])
-        s = base * cls.shape_penalty(a, b) * 0.9
-        return max(s, 0.55)
-
-    @classmethod
-    def dtw_distance(cls, seqA, seqB):
-        n, m = len(seqA), len(seqB)
-        cost = np.full((n + 1, m + 1), np.inf)
-        cost[0, 0] = 0
-        for i in range(1, n + 1):
-            for j in range(1, m + 1):
-                d = np.linalg.norm(seqA[i - 1] - seqB[j - 1])
-                cost[i, j] = d + min(cost[i - 1, j], cost[i, j - 1], cost[i - 1, j - 1])
-        return cost[n, m] / (n + m)
-
-    @classmethod
-    def score_dtw(cls, student, teacher):
-        d = cls.dtw_distance(student, teacher)
+        return scoring_kernel.cosine(scoring_kernel.sequence_features(a), scoring_kernel.sequence_features(b))
+
+    @classmethod
+    def dtw_distance(cls, seqA, seqB, band=None, backend=None):
+        if band is None:
+            band = ModalConfig.POSE_DTW_BAND
+        distance, _ = dtw_backends.compute(seqA, seqB, backend=backend, band=band)
+        return distance
+
+    @classmethod
+    def score_dtw(cls, student, teacher, band=None, backend=None):
+        d = cls.dtw_distance(student, teacher, band=band, backend=backend)
         return np.exp(-2.0 * d)
 
+    @classmethod
+    def lb_cascade_enabled(cls) -> bool:
+        return bool(ModalConfig.POSE_LB_STAGES) and bool(
+            ModalConfig.POSE_LB_REJECT_TOTAL or ModalConfig.POSE_LB_MAX_DISTANCE
+        )
+
+    @classmethod
+    def scorer_version(cls) -> str:
+        # Loại sớm bằng cận dưới làm đổi điểm DTW của bài bị loại -> phiên bản chấm khác
+        return f"{cls.SCORER_VERSION}+lb" if cls.lb_cascade_enabled() else cls.SCORER_VERSION
+
+    @classmethod
+    def _dtw_cascade(cls, student, teacher, partial_total, band=None, backend=None):
+        """Trả về (điểm DTW, tầng quyết định).
+
+        Phần DTW đóng góp tối đa 0.3 * 50 * exp(-2 * d) vào tổng điểm, nên từ
+        một cận dưới của d có thể chặn trên tổng điểm. Nếu chặn trên đó vẫn dưới
+        POSE_LB_REJECT_TOTAL (hoặc cận dưới vượt POSE_LB_MAX_DISTANCE) thì
+        dùng luôn exp(-2 * cận dưới) thay cho DTW đầy đủ. Mặc định cả hai ngưỡng
+        bằng 0 nên luôn chạy DTW đầy đủ; bật lên thì scorer_version() đổi theo.
+        """
+        if band is None:
+            band = ModalConfig.POSE_DTW_BAND
+        if not cls.lb_cascade_enabled():
+            return cls.score_dtw(student, teacher, band=band, backend=backend), "dtw"
+        lb = 0.0
+        for stage in ModalConfig.POSE_LB_STAGES:
+            if stage == "kim":
+                lb = max(lb, lower_bounds.lb_kim(student, teacher))
+            elif stage == "keogh":
+                lb = max(lb, lower_bounds.lb_keogh(student, teacher, band))
+            else:
+                continue
+            bound = float(np.exp(-2.0 * lb))
+            max_total = partial_total + 0.3 * 50 * bound
+            if max_total < ModalConfig.POSE_LB_REJECT_TOTAL or (
+                ModalConfig.POSE_LB_MAX_DISTANCE and lb >= ModalConfig.POSE_LB_MAX_DISTANCE
+            ):
+                return bound, f"lb_{stage}"
+        return cls.score_dtw(student, teacher, band=band, backend=backend), "dtw"
+
     @classmethod
     def score_velocity(cls, a, b):
-        va = np.diff(a, axis=0)
-        vb = np.diff(b, axis=0)
-        c = np.corrcoef(va.flatten(), vb.flatten())[0, 1]
-        if np.isnan(c):
-            c = -1
-        c = (c + 1) / 2
-        return c ** 1.7
+        return scoring_kernel.velocity(scoring_kernel.sequence_features(a), scoring_kernel.sequence_features(b))
 
     @classmethod
     def score_stability(cls, student):
-        v = np.diff(student, axis=0)
-        a = np.diff(v, axis=0)
-        j = np.diff(a, axis=0)
-        mse = np.mean(v ** 2) + 3 * np.mean(a ** 2) + 15 * np.mean(j ** 2)
-        return 1 / (1 + 200 * mse)
+        return scoring_kernel.stability(scoring_kernel.sequence_features(student))
 
     @classmethod
     def action_similarity(cls, student, teacher):
-        v1 = np.std(student, axis=0)
-        v2 = np.std(teacher, axis=0)
-        s = np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2) + 1e-8)
-        return (s + 1) / 2
+        return scoring_kernel.action_similarity(
+            scoring_kernel.sequence_features(student), scoring_kernel.sequence_features(teacher)
+        )
 
     @classmethod
-    def evaluate(cls, student, teacher):
+    def evaluate(cls, student, teacher, teacher_bundle=None, dtw_backend=None, time_scale: float = 1.0):
+        if teacher_bundle is not None:
+            teacher = teacher_bundle["x"]
         l = min(len(student), len(teacher))
         student = student[:l]
         teacher = teacher[:l]
 
-        A = cls.action_similarity(student, teacher)
-
-        if A < 0.55:
-            return {
-                "pose": 5,
-                "speed": 5,
-                "stability": 5,
-                "total": 15,
-                "feedback": {
-                    "pose": "Không cùng bài.",
-                    "speed": "Không cùng bài.",
-                    "stability": "Không cùng bài.",
-                },
-            }
+        # Norm, std, vận tốc... của mỗi chuỗi chỉ tính một lần và dùng chung cho mọi tiêu chí
+        fs = scoring_kernel.sequence_features(student)
+        if teacher_bundle is not None:
+            ft = teacher_features.prefix_features(teacher_bundle, l)
+        else:
+            ft = scoring_kernel.sequence_features(teacher)
+        A = scoring_kernel.action_similarity(fs, ft)
+
+        if A < cls.ACTION_SIMILARITY_MIN:
+            return cls._mismatch_result()
+
+        s_cos = scoring_kernel.cosine(fs, ft)
+        s_speed = scoring_kernel.velocity(fs, ft)
+        s_stab = scoring_kernel.stability(fs, time_scale)
+        s_dtw, decided_by = cls._dtw_cascade(
+            fs["x"], ft["x"], 0.7 * s_cos * 50 + s_speed * 30 + s_stab * 20, backend=dtw_backend
+        )
+        return cls._combine_scores(s_cos, s_dtw, s_speed, s_stab, decided_by)
+
+    @classmethod
+    def _mismatch_result(cls):
+        return {
+            "pose": 5,
+            "speed": 5,
+            "stability": 5,
+            "total": 15,
+            "feedback": {
+                "pose": "Không cùng bài.",
+                "speed": "Không cùng bài.",
+                "stability": "Không cùng bài.",
+            },
+            "decided_by": "action_similarity",
+        }
 
-        s_pose = 0.7 * cls.score_cosine(student, teacher) + 0.3 * cls.score_dtw(student, teacher)
-        s_speed = cls.score_velocity(student, teacher)
-        s_stab = cls.score_stability(student)
+    @classmethod
+    def _combine_scores(cls, s_cos, s_dtw, s_speed, s_stab, decided_by):
+        s_pose = 0.7 * s_cos + 0.3 * s_dtw
 
         pose_score = s_pose * 50
         speed_score = s_speed * 30
@@ -211,15 +471,81 @@ class PoseScorer:
                 "speed": "Ổn" if speed_score >= 20 else "Chưa đều",
                 "stability": "Ổn định" if stab_score >= 12 else "Hơi rung",
             },
+            "decided_by": decided_by,
         }
     
     @classmethod
-    def score_video(cls, student_video_path: str, teacher_template_path: str) -> dict:
+    def _score_against_teacher(cls, student, teacher_template_path, teacher_bundle_path=None,
+                               student_fps=None, teacher_fps=None, dtw_backend=None):
+        teacher_fps = cls.teacher_resample_fps(teacher_template_path, student_fps, teacher_fps)
+        # Template phải resample theo chuỗi học viên thì bundle tính sẵn không còn đúng
+        if teacher_bundle_path and teacher_fps is None:
+            bundle = teacher_features.load_bundle(teacher_bundle_path)
+            result = cls.evaluate(student, None, teacher_bundle=bundle, dtw_backend=dtw_backend)
+        else:
+            teacher_template = cls.load_teacher_template(teacher_template_path)
+            time_scale = 1.0
+            if teacher_fps is not None:
+                # Đưa template giáo viên về cùng tốc độ lấy mẫu với chuỗi học viên
+                teacher_template = cls.resample_fps(teacher_template, teacher_fps, student_fps)
+                time_scale = student_fps / teacher_fps
+            result = cls.evaluate(student, teacher_template, dtw_backend=dtw_backend, time_scale=time_scale)
+        result["scorer_version"] = cls.scorer_version()
+        return result
+
+    @classmethod
+    def prepare_student_keypoints(cls, keypoints, keypoints_format: str = "normalized"):
+        """Chuỗi keypoints học viên gửi lên -> dạng extract_template_from_video trả về.
+
+        raw: keypoints pixel (N, 51) theo từng frame, được lọc/normalize/làm mượt
+        giống hệt lúc trích từ video; normalized: dùng nguyên như template đã trích.
+        """
+        seq = np.asarray(keypoints, dtype=np.float32)
+        if seq.ndim != 2 or seq.shape[1] != 51:
+            raise ValueError(f"Student keypoints must have shape (N, 51), got {seq.shape}")
+        if keypoints_format == "raw":
+            seq = seq[np.sum(seq == 0, axis=1) <= 10]
+            if len(seq):
+                seq = cls.smooth_ema(cls.smooth_sequence(cls.normalize_keypoints_batch(seq)))
+        elif keypoints_format != "normalized":
+            raise ValueError(f"Unknown keypoints_format '{keypoints_format}' (expected raw or normalized)")
+        if len(seq) == 0:
+            raise ValueError("No valid pose frames found in student keypoints")
+        return seq
+
+    @classmethod
+    def score_keypoints(cls, keypoints, teacher_template_path: str, keypoints_format: str = "normalized",
+                        student_fps: float = None, teacher_fps: float = None, teacher_bundle_path: str = None,
+                        dtw_backend: str = None) -> dict:
+        # Chấm trực tiếp trên keypoints, không cần video, không chạy model
+        student = cls.prepare_student_keypoints(keypoints, keypoints_format)
+        return cls._score_against_teacher(
+            student, teacher_template_path, teacher_bundle_path, student_fps, teacher_fps, dtw_backend
+        )
+
+    @classmethod
+    def score_video(cls, student_video_path: str, teacher_template_path: str, target_fps: float = None,
+                    max_frames: int = None, teacher_fps: float = None, teacher_bundle_path: str = None,
+                    dtw_backend: str = None, return_keypoints: bool = False, on_batch=None) -> dict:
+        """Chấm video học viên; on_batch(indices, frames) nhận từng batch frame đã giải mã."""
         import gc
         
-        student_template = cls.extract_template_from_video(student_video_path)
+        student_template, info = cls.extract_template_from_video(
+            student_video_path, target_fps=target_fps, max_frames=max_frames, return_info=True,
+            on_batch=on_batch
+        )
         gc.collect()  # Thêm dòng này
         
-        teacher_template = cls.load_teacher_template(teacher_template_path)
-        result = cls.evaluate(student_template, teacher_template)
+        # Chỉ resample template khi video học viên bị lấy mẫu lại
+        student_fps = info["effective_fps"] if info["sampled"] else None
+        result = cls._score_against_teacher(
+            student_template, teacher_template_path, teacher_bundle_path, student_fps, teacher_fps, dtw_backend
+        )
+        result["pipeline"] = info["pipeline"]
+        result["frames_skipped"] = info["frames_skipped"]
+        if return_keypoints:
+            # Lưu lại để chấm lại bằng score_keypoints mà không phải chạy model
+            result["keypoints"] = student_template
+            result["keypoints_fps"] = float(info["effective_fps"])
+            result["keypoints_sampled"] = bool(info["sampled"])
         return result
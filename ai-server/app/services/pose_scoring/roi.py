@@ -0,0 +1,84 @@
+import numpy as np
+from config import ModalConfig
+
+
+def offset_keypoints(k, x0: int, y0: int):
+    """Đưa keypoints (51,) từ toạ độ vùng cắt về toạ độ frame gốc.
+
+    Điểm (0, 0) là điểm không thấy (Ultralytics gán 0), phải giữ nguyên để
+    normalize_keypoints cho kết quả giống hệt khi chạy trên cả frame.
+    """
+    k = k.reshape(-1, 3).copy()
+    visible = (k[:, 0] != 0) | (k[:, 1] != 0)
+    k[visible, 0] += x0
+    k[visible, 1] += y0
+    return k.reshape(-1)
+
+
+class RoiTracker:
+    """Bám theo người biểu diễn chính để chỉ đưa vùng quanh người vào YOLO.
+
+    Vùng cắt là khung bao keypoints gần nhất, nới thêm `pad` lần cạnh dài.
+    Mất dấu (không thấy người trong vùng cắt hoặc keypoints chạm mép vùng cắt)
+    thì frame đó được detect lại trên cả frame và vùng cắt được đặt lại.
+    """
+    STAT_KEYS = ("roi_frames", "full_frames", "roi_redetects")
+
+    def __init__(self, pad: float = None, edge_margin: float = None, min_size: int = None):
+        self.pad = ModalConfig.POSE_ROI_PAD if pad is None else pad
+        self.edge_margin = ModalConfig.POSE_ROI_EDGE_MARGIN if edge_margin is None else edge_margin
+        self.min_size = ModalConfig.POSE_ROI_MIN_SIZE if min_size is None else min_size
+        self.box = None
+        self.roi_frames = 0
+        self.full_frames = 0
+        self.redetects = 0
+
+    def reset(self):
+        self.box = None
+
+    def update(self, k, frame_shape):
+        """Đặt vùng cắt mới từ keypoints (51,) theo toạ độ frame gốc."""
+        pts = k.reshape(-1, 3)
+        pts = pts[(pts[:, 0] != 0) | (pts[:, 1] != 0), :2]
+        if len(pts) == 0:
+            self.box = None
+            return
+        h, w = frame_shape[:2]
+        (x0, y0), (x1, y1) = pts.min(axis=0), pts.max(axis=0)
+        side = max(x1 - x0, y1 - y0, self.min_size / (1 + 2 * self.pad))
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+        half = side * (0.5 + self.pad)
+        box = (
+            int(max(0, np.floor(cx - half))),
+            int(max(0, np.floor(cy - half))),
+            int(min(w, np.ceil(cx + half))),
+            int(min(h, np.ceil(cy + half))),
+        )
+        # Vùng cắt gần bằng cả frame thì không còn lợi gì
+        if (box[2] - box[0]) * (box[3] - box[1]) >= 0.8 * w * h:
+            self.box = None
+        else:
+            self.box = box
+
+    def touches_edge(self, k, frame_shape) -> bool:
+        """Keypoints sát mép vùng cắt (mà mép đó không phải mép frame) -> người có thể đã ra ngoài."""
+        x0, y0, x1, y1 = self.box
+        h, w = frame_shape[:2]
+        pts = k.reshape(-1, 3)
+        pts = pts[(pts[:, 0] != 0) | (pts[:, 1] != 0), :2]
+        if len(pts) == 0:
+            return True
+        mx, my = self.edge_margin * (x1 - x0), self.edge_margin * (y1 - y0)
+        return bool(
+            (x0 > 0 and pts[:, 0].min() < x0 + mx)
+            or (y0 > 0 and pts[:, 1].min() < y0 + my)
+            or (x1 < w and pts[:, 0].max() > x1 - mx)
+            or (y1 < h and pts[:, 1].max() > y1 - my)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "roi_frames": self.roi_frames,
+            "full_frames": self.full_frames,
+            "roi_redetects": self.redetects,
+        }
@@ -0,0 +1,76 @@
+import numpy as np
+
+
+def sequence_features(seq) -> dict:
+    """Các đại lượng dùng chung của một chuỗi keypoints (N, 51), tính một lần bằng float32."""
+    x = np.ascontiguousarray(seq, dtype=np.float32)
+    d = x.shape[1]
+    sq = np.einsum('ij,ij->i', x, x)
+    row_mean = x.mean(axis=1)
+    return {
+        "x": x,
+        "norm": np.sqrt(sq),
+        # std theo hàng = sqrt(E[x^2] - E[x]^2), dùng lại tổng bình phương của norm
+        "row_std": np.sqrt(np.maximum(sq / d - row_mean * row_mean, 0)),
+        "col_std": x.std(axis=0),
+        "vel": np.diff(x, axis=0),
+    }
+
+
+def action_similarity(fs, ft) -> float:
+    v1, v2 = fs["col_std"], ft["col_std"]
+    s = np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2) + 1e-8)
+    return float((s + 1) / 2)
+
+
+def shape_penalty(fs, ft) -> float:
+    diff = np.mean(np.abs(fs["row_std"] - ft["row_std"]))
+    return float(np.exp(-diff * 8))
+
+
+def cosine(fs, ft) -> float:
+    dots = np.einsum('ij,ij->i', fs["x"], ft["x"])
+    base = np.mean(dots / (fs["norm"] * ft["norm"] + 1e-8))
+    s = base * shape_penalty(fs, ft) * 0.9
+    return float(max(s, 0.55))
+
+
+def velocity(fs, ft) -> float:
+    va = fs["vel"].ravel()
+    vb = ft["vel"].ravel()
+    if va.size < 2:
+        c = -1.0
+    else:
+        da = va - va.mean()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if "vel_sum" in ft:
+                # Phía giáo viên đã có sẵn tổng và tổng bình phương (teacher feature bundle)
+                mb = ft["vel_sum"] / vb.size
+                var_b = ft["vel_sq"] - vb.size * mb * mb
+                c = np.dot(da, vb) / np.sqrt(np.dot(da, da) * var_b)
+            else:
+                db = vb - vb.mean()
+                c = np.dot(da, db) / np.sqrt(np.dot(da, da) * np.dot(db, db))
+        if not np.isfinite(c):
+            c = -1.0
+    c = (c + 1) / 2
+    return float(c ** 1.7)
+
+
+def stability(fs, time_scale: float = 1.0) -> float:
+    # time_scale = fps chuỗi / fps tham chiếu: đưa vận tốc, gia tốc, giật về cùng đơn vị thời gian
+    # khi chuỗi học viên bị lấy mẫu thưa hơn template
+    v = fs["vel"] * time_scale if time_scale != 1.0 else fs["vel"]
+    a = np.diff(v, axis=0) * time_scale
+    j = np.diff(a, axis=0) * time_scale
+    mse = np.mean(v ** 2) + 3 * np.mean(a ** 2) + 15 * np.mean(j ** 2)
+    return float(1 / (1 + 200 * mse))
+
+
+def score_terms(fs, ft) -> dict:
+    return {
+        "action_similarity": action_similarity(fs, ft),
+        "cosine": cosine(fs, ft),
+        "velocity": velocity(fs, ft),
+        "stability": stability(fs),
+    }
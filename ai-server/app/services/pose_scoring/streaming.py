@@ -0,0 +1,388 @@
+import io
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+from config import ModalConfig
+from app.services.pose_scoring import dtw, teacher_features
+from app.services.pose_scoring.pose_scorer import PoseScorer
+
+INPUT_FORMATS = ("video", "raw", "normalized")
+
+
+class StreamSession:
+    """Chấm điểm dần theo từng đoạn video / lô keypoints của một buổi tập trực tiếp.
+
+    Giữ các frame đã normalize (chưa làm mượt) tới độ dài template giáo viên cộng
+    nửa cửa sổ Savitzky-Golay - phần sau đó không ảnh hưởng tới điểm vì evaluate
+    cắt hai chuỗi về cùng độ dài. Frame nào đã đủ frame phía sau để làm mượt xong
+    thì được cộng vào các tổng chạy (cosine, vận tốc, độ rung, chi phí DTW hàng
+    cuối) để trả điểm tạm sau mỗi đoạn. Điểm cuối cùng (finish) chấm lại cả chuỗi
+    đúng như score_keypoints / score_video nên trùng với chấm một lần.
+    """
+
+    def __init__(self, template_path: str, bundle_path: str = None, input_format: str = "video",
+                 student_fps: float = None, teacher_fps: float = None, dtw_backend: str = None,
+                 template_id: str = None):
+        if input_format not in INPUT_FORMATS:
+            raise ValueError(f"Unknown input_format '{input_format}' (expected one of {', '.join(INPUT_FORMATS)})")
+        self.id = uuid.uuid4().hex
+        self.input_format = input_format
+        self.template_id = template_id
+        self.template_path = template_path
+        self.bundle_path = bundle_path
+        self.student_fps = student_fps
+        self.teacher_fps = teacher_fps
+        self.dtw_backend = dtw_backend
+        self.lock = threading.Lock()
+        self.touched = time.monotonic()
+        self.saved_at = None
+
+        resample_from = PoseScorer.teacher_resample_fps(template_path, student_fps, teacher_fps)
+        # Giống _score_against_teacher: vận tốc / gia tốc / giật đo theo fps của template
+        self.time_scale = student_fps / resample_from if resample_from else 1.0
+        if bundle_path and resample_from is None:
+            self.bundle = teacher_features.load_bundle(bundle_path)
+        else:
+            teacher = PoseScorer.load_teacher_template(template_path)
+            if resample_from is not None:
+                teacher = PoseScorer.resample_fps(teacher, resample_from, student_fps)
+            self.bundle = teacher_features.build_bundle(teacher)
+        self.teacher = self.bundle["x"]
+
+        # Đầu vào "normalized" được chấm nguyên trạng, không làm mượt (giống prepare_student_keypoints)
+        self.smooth = input_format != "normalized"
+        self.half = PoseScorer.SMOOTH_WINDOW // 2
+        n_teacher = len(self.teacher)
+        capacity = max(n_teacher + self.half, PoseScorer.SMOOTH_WINDOW) if self.smooth else n_teacher
+        self.frames = np.empty((capacity, 51), dtype=np.float32)
+        self.count = 0
+        self.received = 0
+        self.chunks = 0
+
+        self.done = 0
+        self._ema = None
+        self._tail = np.empty((0, 51))
+        self._dtw_row = None
+        self._sums = dict.fromkeys(
+            ("cos", "row_std", "v", "vv", "vt", "aa", "jj", "nv", "na", "nj"), 0.0
+        )
+        self._col_sum = np.zeros(51)
+        self._col_sq = np.zeros(51)
+
+    def rows_from_video(self, video_path: str):
+        # Đoạn video ngắn: giữ nguyên fps, không giới hạn số frame; làm mượt để dành cho session
+        rows, _ = PoseScorer._extract_keypoints_serial(video_path, ModalConfig.POSE_BATCH_SIZE, 0, 0)
+        return rows
+
+    def rows_from_keypoints(self, keypoints):
+        seq = np.asarray(keypoints, dtype=np.float32)
+        if seq.ndim != 2 or seq.shape[1] != 51:
+            raise ValueError(f"Student keypoints must have shape (N, 51), got {seq.shape}")
+        if self.input_format == "raw":
+            # Lọc + normalize theo từng frame như prepare_student_keypoints, làm mượt để dành cho session
+            seq = seq[np.sum(seq == 0, axis=1) <= 10]
+            if len(seq):
+                seq = PoseScorer.normalize_keypoints_batch(seq).astype(np.float32, copy=False)
+        return seq
+
+    def append(self, rows) -> dict:
+        """Thêm các frame (N, 51) đã normalize và trả về điểm tạm."""
+        self.touched = time.monotonic()
+        self.chunks += 1
+        self.received += len(rows)
+        take = min(len(rows), len(self.frames) - self.count)
+        if take > 0:
+            self.frames[self.count:self.count + take] = rows[:take]
+            self.count += take
+        self._advance()
+        return self.estimate()
+
+    def _advance(self):
+        n_teacher = len(self.teacher)
+        if not self.smooth:
+            stop = min(self.count, n_teacher)
+        elif self.count >= PoseScorer.SMOOTH_WINDOW:
+            # Frame i đã làm mượt xong khi có đủ `half` frame phía sau
+            stop = min(self.count - self.half, n_teacher)
+        else:
+            return
+        if stop <= self.done:
+            return
+        if self.smooth:
+            start = self.done - self.half if self.done > 0 else 0
+            seg = PoseScorer.smooth_sequence(self.frames[start:stop + self.half])
+            block = seg[self.done - start:stop - start]
+            block, self._ema = PoseScorer.smooth_ema_block(block, zi=self._ema)
+        else:
+            block = self.frames[self.done:stop]
+        self._accumulate(block.astype(np.float64))
+        self.done = stop
+
+    def _accumulate(self, x):
+        s = self._sums
+        lo, hi = self.done, self.done + len(x)
+        t = self.teacher[lo:hi].astype(np.float64)
+        norm_x = np.linalg.norm(x, axis=1)
+        s["cos"] += float(np.sum(np.einsum('ij,ij->i', x, t) / (norm_x * self.bundle["norm"][lo:hi] + 1e-8)))
+        s["row_std"] += float(np.sum(np.abs(x.std(axis=1) - self.bundle["row_std"][lo:hi])))
+        self._col_sum += x.sum(axis=0)
+        self._col_sq += (x * x).sum(axis=0)
+
+        # Vận tốc / gia tốc / giật mới sinh ra khi nối khối này sau vài frame cuối của khối trước
+        seq = np.concatenate([self._tail, x])
+        k = len(x)
+        v = np.diff(seq, axis=0)
+        a = np.diff(v, axis=0)
+        j = np.diff(a, axis=0)
+        v, a, j = v[len(v) - min(k, len(v)):], a[len(a) - min(k, len(a)):], j[len(j) - min(k, len(j)):]
+        if len(v):
+            vt = self.bundle["vel"][hi - 1 - len(v):hi - 1].astype(np.float64)
+            s["v"] += float(v.sum())
+            s["vv"] += float(np.sum(v * v))
+            s["vt"] += float(np.sum(v * vt))
+            s["nv"] += v.size
+        s["aa"] += float(np.sum(a * a))
+        s["na"] += a.size
+        s["jj"] += float(np.sum(j * j))
+        s["nj"] += j.size
+        self._tail = seq[-3:]
+
+        # Hàng chi phí DTW của frame học viên mới nhất so với cả template (chỉ giữ một hàng)
+        d = dtw.frame_distance_matrix(x, self.teacher)
+        for row in d:
+            self._dtw_row = dtw.dtw_step(self._dtw_row, row)
+
+    def estimate(self) -> dict:
+        """Điểm tạm trên các frame đã làm mượt xong, cùng thang với evaluate."""
+        n, n_teacher = self.done, len(self.teacher)
+        progress = {
+            "frames_received": self.received,
+            "frames_scored": n,
+            "teacher_frames": n_teacher,
+            "progress": float(n / n_teacher) if n_teacher else 0.0,
+            "chunks": self.chunks,
+            "final": False,
+        }
+        if n < 4:
+            return progress
+        s = self._sums
+        ft = teacher_features.prefix_features(self.bundle, n)
+
+        mean = self._col_sum / n
+        col_std = np.sqrt(np.maximum(self._col_sq / n - mean * mean, 0))
+        t_std = ft["col_std"]
+        a = np.dot(col_std, t_std) / (np.linalg.norm(col_std) * np.linalg.norm(t_std) + 1e-8)
+        if (a + 1) / 2 < PoseScorer.ACTION_SIMILARITY_MIN:
+            return {**PoseScorer._mismatch_result(), **progress}
+
+        s_cos = max(s["cos"] / n * float(np.exp(-s["row_std"] / n * 8)) * 0.9, 0.55)
+
+        c = -1.0
+        if s["nv"] >= 2:
+            count = s["nv"]
+            mean_v = s["v"] / count
+            mean_t = ft["vel_sum"] / count
+            with np.errstate(invalid='ignore', divide='ignore'):
+                c = (s["vt"] - mean_v * ft["vel_sum"]) / np.sqrt(
+                    (s["vv"] - count * mean_v * mean_v) * (ft["vel_sq"] - count * mean_t * mean_t)
+                )
+            if not np.isfinite(c):
+                c = -1.0
+        s_speed = float(((c + 1) / 2) ** 1.7)
+
+        ts2 = self.time_scale ** 2
+        mse = ts2 * (s["vv"] / s["nv"] + 3 * ts2 * s["aa"] / max(s["na"], 1)
+                     + 15 * ts2 * ts2 * s["jj"] / max(s["nj"], 1))
+        s_stab = float(1 / (1 + 200 * mse))
+
+        # Như evaluate trên n frame: DTW giữa n frame học viên và n frame đầu template = ô (n - 1, n - 1)
+        d = float(self._dtw_row[n - 1] / (2 * n))
+        s_dtw = float(np.exp(-2.0 * d))
+
+        return {**PoseScorer._combine_scores(s_cos, s_dtw, s_speed, s_stab, "partial"), **progress}
+
+    def finish(self) -> dict:
+        if self.count == 0:
+            raise ValueError("No valid pose frames found in stream")
+        student = self.frames[:self.count]
+        if self.smooth:
+            student = PoseScorer.smooth_ema(PoseScorer.smooth_sequence(student))
+        result = PoseScorer._score_against_teacher(
+            student, self.template_path, self.bundle_path, self.student_fps, self.teacher_fps, self.dtw_backend
+        )
+        result.update({"frames_received": self.received, "frames_scored": min(self.count, len(self.teacher)),
+                       "chunks": self.chunks, "final": True})
+        return result
+
+
+    def to_bytes(self) -> bytes:
+        """State của session (frame đã nhận + các tổng chạy) để container khác dựng lại bằng from_bytes."""
+        self.saved_at = time.time()
+        meta = {
+            "id": self.id,
+            "template_id": self.template_id,
+            "template_path": self.template_path,
+            "bundle_path": self.bundle_path,
+            "input_format": self.input_format,
+            "student_fps": self.student_fps,
+            "teacher_fps": self.teacher_fps,
+            "dtw_backend": self.dtw_backend,
+            "count": self.count,
+            "received": self.received,
+            "chunks": self.chunks,
+            "done": self.done,
+            "sums": self._sums,
+            "saved_at": self.saved_at,
+        }
+        arrays = {"frames": self.frames[:self.count], "tail": self._tail,
+                  "col_sum": self._col_sum, "col_sq": self._col_sq}
+        if self._ema is not None:
+            arrays["ema"] = self._ema
+        if self._dtw_row is not None:
+            arrays["dtw_row"] = self._dtw_row
+        buf = io.BytesIO()
+        np.savez(buf, meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8), **arrays)
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, resolve_template=None):
+        """Dựng lại session từ to_bytes; resolve_template(template_id) -> (template_path, bundle_path)
+        dùng khi đường dẫn template ở container này khác container đã lưu state."""
+        with np.load(io.BytesIO(data)) as f:
+            arrays = {name: f[name] for name in f.files}
+        meta = json.loads(arrays.pop("meta").tobytes().decode("utf-8"))
+        template_path, bundle_path = meta["template_path"], meta["bundle_path"]
+        if resolve_template is not None and meta["template_id"]:
+            template_path, bundle_path = resolve_template(meta["template_id"])
+            if template_path is None:
+                raise ValueError(f"Unknown template_id: {meta['template_id']}")
+        session = cls(template_path, bundle_path, meta["input_format"], meta["student_fps"],
+                      meta["teacher_fps"], meta["dtw_backend"], template_id=meta["template_id"])
+        session.id = meta["id"]
+        session.count = meta["count"]
+        session.frames[:session.count] = arrays["frames"]
+        session.received = meta["received"]
+        session.chunks = meta["chunks"]
+        session.done = meta["done"]
+        session._sums = meta["sums"]
+        session._tail = arrays["tail"]
+        session._col_sum = arrays["col_sum"]
+        session._col_sq = arrays["col_sq"]
+        session._ema = arrays.get("ema")
+        session._dtw_row = arrays.get("dtw_row")
+        session.saved_at = meta["saved_at"]
+        return session
+
+
+class StreamSessions:
+    """Các session đang mở, hết hạn sau POSE_STREAM_TTL_SECONDS không hoạt động.
+
+    Session nằm trong bộ nhớ container đã mở nó. Khi app chạy nhiều container,
+    gọi share() với một kho key-value dùng chung (deploy dùng modal.Dict): mỗi
+    lần mở / nhận đoạn thì state được ghi vào kho theo session_id, container
+    khác nhận đoạn tiếp theo sẽ dựng lại session từ đó. Các đoạn của một session
+    phải gửi tuần tự (chờ kết quả đoạn trước) vì kho không khoá giữa các container.
+
+    Số session trong bộ nhớ bị giới hạn bởi POSE_STREAM_MAX_SESSIONS: mở session
+    mới khi đã đầy thì session lâu không dùng nhất bị bỏ khỏi bộ nhớ (và mất hẳn
+    nếu không có kho dùng chung).
+    """
+    _sessions = OrderedDict()
+    _lock = threading.Lock()
+    _shared = None
+    _resolve_template = None
+
+    @classmethod
+    def share(cls, store, resolve_template=None):
+        cls._shared = store
+        cls._resolve_template = resolve_template
+
+    @classmethod
+    def _expire(cls):
+        deadline = time.monotonic() - ModalConfig.POSE_STREAM_TTL_SECONDS
+        for session_id in [k for k, s in cls._sessions.items() if s.touched < deadline]:
+            del cls._sessions[session_id]
+            print(f"[StreamSessions] Session {session_id} expired", flush=True)
+
+    @classmethod
+    def _keep(cls, session: StreamSession):
+        with cls._lock:
+            cls._expire()
+            if session.id not in cls._sessions:
+                while len(cls._sessions) >= max(1, ModalConfig.POSE_STREAM_MAX_SESSIONS):
+                    evicted, _ = cls._sessions.popitem(last=False)
+                    print(f"[StreamSessions] Session {evicted} evicted (max sessions reached)", flush=True)
+            cls._sessions[session.id] = session
+            cls._sessions.move_to_end(session.id)
+
+    @classmethod
+    def save(cls, session: StreamSession):
+        """Ghi state vào kho dùng chung (nếu có); gọi sau mỗi lần append."""
+        if cls._shared is not None:
+            cls._shared[session.id] = (session.chunks, session.to_bytes())
+
+    @classmethod
+    def _restore(cls, session_id: str, local):
+        entry = cls._shared.get(session_id)
+        if entry is None:
+            # Đã finish / huỷ ở container khác: bản trong bộ nhớ không còn dùng được
+            if local is not None:
+                with cls._lock:
+                    cls._sessions.pop(session_id, None)
+            return None
+        chunks, data = entry
+        if local is not None and local.chunks == chunks:
+            return local
+        try:
+            session = StreamSession.from_bytes(data, cls._resolve_template)
+        except (ValueError, OSError) as e:
+            print(f"[StreamSessions] Session {session_id} could not be restored: {e}", flush=True)
+            return None
+        if time.time() - session.saved_at > ModalConfig.POSE_STREAM_TTL_SECONDS:
+            cls._forget(session_id)
+            print(f"[StreamSessions] Session {session_id} expired", flush=True)
+            return None
+        print(f"[StreamSessions] Session {session_id} restored from shared state ({session.chunks} chunks)", flush=True)
+        cls._keep(session)
+        return session
+
+    @classmethod
+    def _forget(cls, session_id: str):
+        try:
+            cls._shared.pop(session_id)
+        except KeyError:
+            pass
+
+    @classmethod
+    def open(cls, **options) -> StreamSession:
+        session = StreamSession(**options)
+        cls._keep(session)
+        cls.save(session)
+        return session
+
+    @classmethod
+    def get(cls, session_id: str):
+        with cls._lock:
+            cls._expire()
+            session = cls._sessions.get(session_id)
+        if cls._shared is not None:
+            session = cls._restore(session_id, session)
+        if session is not None:
+            with cls._lock:
+                session.touched = time.monotonic()
+                if session_id in cls._sessions:
+                    cls._sessions.move_to_end(session_id)
+        return session
+
+    @classmethod
+    def close(cls, session_id: str):
+        session = cls.get(session_id)
+        with cls._lock:
+            cls._sessions.pop(session_id, None)
+        if cls._shared is not None:
+            cls._forget(session_id)
+        return session
@@ -0,0 +1,62 @@
+import io
+import numpy as np
+from app.services.pose_scoring import scoring_kernel
+
+BUNDLE_VERSION = 1
+
+
+def build_bundle(template) -> dict:
+    """Tính sẵn mọi đại lượng chỉ phụ thuộc template giáo viên.
+
+    `evaluate` cắt hai chuỗi về cùng độ dài l, nên các đại lượng theo cột
+    (std theo thời gian, thống kê vận tốc) được lưu dưới dạng tổng tích lũy để
+    lấy ra cho mọi tiền tố l mà không phải duyệt lại template.
+    """
+    f = scoring_kernel.sequence_features(template)
+    x = f["x"].astype(np.float64)
+    vel = f["vel"].astype(np.float64)
+    zeros = np.zeros((1, x.shape[1]))
+    return {
+        "version": np.array(BUNDLE_VERSION),
+        "x": f["x"],
+        "norm": f["norm"],
+        "row_std": f["row_std"],
+        "vel": f["vel"],
+        "col_sum": np.concatenate([zeros, np.cumsum(x, axis=0)]),
+        "col_sq": np.concatenate([zeros, np.cumsum(x * x, axis=0)]),
+        "vel_sum": np.concatenate([[0.0], np.cumsum(vel.sum(axis=1))]),
+        "vel_sq": np.concatenate([[0.0], np.cumsum((vel * vel).sum(axis=1))]),
+    }
+
+
+def save_bundle(path_or_file, bundle):
+    np.savez(path_or_file, **bundle)
+
+
+def bundle_to_bytes(bundle) -> bytes:
+    buf = io.BytesIO()
+    save_bundle(buf, bundle)
+    return buf.getvalue()
+
+
+def load_bundle(path_or_file) -> dict:
+    with np.load(path_or_file) as data:
+        bundle = {k: data[k] for k in data.files}
+    if int(bundle.get("version", -1)) != BUNDLE_VERSION:
+        raise ValueError(f"Unsupported teacher feature bundle version: {bundle.get('version')}")
+    return bundle
+
+
+def prefix_features(bundle, l: int) -> dict:
+    """Features của l frame đầu template, cùng dạng với scoring_kernel.sequence_features."""
+    mean = bundle["col_sum"][l] / l
+    var = np.maximum(bundle["col_sq"][l] / l - mean * mean, 0)
+    return {
+        "x": bundle["x"][:l],
+        "norm": bundle["norm"][:l],
+        "row_std": bundle["row_std"][:l],
+        "col_std": np.sqrt(var).astype(np.float32),
+        "vel": bundle["vel"][:l - 1],
+        "vel_sum": float(bundle["vel_sum"][l - 1]),
+        "vel_sq": float(bundle["vel_sq"][l - 1]),
+    }
@@ -0,0 +1,97 @@
+import struct
+import zlib
+import numpy as np
+
+# File template giáo viên (.wrtt): header cố định 64 byte + mảng (frames, columns) liền khối.
+# Payload bắt đầu ở offset 64 nên đọc được bằng np.memmap / np.frombuffer, không phải copy.
+# Version 2: cờ normalized nghĩa là payload đã ở đúng dạng dùng để chấm (xem
+# PoseScorer._template_from_container); file version 1 vẫn đọc được.
+MAGIC = b"WRTSTPL\x00"
+FORMAT_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+EXTENSION = ".wrtt"
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<8sHBBIIfI")  # magic, version, flags, dtype, frames, columns, fps, crc32
+_FLAG_NORMALIZED = 1
+_DTYPES = {0: np.dtype("<f4"), 1: np.dtype("<f2")}
+_DTYPE_CODES = {"float32": 0, "float16": 1}
+
+
+def is_container(data) -> bool:
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def is_container_file(path: str) -> bool:
+    with open(path, "rb") as f:
+        return is_container(f.read(len(MAGIC)))
+
+
+def encode(template, fps: float, normalized: bool = True, dtype: str = "float32") -> bytes:
+    if dtype not in _DTYPE_CODES:
+        raise ValueError(f"Unsupported template dtype: {dtype}. Expected one of {sorted(_DTYPE_CODES)}")
+    code = _DTYPE_CODES[dtype]
+    arr = np.ascontiguousarray(template, dtype=_DTYPES[code])
+    if arr.ndim != 2:
+        raise ValueError(f"Template must be 2-D (frames, columns), got shape {arr.shape}")
+    payload = arr.tobytes()
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, _FLAG_NORMALIZED if normalized else 0, code,
+        arr.shape[0], arr.shape[1], float(fps), zlib.crc32(payload),
+    )
+    return header.ljust(HEADER_SIZE, b"\x00") + payload
+
+
+def parse_header(data) -> dict:
+    if len(data) < HEADER_SIZE or not is_container(data):
+        raise ValueError("Not a template container")
+    _, version, flags, code, frames, columns, fps, crc = _HEADER.unpack_from(bytes(data[:HEADER_SIZE]))
+    if version not in SUPPORTED_VERSIONS:
+        raise ValueError(f"Unsupported template format version: {version}")
+    if code not in _DTYPES:
+        raise ValueError(f"Unsupported template dtype code: {code}")
+    return {
+        "version": version,
+        "normalized": bool(flags & _FLAG_NORMALIZED),
+        "dtype": _DTYPES[code],
+        "frames": frames,
+        "columns": columns,
+        "fps": float(fps),
+        "crc32": crc,
+    }
+
+
+def _check(header, payload, verify: bool):
+    expected = header["frames"] * header["columns"] * header["dtype"].itemsize
+    if len(payload) != expected:
+        raise ValueError(f"Template payload is {len(payload)} bytes, header expects {expected}")
+    if verify and zlib.crc32(payload) != header["crc32"]:
+        raise ValueError("Template checksum mismatch")
+
+
+def read_header(path: str):
+    """Header của file template, None nếu là file .npy cũ."""
+    with open(path, "rb") as f:
+        data = f.read(HEADER_SIZE)
+    return parse_header(data) if is_container(data) else None
+
+
+def decode(data, verify: bool = True):
+    """(header, mảng) trỏ thẳng vào `data` (np.frombuffer, chỉ đọc)."""
+    header = parse_header(data)
+    payload = memoryview(data)[HEADER_SIZE:]
+    _check(header, payload, verify)
+    arr = np.frombuffer(payload, dtype=header["dtype"]).reshape(header["frames"], header["columns"])
+    return header, arr
+
+
+def load(path: str, verify: bool = True):
+    """(header, np.memmap chỉ đọc) của file template."""
+    header = read_header(path)
+    if header is None:
+        raise ValueError(f"Not a template container: {path}")
+    shape = (header["frames"], header["columns"])
+    if header["frames"] == 0:
+        return header, np.zeros(shape, dtype=header["dtype"])
+    arr = np.memmap(path, dtype=header["dtype"], mode="r", offset=HEADER_SIZE, shape=shape)
+    _check(header, memoryview(arr).cast("B"), verify)
+    return header, arr
@@ -0,0 +1,63 @@
+import hashlib
+import io
+import os
+import re
+import numpy as np
+from config import ModalConfig
+from app.services.pose_scoring import template_format
+
+_ID_RE = re.compile(r"[0-9a-f]{64}")
+
+
+class TemplateStore:
+    """Kho template giáo viên đánh địa chỉ theo nội dung (sha256 của file .wrtt hoặc .npy cũ).
+
+    Client chỉ cần gửi template_id thay vì upload lại template mỗi lần chấm.
+    Trên Modal, TEMPLATES_DIR nên là một Volume để mọi container cùng thấy.
+    """
+
+    @classmethod
+    def _dir(cls) -> str:
+        os.makedirs(ModalConfig.TEMPLATES_DIR, exist_ok=True)
+        return ModalConfig.TEMPLATES_DIR
+
+    @classmethod
+    def _write(cls, path: str, data: bytes):
+        tmp = f"{path}.tmp-{os.getpid()}"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    @classmethod
+    def template_to_bytes(cls, template) -> bytes:
+        buf = io.BytesIO()
+        np.save(buf, np.asarray(template))
+        return buf.getvalue()
+
+    @classmethod
+    def put(cls, template_bytes: bytes, features_bytes: bytes = None) -> str:
+        template_id = hashlib.sha256(template_bytes).hexdigest()
+        ext = template_format.EXTENSION if template_format.is_container(template_bytes) else ".npy"
+        path = os.path.join(cls._dir(), f"{template_id}{ext}")
+        if not os.path.exists(path):
+            cls._write(path, template_bytes)
+        if features_bytes is not None:
+            cls._write(os.path.join(cls._dir(), f"{template_id}_features.npz"), features_bytes)
+        return template_id
+
+    @classmethod
+    def template_path(cls, template_id: str):
+        if not _ID_RE.fullmatch(template_id or ""):
+            raise ValueError(f"Invalid template_id: {template_id}")
+        for ext in (template_format.EXTENSION, ".npy"):
+            path = os.path.join(cls._dir(), f"{template_id}{ext}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    @classmethod
+    def features_path(cls, template_id: str):
+        if not _ID_RE.fullmatch(template_id or ""):
+            raise ValueError(f"Invalid template_id: {template_id}")
+        path = os.path.join(cls._dir(), f"{template_id}_features.npz")
+        return path if os.path.exists(path) else None
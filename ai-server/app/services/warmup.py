@@ -0,0 +1,93 @@
+import threading
+import time
+import numpy as np
+
+
+class ModelWarmup:
+    """Nạp model YOLO và chạy một lần suy luận giả khi container khởi động.
+
+    Request đầu tiên sau khi container bật không còn phải chờ nạp weights
+    (hay tải model vũ khí từ Google Drive); `/ready` đọc trạng thái ở đây.
+    Mỗi model có trạng thái riêng: model vũ khí lỗi không chặn việc chấm pose
+    và ngược lại. Trạng thái chung là "ready" (tất cả sẵn sàng), "partial"
+    (có model lỗi nhưng vẫn còn model dùng được) hoặc "failed".
+    """
+    _lock = threading.Lock()
+    _thread = None
+    _state = {
+        "status": "pending",
+        "started_at": None,
+        "duration_seconds": None,
+        "models": {},
+    }
+    WARMUP_SHAPE = (640, 640, 3)
+
+    @classmethod
+    def _loaders(cls):
+        from app.services.pose_scoring.pose_scorer import PoseScorer
+        from app.services.weapon_detection.weapon_detector import WeaponDetector
+        return {
+            "pose": PoseScorer._load_pose_model,
+            "weapon": WeaponDetector._load_model,
+        }
+
+    @classmethod
+    def _warm_model(cls, name, loader, frame):
+        info = {"status": "loading", "load_seconds": None, "warmup_seconds": None, "error": None}
+        with cls._lock:
+            cls._state["models"][name] = info
+        try:
+            t0 = time.perf_counter()
+            model = loader()
+            info["load_seconds"] = round(time.perf_counter() - t0, 3)
+            info["status"] = "warming"
+            t0 = time.perf_counter()
+            model.predict(frame)
+            info["warmup_seconds"] = round(time.perf_counter() - t0, 3)
+            info["status"] = "ready"
+        except Exception as e:
+            info["status"] = "failed"
+            info["error"] = str(e)
+            print(f"[ModelWarmup] {name} model failed: {e}", flush=True)
+
+    @classmethod
+    def run(cls):
+        with cls._lock:
+            cls._state["status"] = "loading"
+            cls._state["started_at"] = time.time()
+        t0 = time.perf_counter()
+        frame = np.zeros(cls.WARMUP_SHAPE, dtype=np.uint8)
+        for name, loader in cls._loaders().items():
+            cls._warm_model(name, loader, frame)
+        with cls._lock:
+            cls._state["duration_seconds"] = round(time.perf_counter() - t0, 3)
+            states = [m["status"] for m in cls._state["models"].values()]
+            if all(s == "ready" for s in states):
+                cls._state["status"] = "ready"
+            elif any(s == "ready" for s in states):
+                cls._state["status"] = "partial"
+            else:
+                cls._state["status"] = "failed"
+        print(f"[ModelWarmup] {cls.status()}", flush=True)
+
+    @classmethod
+    def start_background(cls):
+        with cls._lock:
+            if cls._thread is not None:
+                return
+            cls._thread = threading.Thread(target=cls.run, daemon=True)
+        cls._thread.start()
+
+    @classmethod
+    def is_ready(cls, model: str = None) -> bool:
+        if model is None:
+            return cls._state["status"] == "ready"
+        return cls._state["models"].get(model, {}).get("status") == "ready"
+
+    @classmethod
+    def status(cls) -> dict:
+        with cls._lock:
+            state = dict(cls._state)
+            state["models"] = {k: dict(v, ready=v["status"] == "ready") for k, v in cls._state["models"].items()}
+        state["ready"] = state["status"] == "ready"
+        return state
@@ -1,10 +1,13 @@
 import os
+import io
+import threading
 import cv2
 import numpy as np
-from ultralytics import YOLO
 from PIL import Image
-import pathlib
+from config import ModalConfig
 from app.utils.model_loader import ensure_weapon_model
+from app.utils.video_pipeline import FramePipeline, plan_frame_indices
+from app.services.inference.backends import load_backend
 
 class WeaponDetector:
     _model = None
@@ -14,6 +17,12 @@ class WeaponDetector:
         'spear': 'Thương',
         'stick': 'Côn',
     }
+    WEAPONS = list(dict.fromkeys(WEAPON_MAPPING.values()))
+    IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".jfif", ".png", ".bmp", ".webp")
+    IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"BM")
+    _lookup = None
+    # Warm-up chạy nền và request đến cùng lúc chỉ được tải / nạp model một lần
+    _load_lock = threading.Lock()
     
     @classmethod
     def _get_model_path(cls):
@@ -23,85 +32,273 @@ class WeaponDetector:
     
     @classmethod
     def _load_model(cls):
-        if cls._model is None:
-            model_path = cls._get_model_path()
-            if not os.path.exists(model_path):
-                raise FileNotFoundError(f"Model file not found: {model_path}")
-            cls._model = YOLO(model_path)
+        if cls._model is not None:
+            return cls._model
+        with cls._load_lock:
+            if cls._model is None:
+                model_path = cls._get_model_path()
+                if not os.path.exists(model_path):
+                    raise FileNotFoundError(f"Model file not found: {model_path}")
+                cls._model = load_backend(
+                    model_path, variant=ModalConfig.WEAPON_MODEL_VARIANT, imgsz=ModalConfig.WEAPON_IMGSZ
+                )
         return cls._model
     
     @classmethod
     def detect_from_video(cls, video_path: str) -> dict:
+        """Bỏ phiếu qua nhiều frame lấy mẫu đều theo thời gian.
+
+        Mỗi frame góp confidence cao nhất của từng loại vũ khí thấy trong frame.
+        Dừng đọc video ngay khi loại dẫn đầu hơn loại thứ hai WEAPON_VOTE_MARGIN,
+        nên video rõ ràng chỉ tốn một hai lần suy luận; vũ khí bị che ở frame đầu
+        vẫn được nhận ra ở các frame sau.
+        """
         if not os.path.exists(video_path):
             raise FileNotFoundError(f"Video file not found: {video_path}")
+        vote = WeaponVote()
+        stride = max(ModalConfig.WEAPON_SAMPLE_STRIDE, 1e-3)
+        with FramePipeline(video_path, batch_size=1, target_fps=1.0 / stride,
+                           max_frames=ModalConfig.WEAPON_MAX_SAMPLES) as pipe:
+            for _, frames in pipe.batches():
+                if vote.add(frames):
+                    # Thoát khỏi with -> FramePipeline.close dừng luôn thread giải mã
+                    break
+        return vote.result()
+    
+    @classmethod
+    def _class_lookup(cls, model):
+        # class id của model -> chỉ số trong WEAPONS (-1: không phải vũ khí), tính một lần cho mỗi model
+        if cls._lookup is None or cls._lookup[0] is not model:
+            lut = np.full(max(model.names) + 1, -1, dtype=np.int64)
+            for cls_id, name in model.names.items():
+                weapon_name = cls._map_weapon_name(name)
+                if weapon_name:
+                    lut[cls_id] = cls.WEAPONS.index(weapon_name)
+            cls._lookup = (model, lut)
+        return cls._lookup[1]
+    
+    @classmethod
+    def _detections(cls, model, results):
+        """Hậu xử lý chung cho một hoặc nhiều ảnh/frame.
+
+        Trả về (best, counts): best[i, w] là confidence cao nhất của vũ khí
+        WEAPONS[w] trong kết quả thứ i (0 nếu không thấy), counts[i] là số box vũ khí.
+        """
+        best = np.zeros((len(results), len(cls.WEAPONS)), dtype=np.float32)
+        counts = np.zeros(len(results), dtype=np.int64)
+        sizes = [len(r) for r in results]
+        if not sum(sizes):
+            return best, counts
+        lut = cls._class_lookup(model)
+        ids = np.concatenate([np.asarray(r.cls) for r in results]).astype(np.int64)
+        conf = np.concatenate([np.asarray(r.conf) for r in results]).astype(np.float32)
+        owner = np.repeat(np.arange(len(results)), sizes)
+        weapon = np.where((ids >= 0) & (ids < len(lut)), lut[np.clip(ids, 0, len(lut) - 1)], -1)
+        mask = weapon >= 0
+        np.maximum.at(best, (owner[mask], weapon[mask]), conf[mask])
+        counts += np.bincount(owner[mask], minlength=len(results))
+        return best, counts
+    
+    @classmethod
+    def is_image(cls, data: bytes, filename: str = None) -> bool:
+        # Dựa vào chữ ký đầu file: client có thể gửi ảnh với tên/content-type của video
+        if any(data.startswith(sig) for sig in cls.IMAGE_SIGNATURES):
+            return True
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return True
+        return bool(filename) and filename.lower().endswith(cls.IMAGE_EXTENSIONS)
+    
+    @classmethod
+    def decode_image(cls, data: bytes):
+        """Giải mã ảnh (jpg/jfif/png/bmp/webp...) từ bytes thành mảng BGR, không qua file tạm."""
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            # Định dạng OpenCV không đọc được thì thử PIL
+            try:
+                img = np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))[:, :, ::-1]
+            except Exception as e:
+                raise ValueError(f"Cannot decode image: {e}")
+        return np.ascontiguousarray(img)
+    
+    @classmethod
+    def detect_from_image_bytes(cls, data: bytes) -> dict:
         model = cls._load_model()
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            raise ValueError(f"Cannot open video file: {video_path}")
-        ret, frame = cap.read()
-        cap.release()
-        if not ret:
-            return {'detected_weapon': None, 'confidence': 0.0, 'detection_count': 0, 'total_samples': 1}
-        results = model(frame, verbose=False)
-        detections = []
-        for r in results:
-            boxes = r.boxes
-            if boxes is not None and len(boxes) > 0:
-                for box in boxes:
-                    cls_id = int(box.cls[0])
-                    conf = float(box.conf[0])
-                    cls_name = model.names[cls_id].lower()
-                    weapon_name = cls._map_weapon_name(cls_name)
-                    if weapon_name:
-                        detections.append({
-                            'weapon': weapon_name,
-                            'confidence': conf
-                        })
-        if not detections:
-            return {'detected_weapon': None, 'confidence': 0.0, 'detection_count': 0, 'total_samples': 1}
-        best = max(detections, key=lambda x: x['confidence'])
-        return {
-            'detected_weapon': best['weapon'],
-            'confidence': best['confidence'],
-            'detection_count': 1,
-            'total_samples': 1
-        }
+        best, counts = cls._detections(model, model.predict(cls.decode_image(data)))
+        return cls._image_result(best[0], counts[0])
     
     @classmethod
     def detect_from_image(cls, image_path: str) -> dict:
-        if image_path.lower().endswith(".jfif"):
-            jpg_path = str(pathlib.Path(image_path).with_suffix(".jpg"))
-            img = Image.open(image_path)
-            img.save(jpg_path, "JPEG")
-            image_path = jpg_path
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"Image file not found: {image_path}")
+        with open(image_path, "rb") as f:
+            return cls.detect_from_image_bytes(f.read())
+    
+    @classmethod
+    def detect_image_batches(cls, images, batch_size: int = None):
+        """Nhận diện nhiều ảnh, mỗi lô WEAPON_BATCH_SIZE ảnh chạy một lần suy luận.
+
+        `images` là iterable các cặp (tên, bytes); yield (tên, kết quả, lỗi) đúng
+        thứ tự đầu vào ngay khi xong từng lô. Ảnh không giải mã được chỉ báo lỗi
+        cho riêng ảnh đó, không làm hỏng cả lô.
+        """
+        batch_size = max(1, int(batch_size or ModalConfig.WEAPON_BATCH_SIZE))
         model = cls._load_model()
-        results = model(image_path, verbose=False)
-        detections = []
-        for r in results:
-            boxes = r.boxes
-            if boxes is not None and len(boxes) > 0:
-                for box in boxes:
-                    cls_id = int(box.cls[0])
-                    conf = float(box.conf[0])
-                    cls_name = model.names[cls_id].lower()
-                    weapon_name = cls._map_weapon_name(cls_name)
-                    if weapon_name:
-                        detections.append({
-                            'weapon': weapon_name,
-                            'confidence': conf
-                        })
-        if not detections:
-            return {'detected_weapon': None, 'confidence': 0.0, 'detection_count': 0}
-        best = max(detections, key=lambda x: x['confidence'])
+        chunk = []
+        for item in images:
+            chunk.append(item)
+            if len(chunk) >= batch_size:
+                yield from cls._detect_chunk(model, chunk)
+                chunk = []
+        if chunk:
+            yield from cls._detect_chunk(model, chunk)
+
+    @classmethod
+    def batch_rows(cls, images, batch_size: int = None):
+        """Dòng kết quả cho /weapon/detect-batch: {"index", "filename", "result"} hoặc {..., "error"}."""
+        for index, (filename, result, error) in enumerate(cls.detect_image_batches(images, batch_size)):
+            row = {"index": index, "filename": filename}
+            if error is None:
+                row["result"] = result
+            else:
+                row["error"] = error
+            yield row
+
+    @classmethod
+    def archive_members(cls, zf) -> list:
+        # File ảnh trong zip: bỏ thư mục, file ẩn và metadata __MACOSX/ của macOS
+        return [
+            info for info in zf.infolist()
+            if not info.is_dir() and not os.path.basename(info.filename).startswith(".")
+            and not info.filename.startswith("__MACOSX/")
+        ]
+
+    @classmethod
+    def _detect_chunk(cls, model, chunk):
+        frames, errors = [], {}
+        for i, (_, data) in enumerate(chunk):
+            try:
+                frames.append(cls.decode_image(data))
+            except ValueError as e:
+                errors[i] = str(e)
+        best, counts = cls._detections(model, model.predict(frames)) if frames else (None, None)
+        j = 0
+        for i, (name, _) in enumerate(chunk):
+            if i in errors:
+                yield name, None, errors[i]
+            else:
+                yield name, cls._image_result(best[j], counts[j]), None
+                j += 1
+
+    @classmethod
+    def _image_result(cls, best, count) -> dict:
+        if not count:
+            return {'detected_weapon': None, 'confidence': 0.0, 'detection_count': 0, 'total_samples': 1}
+        top = int(np.argmax(best))
         return {
-            'detected_weapon': best['weapon'],
-            'confidence': best['confidence'],
-            'detection_count': len(detections)
+            'detected_weapon': cls.WEAPONS[top],
+            'confidence': float(best[top]),
+            'detection_count': int(count),
+            'total_samples': 1
         }
     
     @classmethod
     def _map_weapon_name(cls, detected_name: str) -> str:
         detected_name = detected_name.lower().strip()
         return cls.WEAPON_MAPPING.get(detected_name)
+
+
+class WeaponVote:
+    """Cộng phiếu theo từng loại vũ khí qua các frame lấy mẫu (xem detect_from_video)."""
+
+    def __init__(self, margin: float = None):
+        self.model = WeaponDetector._load_model()
+        self.margin = ModalConfig.WEAPON_VOTE_MARGIN if margin is None else margin
+        self.votes = np.zeros(len(WeaponDetector.WEAPONS))
+        self.hits = np.zeros(len(WeaponDetector.WEAPONS), dtype=np.int64)
+        self.samples = 0
+        self.early_stop = False
+
+    def add(self, frames) -> bool:
+        """Suy luận và cộng phiếu cho các frame; True khi loại dẫn đầu đã đủ cách biệt."""
+        best, _ = WeaponDetector._detections(self.model, self.model.predict(frames))
+        self.samples += len(frames)
+        self.votes += best.sum(axis=0)
+        self.hits += (best > 0).sum(axis=0)
+        ranked = np.sort(self.votes)[::-1]
+        if len(ranked) > 1 and ranked[0] - ranked[1] >= self.margin:
+            self.early_stop = True
+        return self.early_stop
+
+    def result(self) -> dict:
+        if not self.hits.any():
+            return {'detected_weapon': None, 'confidence': 0.0, 'detection_count': 0, 'total_samples': self.samples}
+        top = int(np.argmax(self.votes))
+        return {
+            'detected_weapon': WeaponDetector.WEAPONS[top],
+            # Confidence trung bình trên các frame thấy loại vũ khí này
+            'confidence': float(self.votes[top] / self.hits[top]),
+            'detection_count': int(self.hits[top]),
+            'total_samples': self.samples,
+            'early_stop': self.early_stop,
+            'votes': {w: float(v) for w, v in zip(WeaponDetector.WEAPONS, self.votes) if v > 0},
+        }
+
+
+class WeaponFrameTap:
+    """Lấy frame cho nhận diện vũ khí từ luồng frame của một pipeline khác (chấm pose).
+
+    Gắn làm on_batch của PoseScorer: video chỉ giải mã một lần. Các mốc lấy mẫu
+    giống detect_from_video (mỗi WEAPON_SAMPLE_STRIDE giây, tối đa
+    WEAPON_MAX_SAMPLES frame); khi pipeline kia lấy mẫu thưa hơn thì dùng frame
+    đầu tiên tới sau mỗi mốc. Đã đủ phiếu (dừng sớm) thì không suy luận thêm.
+    """
+
+    def __init__(self, video_path: str):
+        stride = max(ModalConfig.WEAPON_SAMPLE_STRIDE, 1e-3)
+        self.max_samples = ModalConfig.WEAPON_MAX_SAMPLES
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Cannot open video file: {video_path}")
+        try:
+            indices, src_fps, _ = plan_frame_indices(cap, 1.0 / stride, self.max_samples)
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        finally:
+            cap.release()
+        if indices is None and total > 0:
+            indices = np.arange(min(total, self.max_samples or total))
+        # indices None: không biết số frame, lấy mẫu theo bước cố định
+        self.indices = indices
+        self.step = max(1, int(round(src_fps * stride)))
+        self.next_due = 0
+        self.pos = 0
+        self.vote = WeaponVote()
+
+    def _due(self):
+        if self.indices is None:
+            if self.max_samples and self.vote.samples >= self.max_samples:
+                return None
+            return self.next_due
+        return int(self.indices[self.pos]) if self.pos < len(self.indices) else None
+
+    def _advance(self, idx: int):
+        if self.indices is None:
+            self.next_due = idx + self.step
+        else:
+            self.pos = int(np.searchsorted(self.indices, idx, side="right"))
+
+    def __call__(self, idxs, frames):
+        if self.vote.early_stop:
+            return
+        picked = []
+        for idx, frame in zip(idxs, frames):
+            due = self._due()
+            if due is None:
+                break
+            if idx >= due:
+                picked.append(frame)
+                self._advance(idx)
+        if picked:
+            self.vote.add(picked)
+
+    def result(self) -> dict:
+        return self.vote.result()
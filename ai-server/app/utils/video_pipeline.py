@@ -0,0 +1,206 @@
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from config import ModalConfig
+
+_END = object()
+
+
+def plan_frame_indices(cap, target_fps=None, max_frames=None):
+    src_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if total <= 0:
+        # Không biết số frame thì không lấy mẫu đều được, đọc toàn bộ
+        return None, src_fps, src_fps
+    indices = None
+    if target_fps and target_fps < src_fps:
+        indices = np.unique(np.floor(np.arange(0, total, src_fps / target_fps)).astype(np.int64))
+    if max_frames and (total if indices is None else len(indices)) > max_frames:
+        pool = np.arange(total) if indices is None else indices
+        indices = pool[np.round(np.linspace(0, len(pool) - 1, int(max_frames))).astype(np.int64)]
+    if indices is None:
+        return None, src_fps, src_fps
+    return indices, src_fps, src_fps * len(indices) / total
+
+
+def iter_frames(cap, indices=None, start=0, stop=None, stop_event=None):
+    """Yield (index, frame); `stop_event` được set thì dừng cả khi đang grab() tới frame mẫu kế tiếp."""
+    stopped = stop_event.is_set if stop_event is not None else (lambda: False)
+    pos = start
+    if indices is None:
+        while (stop is None or pos < stop) and not stopped():
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield pos, frame
+            pos += 1
+        return
+    for idx in indices:
+        # Frame bị bỏ qua chỉ grab(), không retrieve(); grab() vẫn giải mã nên phải xét stop_event
+        # trong vòng này - hai frame mẫu có thể cách nhau cả đoạn dài video
+        while pos < idx:
+            if stopped() or not cap.grab():
+                return
+            pos += 1
+        if not cap.grab():
+            return
+        pos += 1
+        ret, frame = cap.retrieve()
+        if ret:
+            yield int(idx), frame
+
+
+class FramePipeline:
+    """Giải mã video trên một thread riêng, phần suy luận lấy frame theo batch.
+
+    Hàng đợi giới hạn `queue_size` frame: khi đầy thì thread giải mã phải chờ,
+    nên bộ nhớ không tăng theo độ dài video.
+    """
+
+    def __init__(self, video_path: str, batch_size: int = 1, target_fps: float = None,
+                 max_frames: int = None, queue_size: int = None, frame_range: tuple = None):
+        self.video_path = video_path
+        self.batch_size = max(1, int(batch_size))
+        if queue_size is None:
+            queue_size = ModalConfig.PIPELINE_QUEUE_SIZE
+        self._queue = queue.Queue(maxsize=max(int(queue_size), self.batch_size))
+        self._stop = threading.Event()
+        self._thread = None
+        self._error = None
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise ValueError(f"Cannot open video file: {video_path}")
+        self.indices, self.source_fps, self.effective_fps = plan_frame_indices(self.cap, target_fps, max_frames)
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.start, self.stop = 0, None
+        if frame_range is not None:
+            # Chỉ đọc đoạn [start, stop) của video, seek thẳng tới frame đầu đoạn
+            self.start, self.stop = int(frame_range[0]), int(frame_range[1])
+            if self.indices is not None:
+                self.indices = self.indices[(self.indices >= self.start) & (self.indices < self.stop)]
+            if self.start > 0:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.start)
+        if self.indices is not None:
+            self.expected_frames = len(self.indices)
+        elif self.stop is not None:
+            self.expected_frames = self.stop - self.start
+        else:
+            self.expected_frames = self.total_frames
+        self._decode_frames = 0
+        self._decode_seconds = 0.0
+        self._decoder_blocked = 0.0
+        self._infer_frames = 0
+        self._infer_seconds = 0.0
+        self._consumer_wait = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    @property
+    def sampled(self) -> bool:
+        return self.indices is not None
+
+    def _decode(self):
+        try:
+            frames = iter_frames(self.cap, self.indices, self.start, self.stop, stop_event=self._stop)
+            while not self._stop.is_set():
+                t0 = time.perf_counter()
+                item = next(frames, None)
+                self._decode_seconds += time.perf_counter() - t0
+                if item is None:
+                    break
+                self._decode_frames += 1
+                t0 = time.perf_counter()
+                while not self._stop.is_set():
+                    try:
+                        self._queue.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                self._decoder_blocked += time.perf_counter() - t0
+        except Exception as e:
+            self._error = e
+        finally:
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(_END, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def batches(self):
+        """Trả về từng batch (indices, frames). Thời gian giữa hai lần lấy batch
+        được tính là thời gian của tầng suy luận."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._decode, daemon=True)
+            self._thread.start()
+        done = False
+        while not done:
+            idxs, frames = [], []
+            t0 = time.perf_counter()
+            while len(frames) < self.batch_size:
+                item = self._queue.get()
+                if item is _END:
+                    done = True
+                    break
+                idxs.append(item[0])
+                frames.append(item[1])
+            self._consumer_wait += time.perf_counter() - t0
+            if self._error is not None:
+                raise self._error
+            if not frames:
+                break
+            t0 = time.perf_counter()
+            yield idxs, frames
+            self._infer_seconds += time.perf_counter() - t0
+            self._infer_frames += len(frames)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            # Giải phóng chỗ trong hàng đợi để thread giải mã thoát được
+            while self._thread.is_alive():
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+                self._thread.join(timeout=0.05)
+        self.cap.release()
+
+    def stats(self) -> dict:
+        decode_fps = self._decode_frames / self._decode_seconds if self._decode_seconds > 0 else 0.0
+        infer_fps = self._infer_frames / self._infer_seconds if self._infer_seconds > 0 else 0.0
+        return {
+            "decode_frames": self._decode_frames,
+            "decode_seconds": round(self._decode_seconds, 3),
+            "decode_fps": round(decode_fps, 2),
+            "decoder_blocked_seconds": round(self._decoder_blocked, 3),
+            "inference_frames": self._infer_frames,
+            "inference_seconds": round(self._infer_seconds, 3),
+            "inference_fps": round(infer_fps, 2),
+            "inference_wait_seconds": round(self._consumer_wait, 3),
+            # Tầng nào phải chờ tầng kia nhiều hơn thì tầng kia là nút thắt
+            "bottleneck": "inference" if self._decoder_blocked >= self._consumer_wait else "decode",
+        }
+
+
+def merge_stats(stats_list) -> dict:
+    """Gộp thống kê của nhiều pipeline chạy song song (mỗi tiến trình một đoạn)."""
+    merged = {}
+    for key in ("decode_frames", "decode_seconds", "decoder_blocked_seconds",
+                "inference_frames", "inference_seconds", "inference_wait_seconds"):
+        total = sum(s[key] for s in stats_list)
+        merged[key] = round(total, 3) if key.endswith("_seconds") else total
+    decode_s, infer_s = merged["decode_seconds"], merged["inference_seconds"]
+    merged["decode_fps"] = round(merged["decode_frames"] / decode_s, 2) if decode_s > 0 else 0.0
+    merged["inference_fps"] = round(merged["inference_frames"] / infer_s, 2) if infer_s > 0 else 0.0
+    merged["bottleneck"] = (
+        "inference" if merged["decoder_blocked_seconds"] >= merged["inference_wait_seconds"] else "decode"
+    )
+    return merged
@@ -27,6 +27,9 @@ class ModalConfig:
         "gdown>=4.7.0",
         "fastapi>=0.104.0",
         "python-multipart>=0.0.9",
+        "onnx>=1.14.0",
+        "onnxruntime>=1.16.0",
+        "onnxconverter-common>=1.14.0",
     ]
     
     # Model Configuration
@@ -54,6 +57,104 @@ class ModalConfig:
     POSE_TIMEOUT = int(os.getenv("POSE_TIMEOUT", "1800"))
     POSE_CONTAINER_IDLE_TIMEOUT = int(os.getenv("POSE_CONTAINER_IDLE_TIMEOUT", "300"))
     
+    # Pose Scoring
+    # Sakoe-Chiba band (số frame) cho DTW, 0 = tắt (DTW đầy đủ)
+    POSE_DTW_BAND = int(os.getenv("POSE_DTW_BAND", "0"))
+    # Backend DTW mặc định: exact | banded | fastdtw | multiscale (có thể chọn riêng cho từng request)
+    POSE_DTW_BACKEND = os.getenv("POSE_DTW_BACKEND", "exact")
+    # Backend banded khi không đặt POSE_DTW_BAND: band = tỉ lệ này * độ dài chuỗi
+    POSE_DTW_BAND_RATIO = float(os.getenv("POSE_DTW_BAND_RATIO", "0.1"))
+    POSE_FASTDTW_RADIUS = int(os.getenv("POSE_FASTDTW_RADIUS", "10"))
+    # Chuỗi dài từ ngưỡng này (frame) tự dùng backend multiscale khi request không chọn backend, 0 = tắt
+    POSE_DTW_MULTISCALE_MIN_LENGTH = int(os.getenv("POSE_DTW_MULTISCALE_MIN_LENGTH", "3000"))
+    # Nới hành lang quanh đường đi chiếu xuống (frame) / độ dài tối đa của tầng thô nhất
+    POSE_DTW_MULTISCALE_RADIUS = int(os.getenv("POSE_DTW_MULTISCALE_RADIUS", "8"))
+    POSE_DTW_MULTISCALE_COARSEST = int(os.getenv("POSE_DTW_MULTISCALE_COARSEST", "64"))
+    # Số frame gộp vào một lần gọi YOLO khi trích xuất keypoints
+    POSE_BATCH_SIZE = int(os.getenv("POSE_BATCH_SIZE", "16"))
+    # Lấy mẫu frame: 0 = giữ nguyên fps gốc / không giới hạn số frame
+    POSE_TARGET_FPS = float(os.getenv("POSE_TARGET_FPS", "0"))
+    POSE_MAX_FRAMES = int(os.getenv("POSE_MAX_FRAMES", "0"))
+    # fps của template cũ (.npy, không lưu fps) khi resample theo video học viên, 0 = không resample
+    POSE_TEMPLATE_FPS = float(os.getenv("POSE_TEMPLATE_FPS", "0"))
+    # Kiểu dữ liệu payload của file template .wrtt: float32 | float16 (nhỏ bằng nửa)
+    POSE_TEMPLATE_DTYPE = os.getenv("POSE_TEMPLATE_DTYPE", "float32")
+    # Trích keypoints song song theo đoạn thời gian: 0/1 = tuần tự
+    POSE_PARALLEL_WORKERS = int(os.getenv("POSE_PARALLEL_WORKERS", "0"))
+    # Dưới ngưỡng số frame này vẫn chạy tuần tự (chi phí khởi động tiến trình)
+    POSE_PARALLEL_MIN_FRAMES = int(os.getenv("POSE_PARALLEL_MIN_FRAMES", "1800"))
+    
+    # Chỉ đưa vùng quanh người biểu diễn vào YOLO sau khi đã tìm thấy người đó
+    POSE_ROI_TRACKING = os.getenv("POSE_ROI_TRACKING", "false").lower() in ("1", "true", "yes")
+    # Nới vùng cắt thêm tỉ lệ này của cạnh dài khung keypoints về mỗi phía
+    POSE_ROI_PAD = float(os.getenv("POSE_ROI_PAD", "0.25"))
+    # Keypoints cách mép vùng cắt dưới tỉ lệ này -> coi như mất dấu, detect lại cả frame
+    POSE_ROI_EDGE_MARGIN = float(os.getenv("POSE_ROI_EDGE_MARGIN", "0.02"))
+    POSE_ROI_MIN_SIZE = int(os.getenv("POSE_ROI_MIN_SIZE", "256"))
+    
+    # Bỏ đoạn đứng yên đầu/cuối video (dò chuyển động bằng hiệu ảnh xám thu nhỏ trước khi chạy model)
+    POSE_MOTION_TRIM = os.getenv("POSE_MOTION_TRIM", "false").lower() in ("1", "true", "yes")
+    POSE_MOTION_SAMPLE_FPS = float(os.getenv("POSE_MOTION_SAMPLE_FPS", "10"))
+    POSE_MOTION_WIDTH = int(os.getenv("POSE_MOTION_WIDTH", "160"))
+    # Ngưỡng chênh lệch xám trung bình (0-255) giữa hai mẫu liên tiếp để coi là có chuyển động
+    POSE_MOTION_TRIM_THRESHOLD = float(os.getenv("POSE_MOTION_TRIM_THRESHOLD", "2.0"))
+    POSE_MOTION_PAD_SECONDS = float(os.getenv("POSE_MOTION_PAD_SECONDS", "0.5"))
+    # Frame gần như không đổi so với frame vừa suy luận thì dùng lại keypoints của frame đó
+    POSE_STATIC_SKIP = os.getenv("POSE_STATIC_SKIP", "false").lower() in ("1", "true", "yes")
+    POSE_STATIC_THRESHOLD = float(os.getenv("POSE_STATIC_THRESHOLD", "1.0"))
+    
+    # Cận dưới DTW (LB_Kim, LB_Keogh) để loại sớm bài làm lệch hẳn trước khi chạy DTW đầy đủ
+    POSE_LB_STAGES = [s.strip() for s in os.getenv("POSE_LB_STAGES", "kim,keogh").split(",") if s.strip()]
+    # Loại nếu tổng điểm tối đa còn có thể đạt được vẫn dưới ngưỡng này (0 = tắt, mặc định).
+    # Bật lên thì bài bị loại nhận điểm DTW từ cận dưới thay vì DTW thật -> điểm lưu khác đi
+    POSE_LB_REJECT_TOTAL = float(os.getenv("POSE_LB_REJECT_TOTAL", "0"))
+    # Loại nếu cận dưới khoảng cách DTW vượt ngưỡng này (0 = tắt)
+    POSE_LB_MAX_DISTANCE = float(os.getenv("POSE_LB_MAX_DISTANCE", "0"))
+    
+    # Decode/inference pipeline: số frame tối đa chờ trong hàng đợi giữa hai tầng
+    PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "32"))
+    # In thống kê pipeline (decode / suy luận) của từng request ra log, để dò nút thắt
+    PIPELINE_DEBUG = os.getenv("PIPELINE_DEBUG", "false").lower() in ("1", "true", "yes")
+    
+    # Backend suy luận YOLO: torch (Ultralytics) | onnx (ONNX Runtime, xuất .onnx cạnh file .pt)
+    INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+    # Số thread intra-op của ONNX Runtime, 0 = mặc định của ORT (số core vật lý)
+    ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+    ONNX_PROVIDERS = [p.strip() for p in os.getenv("ONNX_PROVIDERS", "CPUExecutionProvider").split(",") if p.strip()]
+    # Độ chính xác của model: fp32 | fp16 (GPU) | int8_dynamic | int8_static (CPU, chỉ backend onnx)
+    POSE_MODEL_VARIANT = os.getenv("POSE_MODEL_VARIANT", "fp32")
+    WEAPON_MODEL_VARIANT = os.getenv("WEAPON_MODEL_VARIANT", "fp32")
+    # Kích thước ảnh đưa vào YOLO (cạnh dài, bội số của 32); nhỏ hơn thì nhanh hơn nhưng kém chính xác hơn
+    POSE_IMGSZ = int(os.getenv("POSE_IMGSZ", "640"))
+    WEAPON_IMGSZ = int(os.getenv("WEAPON_IMGSZ", "640"))
+    # Video giáo viên dùng để hiệu chỉnh int8_static (chỉ cần khi file variant chưa được tạo)
+    QUANT_CALIBRATION_DIR = os.getenv("QUANT_CALIBRATION_DIR", "")
+    QUANT_CALIBRATION_FRAMES = int(os.getenv("QUANT_CALIBRATION_FRAMES", "200"))
+    # File .onnx / variant được tạo lúc build image (deploy.build_model_variants); true = cho phép tạo lúc nạp model
+    QUANT_BUILD_ON_LOAD = os.getenv("QUANT_BUILD_ON_LOAD", "false").lower() in ("1", "true", "yes")
+    
+    # Nạp model + chạy suy luận giả khi container khởi động
+    WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+    
+    # Session chấm trực tiếp (/pose/stream): hết hạn sau số giây không hoạt động, số session tối đa mỗi container
+    POSE_STREAM_TTL_SECONDS = int(os.getenv("POSE_STREAM_TTL_SECONDS", "300"))
+    POSE_STREAM_MAX_SESSIONS = int(os.getenv("POSE_STREAM_MAX_SESSIONS", "32"))
+    # modal.Dict chứa state session để chunk / finish gửi tới container khác vẫn chấm tiếp; để trống = mỗi session chỉ sống trong container đã mở nó
+    POSE_STREAM_DICT = os.getenv("POSE_STREAM_DICT", f"{APP_NAME}-pose-stream")
+    
+    # Kho template giáo viên theo template_id (sha256); đặt TEMPLATES_VOLUME để dùng Modal Volume
+    TEMPLATES_DIR = os.getenv("TEMPLATES_DIR", "/root/templates")
+    TEMPLATES_VOLUME = os.getenv("TEMPLATES_VOLUME", "")
+    
+    # Nhận diện vũ khí trong video: lấy mẫu mỗi WEAPON_SAMPLE_STRIDE giây, tối đa WEAPON_MAX_SAMPLES frame
+    WEAPON_SAMPLE_STRIDE = float(os.getenv("WEAPON_SAMPLE_STRIDE", "1.0"))
+    WEAPON_MAX_SAMPLES = int(os.getenv("WEAPON_MAX_SAMPLES", "8"))
+    # Dừng sớm khi tổng confidence của loại dẫn đầu hơn loại thứ hai ít nhất mức này
+    WEAPON_VOTE_MARGIN = float(os.getenv("WEAPON_VOTE_MARGIN", "0.8"))
+    # /weapon/detect-batch: số ảnh mỗi lần suy luận, số ảnh tối đa mỗi request
+    WEAPON_BATCH_SIZE = int(os.getenv("WEAPON_BATCH_SIZE", "16"))
+    WEAPON_BATCH_MAX_IMAGES = int(os.getenv("WEAPON_BATCH_MAX_IMAGES", "500"))
+    
     # Environment Variables for Container
     YOLO_MODELS_DIR = os.getenv("YOLO_MODELS_DIR", "/root/models")
 
@@ -2,7 +2,8 @@ import os
 import modal
 from modal import Image, App, web_endpoint, asgi_app
 from fastapi import FastAPI, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List
 import tempfile
 import shutil
 
@@ -44,6 +45,45 @@ def download_model():
     return model_path
 
 
+def build_model_variants():
+    """Xuất ONNX và lượng tử hoá model lúc build image, container chỉ việc nạp file có sẵn."""
+    import os
+    import sys
+    import shutil
+
+    if "/root" not in sys.path:
+        sys.path.insert(0, "/root")
+
+    from config import ModalConfig
+
+    if ModalConfig.INFERENCE_BACKEND.lower() != "onnx":
+        print(f"[Build] Backend '{ModalConfig.INFERENCE_BACKEND}' không cần tạo model variant", flush=True)
+        return
+
+    from app.services.inference.backends import prepare_backend
+    from app.services.pose_scoring.pose_scorer import PoseScorer, MODELS_DIR
+    from app.utils.model_loader import ensure_weapon_model
+
+    pose_path = os.path.join(MODELS_DIR, PoseScorer._model_name)
+    if not os.path.exists(pose_path):
+        PoseScorer._download_pose_weights(pose_path)
+        # Ultralytics có thể tải weights vào thư mục hiện tại thay vì ~/.ultralytics
+        if not os.path.exists(pose_path) and os.path.exists(PoseScorer._model_name):
+            shutil.copy2(PoseScorer._model_name, pose_path)
+
+    targets = [
+        ("pose", pose_path, ModalConfig.POSE_MODEL_VARIANT, ModalConfig.POSE_IMGSZ),
+        ("weapon", ensure_weapon_model(), ModalConfig.WEAPON_MODEL_VARIANT, ModalConfig.WEAPON_IMGSZ),
+    ]
+    for name, weights, variant, imgsz in targets:
+        path = prepare_backend(weights, backend="onnx", variant=variant, imgsz=imgsz)
+        print(f"[Build] {name}: {variant} -> {path}", flush=True)
+
+
+# Thư mục ảnh hiệu chỉnh int8_static được chép vào image để lượng tử hoá lúc build
+REMOTE_CALIBRATION_DIR = "/root/calibration"
+
+
 # Build image với cấu hình từ config
 # Đọc tất cả environment variables từ .env và set vào image
 env_vars = {
@@ -66,6 +106,57 @@ env_vars = {
     "POSE_CONCURRENT_INPUTS": str(ModalConfig.POSE_CONCURRENT_INPUTS),
     "POSE_TIMEOUT": str(ModalConfig.POSE_TIMEOUT),
     "POSE_CONTAINER_IDLE_TIMEOUT": str(ModalConfig.POSE_CONTAINER_IDLE_TIMEOUT),
+    "POSE_DTW_BAND": str(ModalConfig.POSE_DTW_BAND),
+    "POSE_DTW_BACKEND": ModalConfig.POSE_DTW_BACKEND,
+    "POSE_DTW_BAND_RATIO": str(ModalConfig.POSE_DTW_BAND_RATIO),
+    "POSE_FASTDTW_RADIUS": str(ModalConfig.POSE_FASTDTW_RADIUS),
+    "POSE_DTW_MULTISCALE_MIN_LENGTH": str(ModalConfig.POSE_DTW_MULTISCALE_MIN_LENGTH),
+    "POSE_DTW_MULTISCALE_RADIUS": str(ModalConfig.POSE_DTW_MULTISCALE_RADIUS),
+    "POSE_DTW_MULTISCALE_COARSEST": str(ModalConfig.POSE_DTW_MULTISCALE_COARSEST),
+    "POSE_BATCH_SIZE": str(ModalConfig.POSE_BATCH_SIZE),
+    "POSE_TARGET_FPS": str(ModalConfig.POSE_TARGET_FPS),
+    "POSE_MAX_FRAMES": str(ModalConfig.POSE_MAX_FRAMES),
+    "POSE_TEMPLATE_FPS": str(ModalConfig.POSE_TEMPLATE_FPS),
+    "POSE_TEMPLATE_DTYPE": ModalConfig.POSE_TEMPLATE_DTYPE,
+    "POSE_PARALLEL_WORKERS": str(ModalConfig.POSE_PARALLEL_WORKERS),
+    "POSE_PARALLEL_MIN_FRAMES": str(ModalConfig.POSE_PARALLEL_MIN_FRAMES),
+    "POSE_ROI_TRACKING": str(ModalConfig.POSE_ROI_TRACKING).lower(),
+    "POSE_ROI_PAD": str(ModalConfig.POSE_ROI_PAD),
+    "POSE_ROI_EDGE_MARGIN": str(ModalConfig.POSE_ROI_EDGE_MARGIN),
+    "POSE_ROI_MIN_SIZE": str(ModalConfig.POSE_ROI_MIN_SIZE),
+    "POSE_MOTION_TRIM": str(ModalConfig.POSE_MOTION_TRIM).lower(),
+    "POSE_MOTION_SAMPLE_FPS": str(ModalConfig.POSE_MOTION_SAMPLE_FPS),
+    "POSE_MOTION_WIDTH": str(ModalConfig.POSE_MOTION_WIDTH),
+    "POSE_MOTION_TRIM_THRESHOLD": str(ModalConfig.POSE_MOTION_TRIM_THRESHOLD),
+    "POSE_MOTION_PAD_SECONDS": str(ModalConfig.POSE_MOTION_PAD_SECONDS),
+    "POSE_STATIC_SKIP": str(ModalConfig.POSE_STATIC_SKIP).lower(),
+    "POSE_STATIC_THRESHOLD": str(ModalConfig.POSE_STATIC_THRESHOLD),
+    "POSE_LB_STAGES": ",".join(ModalConfig.POSE_LB_STAGES),
+    "POSE_LB_REJECT_TOTAL": str(ModalConfig.POSE_LB_REJECT_TOTAL),
+    "POSE_LB_MAX_DISTANCE": str(ModalConfig.POSE_LB_MAX_DISTANCE),
+    "PIPELINE_QUEUE_SIZE": str(ModalConfig.PIPELINE_QUEUE_SIZE),
+    "PIPELINE_DEBUG": str(ModalConfig.PIPELINE_DEBUG).lower(),
+    "INFERENCE_BACKEND": ModalConfig.INFERENCE_BACKEND,
+    "ONNX_INTRA_OP_THREADS": str(ModalConfig.ONNX_INTRA_OP_THREADS),
+    "ONNX_PROVIDERS": ",".join(ModalConfig.ONNX_PROVIDERS),
+    "POSE_MODEL_VARIANT": ModalConfig.POSE_MODEL_VARIANT,
+    "WEAPON_MODEL_VARIANT": ModalConfig.WEAPON_MODEL_VARIANT,
+    "POSE_IMGSZ": str(ModalConfig.POSE_IMGSZ),
+    "WEAPON_IMGSZ": str(ModalConfig.WEAPON_IMGSZ),
+    "QUANT_CALIBRATION_DIR": REMOTE_CALIBRATION_DIR if ModalConfig.QUANT_CALIBRATION_DIR else "",
+    "QUANT_CALIBRATION_FRAMES": str(ModalConfig.QUANT_CALIBRATION_FRAMES),
+    "QUANT_BUILD_ON_LOAD": str(ModalConfig.QUANT_BUILD_ON_LOAD).lower(),
+    "WARMUP_ON_STARTUP": str(ModalConfig.WARMUP_ON_STARTUP).lower(),
+    "POSE_STREAM_TTL_SECONDS": str(ModalConfig.POSE_STREAM_TTL_SECONDS),
+    "POSE_STREAM_MAX_SESSIONS": str(ModalConfig.POSE_STREAM_MAX_SESSIONS),
+    "POSE_STREAM_DICT": ModalConfig.POSE_STREAM_DICT,
+    "TEMPLATES_DIR": ModalConfig.TEMPLATES_DIR,
+    "TEMPLATES_VOLUME": ModalConfig.TEMPLATES_VOLUME,
+    "WEAPON_SAMPLE_STRIDE": str(ModalConfig.WEAPON_SAMPLE_STRIDE),
+    "WEAPON_MAX_SAMPLES": str(ModalConfig.WEAPON_MAX_SAMPLES),
+    "WEAPON_VOTE_MARGIN": str(ModalConfig.WEAPON_VOTE_MARGIN),
+    "WEAPON_BATCH_SIZE": str(ModalConfig.WEAPON_BATCH_SIZE),
+    "WEAPON_BATCH_MAX_IMAGES": str(ModalConfig.WEAPON_BATCH_MAX_IMAGES),
 }
 
 image = (
@@ -75,25 +166,139 @@ image = (
     .add_local_file("config.py", remote_path="/root/config.py", copy=True)
     .env(env_vars)
     .run_function(download_model)
-    .add_local_dir(ModalConfig.LOCAL_APP_DIR, remote_path=ModalConfig.REMOTE_APP_PATH)
+    # copy=True: code app phải có trong image để build_model_variants chạy được
+    .add_local_dir(ModalConfig.LOCAL_APP_DIR, remote_path=ModalConfig.REMOTE_APP_PATH, copy=True)
 )
+if ModalConfig.QUANT_CALIBRATION_DIR:
+    image = image.add_local_dir(ModalConfig.QUANT_CALIBRATION_DIR, remote_path=REMOTE_CALIBRATION_DIR, copy=True)
+image = image.run_function(build_model_variants)
 
 app = App(ModalConfig.APP_NAME)
 
+# Kho template giáo viên dùng chung giữa các container (Modal Volume)
+templates_volume = (
+    modal.Volume.from_name(ModalConfig.TEMPLATES_VOLUME, create_if_missing=True)
+    if ModalConfig.TEMPLATES_VOLUME else None
+)
+
+# State session /pose/stream dùng chung giữa các container (app autoscale nhiều container)
+stream_state = (
+    modal.Dict.from_name(ModalConfig.POSE_STREAM_DICT, create_if_missing=True)
+    if ModalConfig.POSE_STREAM_DICT else None
+)
+
 # Tạo FastAPI app
 web_app = FastAPI()
 
 
+def convert_to_native(obj):
+    import numpy as np
+
+    if isinstance(obj, np.integer):
+        return int(obj)
+    elif isinstance(obj, np.floating):
+        return float(obj)
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, dict):
+        return {key: convert_to_native(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_to_native(item) for item in obj]
+    return obj
+
+
+def store_template(template_bytes, features_bytes=None):
+    from app.services.pose_scoring.template_store import TemplateStore
+
+    template_id = TemplateStore.put(template_bytes, features_bytes)
+    if templates_volume is not None:
+        templates_volume.commit()
+    return template_id
+
+
+def find_template(template_id):
+    from app.services.pose_scoring.template_store import TemplateStore
+
+    path = TemplateStore.template_path(template_id)
+    if path is None and templates_volume is not None:
+        # Template có thể vừa được container khác ghi vào volume
+        templates_volume.reload()
+        path = TemplateStore.template_path(template_id)
+    return path, TemplateStore.features_path(template_id) if path else None
+
+
+def share_stream_template(template_id, template_path, features_path):
+    # Container nhận chunk có thể không thấy template (không có TEMPLATES_VOLUME): gửi kèm qua stream_state
+    key = f"template:{template_id}"
+    if stream_state is None or key in stream_state:
+        return
+    with open(template_path, "rb") as f:
+        template_bytes = f.read()
+    features_bytes = None
+    if features_path:
+        with open(features_path, "rb") as f:
+            features_bytes = f.read()
+    stream_state[key] = (template_bytes, features_bytes)
+
+
+def find_stream_template(template_id):
+    path, features_path = find_template(template_id)
+    if path is None and stream_state is not None:
+        shared = stream_state.get(f"template:{template_id}")
+        if shared is not None:
+            # Kho theo nội dung: ghi lại cho ra đúng template_id
+            store_template(*shared)
+            path, features_path = find_template(template_id)
+    return path, features_path
+
+
+# ===== STARTUP WARM-UP / READINESS =====
+@web_app.on_event("startup")
+def warm_up_models():
+    if ModalConfig.WARMUP_ON_STARTUP:
+        from app.services.warmup import ModelWarmup
+
+        # Chạy nền để container vẫn nhận được /ready trong lúc nạp model
+        ModelWarmup.start_background()
+
+
+@web_app.on_event("startup")
+def share_stream_sessions():
+    if stream_state is not None:
+        from app.services.pose_scoring.streaming import StreamSessions
+
+        StreamSessions.share(stream_state, resolve_template=find_stream_template)
+
+
+@web_app.get("/ready")
+def ready_endpoint(model: str = None):
+    """200 khi mọi model (hoặc chỉ `model` nếu truyền ?model=pose|weapon) đã sẵn sàng, 503 nếu chưa."""
+    from app.services.warmup import ModelWarmup
+
+    if not ModalConfig.WARMUP_ON_STARTUP:
+        return {"status": "disabled", "ready": True}
+    state = ModelWarmup.status()
+    ready = state["ready"] if model is None else state["models"].get(model, {}).get("ready", False)
+    return JSONResponse(status_code=200 if ready else 503, content=state)
+
+
 # ===== WEAPON DETECTION =====
 @web_app.post("/weapon/detect")
 async def weapon_detect_endpoint(video: UploadFile = File(...)):
     from app.services.weapon_detection.weapon_detector import WeaponDetector
 
+    content = await video.read()
+    if WeaponDetector.is_image(content, video.filename):
+        # Ảnh được giải mã thẳng từ bytes của request, không ghi ra đĩa
+        try:
+            return WeaponDetector.detect_from_image_bytes(content)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+
     temp_dir = tempfile.mkdtemp()
     try:
         video_path = os.path.join(temp_dir, video.filename or "video.mp4")
         with open(video_path, "wb") as f:
-            content = await video.read()
             f.write(content)
 
         result = WeaponDetector.detect_from_video(video_path)
@@ -102,11 +307,64 @@ async def weapon_detect_endpoint(video: UploadFile = File(...)):
         shutil.rmtree(temp_dir, ignore_errors=True)
 
 
+@web_app.post("/weapon/detect-batch")
+async def weapon_detect_batch_endpoint(
+    images: List[UploadFile] = File(None),
+    archive: UploadFile = File(None),
+    batch_size: int = Form(None),
+):
+    """Nhận diện vũ khí cho nhiều ảnh (nhiều trường `images` và/hoặc một file zip `archive`).
+
+    Trả về NDJSON, mỗi dòng một ảnh theo đúng thứ tự gửi lên:
+    {"index", "filename", "result"} hoặc {"index", "filename", "error"}.
+    """
+    from app.services.weapon_detection.weapon_detector import WeaponDetector
+    import io
+    import json
+    import zipfile
+
+    items = [(image.filename or f"image_{i}", await image.read()) for i, image in enumerate(images or [])]
+    members = []
+    if archive is not None:
+        try:
+            zf = zipfile.ZipFile(io.BytesIO(await archive.read()))
+        except zipfile.BadZipFile as e:
+            return JSONResponse(status_code=400, content={"error": f"Invalid zip archive: {e}"})
+        members = WeaponDetector.archive_members(zf)
+    total = len(items) + len(members)
+    if total == 0:
+        return JSONResponse(status_code=400, content={"error": "No images provided"})
+    if total > ModalConfig.WEAPON_BATCH_MAX_IMAGES:
+        return JSONResponse(status_code=400, content={
+            "error": f"Too many images: {total} (max {ModalConfig.WEAPON_BATCH_MAX_IMAGES})"
+        })
+
+    # Nạp model trước khi bắt đầu stream để lỗi nạp model trả về đúng mã lỗi HTTP
+    WeaponDetector._load_model()
+
+    def source():
+        yield from items
+        # Đọc từng file trong zip khi tới lượt, không giải nén cả archive vào bộ nhớ
+        for info in members:
+            yield info.filename, zf.read(info)
+
+    def lines():
+        for row in WeaponDetector.batch_rows(source(), batch_size):
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+
+    print(f"[WeaponBatch] {total} images, batch_size={batch_size or ModalConfig.WEAPON_BATCH_SIZE}", flush=True)
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 # ===== EXTRACT TEMPLATE =====
 @web_app.post("/pose/extract-template")
-async def extract_template_endpoint(video: UploadFile = File(...)):
+async def extract_template_endpoint(
+    video: UploadFile = File(...),
+    target_fps: float = Form(None),
+    max_frames: int = Form(None),
+):
     from app.services.pose_scoring.pose_scorer import PoseScorer
-    import numpy as np
+    from app.services.pose_scoring import teacher_features, template_format
     import base64
 
     temp_dir = tempfile.mkdtemp()
@@ -116,14 +374,28 @@ async def extract_template_endpoint(video: UploadFile = File(...)):
             content = await video.read()
             f.write(content)
 
-        template = PoseScorer.extract_template_from_video(video_path)
-        template_bytes = template.tobytes()
+        template, info = PoseScorer.extract_template_from_video(
+            video_path, target_fps=target_fps, max_frames=max_frames, return_info=True
+        )
+        # File .wrtt: header (fps, đã normalize, checksum) + payload, lưu thẳng ra đĩa là dùng được
+        template_bytes = PoseScorer.encode_teacher_template(template, info["effective_fps"])
         template_b64 = base64.b64encode(template_bytes).decode("utf-8")
+        # Bundle dựng từ đúng dữ liệu trong file (payload float16 khác template gốc)
+        bundle = teacher_features.build_bundle(PoseScorer.decode_teacher_template(template_bytes))
+        features_bytes = teacher_features.bundle_to_bytes(bundle)
+        features_b64 = base64.b64encode(features_bytes).decode("utf-8")
+        template_id = store_template(template_bytes, features_bytes)
 
         return {
             "template": template_b64,
+            "format": "wrtt",
+            "format_version": template_format.FORMAT_VERSION,
             "shape": template.shape,
-            "dtype": str(template.dtype),
+            "dtype": ModalConfig.POSE_TEMPLATE_DTYPE,
+            "fps": info["effective_fps"],
+            "features": features_b64,
+            "template_id": template_id,
+            "frames_skipped": info["frames_skipped"],
         }
     finally:
         shutil.rmtree(temp_dir, ignore_errors=True)
@@ -134,9 +406,16 @@ async def extract_template_endpoint(video: UploadFile = File(...)):
 async def pose_score_endpoint(
     student_video: UploadFile = File(...),
     teacher_template: UploadFile = File(...),
+    target_fps: float = Form(None),
+    max_frames: int = Form(None),
+    teacher_fps: float = Form(None),
+    teacher_features: UploadFile = File(None),
+    dtw_backend: str = Form(None),
+    return_keypoints: bool = Form(False),
 ):
     from app.services.pose_scoring.pose_scorer import PoseScorer
-    import numpy as np
+    from app.services.pose_scoring.template_store import TemplateStore
+    import base64
 
     temp_dir = tempfile.mkdtemp()
     try:
@@ -152,23 +431,31 @@ async def pose_score_endpoint(
         with open(template_path, "wb") as f:
             f.write(await teacher_template.read())
 
+        # Teacher feature bundle (nếu client gửi kèm)
+        bundle_path = None
+        if teacher_features is not None:
+            bundle_path = os.path.join(temp_dir, "teacher_features.npz")
+            with open(bundle_path, "wb") as f:
+                f.write(await teacher_features.read())
+
         # Score
-        result = PoseScorer.score_video(student_path, template_path)
+        result = PoseScorer.score_video(
+            student_path,
+            template_path,
+            target_fps=target_fps,
+            max_frames=max_frames,
+            teacher_fps=teacher_fps,
+            teacher_bundle_path=bundle_path,
+            dtw_backend=dtw_backend,
+            return_keypoints=return_keypoints,
+        )
+        if return_keypoints:
+            # Chuỗi keypoints học viên dạng .npy (base64), gửi lại /pose/score-keypoints để chấm lại
+            keypoints_bytes = TemplateStore.template_to_bytes(result.pop("keypoints"))
+            result["keypoints"] = base64.b64encode(keypoints_bytes).decode("utf-8")
+            result["keypoints_format"] = "normalized"
 
         # Convert numpy types to Python native types
-        def convert_to_native(obj):
-            if isinstance(obj, np.integer):
-                return int(obj)
-            elif isinstance(obj, np.floating):
-                return float(obj)
-            elif isinstance(obj, np.ndarray):
-                return obj.tolist()
-            elif isinstance(obj, dict):
-                return {key: convert_to_native(value) for key, value in obj.items()}
-            elif isinstance(obj, list):
-                return [convert_to_native(item) for item in obj]
-            return obj
-
         result = convert_to_native(result)
         return result
 
@@ -176,6 +463,229 @@ async def pose_score_endpoint(
         shutil.rmtree(temp_dir, ignore_errors=True)
 
 
+# ===== ANALYZE (WEAPON + POSE, MỘT LẦN GIẢI MÃ) =====
+@web_app.post("/analyze")
+async def analyze_endpoint(
+    student_video: UploadFile = File(...),
+    teacher_template: UploadFile = File(...),
+    target_fps: float = Form(None),
+    max_frames: int = Form(None),
+    teacher_fps: float = Form(None),
+    teacher_features: UploadFile = File(None),
+    dtw_backend: str = Form(None),
+    return_keypoints: bool = Form(False),
+):
+    """Nhận diện vũ khí và chấm pose trên cùng một lần giải mã video (xem VideoAnalyzer)."""
+    from app.services.analyze import VideoAnalyzer
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        student_path = os.path.join(temp_dir, student_video.filename or "student.mp4")
+        with open(student_path, "wb") as f:
+            f.write(await student_video.read())
+
+        template_path = os.path.join(temp_dir, teacher_template.filename or "template.npy")
+        with open(template_path, "wb") as f:
+            f.write(await teacher_template.read())
+
+        bundle_path = None
+        if teacher_features is not None:
+            bundle_path = os.path.join(temp_dir, "teacher_features.npz")
+            with open(bundle_path, "wb") as f:
+                f.write(await teacher_features.read())
+
+        try:
+            result = VideoAnalyzer.analyze(
+                student_path,
+                template_path,
+                target_fps=target_fps,
+                max_frames=max_frames,
+                teacher_fps=teacher_fps,
+                teacher_bundle_path=bundle_path,
+                dtw_backend=dtw_backend,
+                return_keypoints=return_keypoints,
+            )
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        return convert_to_native(result)
+
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@web_app.get("/pose/version")
+def pose_version_endpoint():
+    from app.services.pose_scoring.pose_scorer import PoseScorer
+
+    return {"scorer_version": PoseScorer.scorer_version()}
+
+
+# ===== TEMPLATE STORE =====
+@web_app.post("/pose/templates")
+async def register_template_endpoint(teacher_template: UploadFile = File(...)):
+    from app.services.pose_scoring.pose_scorer import PoseScorer
+    from app.services.pose_scoring import teacher_features
+
+    content = await teacher_template.read()
+    try:
+        template = PoseScorer.decode_teacher_template(content)
+        bundle = teacher_features.build_bundle(template)
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": f"Invalid template: {e}"})
+    template_id = store_template(content, teacher_features.bundle_to_bytes(bundle))
+    return {"template_id": template_id, "shape": template.shape}
+
+
+# ===== POSE SCORE (KEYPOINTS ONLY) =====
+@web_app.post("/pose/score-keypoints")
+async def pose_score_keypoints_endpoint(
+    student_keypoints: UploadFile = File(...),
+    keypoints_format: str = Form("normalized"),
+    student_fps: float = Form(None),
+    teacher_template: UploadFile = File(None),
+    template_id: str = Form(None),
+    teacher_fps: float = Form(None),
+    teacher_features: UploadFile = File(None),
+    dtw_backend: str = Form(None),
+):
+    from app.services.pose_scoring.pose_scorer import PoseScorer
+    import numpy as np
+    import io
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        try:
+            keypoints = np.load(io.BytesIO(await student_keypoints.read()))
+            if template_id:
+                template_path, bundle_path = find_template(template_id)
+                if template_path is None:
+                    return JSONResponse(status_code=404, content={"error": f"Unknown template_id: {template_id}"})
+            elif teacher_template is not None:
+                template_path = os.path.join(temp_dir, "template.npy")
+                with open(template_path, "wb") as f:
+                    f.write(await teacher_template.read())
+                bundle_path = None
+            else:
+                return JSONResponse(status_code=400, content={"error": "teacher_template or template_id is required"})
+            if teacher_features is not None:
+                bundle_path = os.path.join(temp_dir, "teacher_features.npz")
+                with open(bundle_path, "wb") as f:
+                    f.write(await teacher_features.read())
+
+            result = PoseScorer.score_keypoints(
+                keypoints,
+                template_path,
+                keypoints_format=keypoints_format,
+                student_fps=student_fps,
+                teacher_fps=teacher_fps,
+                teacher_bundle_path=bundle_path,
+                dtw_backend=dtw_backend,
+            )
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e)})
+        return convert_to_native(result)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+# ===== LIVE STREAMING SESSIONS =====
+@web_app.post("/pose/stream/start")
+async def pose_stream_start_endpoint(
+    teacher_template: UploadFile = File(None),
+    template_id: str = Form(None),
+    input_format: str = Form("video"),
+    student_fps: float = Form(None),
+    teacher_fps: float = Form(None),
+    dtw_backend: str = Form(None),
+):
+    from app.services.pose_scoring.pose_scorer import PoseScorer
+    from app.services.pose_scoring import teacher_features
+    from app.services.pose_scoring.streaming import StreamSessions
+
+    try:
+        if teacher_template is not None:
+            # Template upload được đưa vào kho để session không phụ thuộc file tạm của request này
+            content = await teacher_template.read()
+            bundle = teacher_features.build_bundle(PoseScorer.decode_teacher_template(content))
+            template_id = store_template(content, teacher_features.bundle_to_bytes(bundle))
+        elif not template_id:
+            return JSONResponse(status_code=400, content={"error": "teacher_template or template_id is required"})
+        template_path, bundle_path = find_template(template_id)
+        if template_path is None:
+            return JSONResponse(status_code=404, content={"error": f"Unknown template_id: {template_id}"})
+        share_stream_template(template_id, template_path, bundle_path)
+        session = StreamSessions.open(
+            template_id=template_id,
+            template_path=template_path,
+            bundle_path=bundle_path,
+            input_format=input_format,
+            student_fps=student_fps,
+            teacher_fps=teacher_fps,
+            dtw_backend=dtw_backend,
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return {
+        "session_id": session.id,
+        "template_id": template_id,
+        "input_format": session.input_format,
+        "teacher_frames": len(session.teacher),
+        "ttl_seconds": ModalConfig.POSE_STREAM_TTL_SECONDS,
+    }
+
+
+@web_app.post("/pose/stream/{session_id}/chunk")
+async def pose_stream_chunk_endpoint(session_id: str, chunk: UploadFile = File(...)):
+    from app.services.pose_scoring.streaming import StreamSessions
+    import numpy as np
+    import io
+
+    session = StreamSessions.get(session_id)
+    if session is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown or expired session: {session_id}"})
+    content = await chunk.read()
+    temp_dir = tempfile.mkdtemp()
+    try:
+        # Suy luận pose không giữ lock: chỉ nối frame + tính điểm tạm là cần tuần tự
+        if session.input_format == "video":
+            video_path = os.path.join(temp_dir, chunk.filename or "chunk.mp4")
+            with open(video_path, "wb") as f:
+                f.write(content)
+            rows = session.rows_from_video(video_path)
+        else:
+            rows = session.rows_from_keypoints(np.load(io.BytesIO(content)))
+        with session.lock:
+            estimate = session.append(rows)
+            StreamSessions.save(session)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return convert_to_native(estimate)
+
+
+@web_app.post("/pose/stream/{session_id}/finish")
+def pose_stream_finish_endpoint(session_id: str):
+    from app.services.pose_scoring.streaming import StreamSessions
+
+    session = StreamSessions.close(session_id)
+    if session is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown or expired session: {session_id}"})
+    try:
+        with session.lock:
+            result = session.finish()
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return convert_to_native(result)
+
+
+@web_app.delete("/pose/stream/{session_id}")
+def pose_stream_cancel_endpoint(session_id: str):
+    from app.services.pose_scoring.streaming import StreamSessions
+
+    return {"closed": StreamSessions.close(session_id) is not None}
+
+
 # ===== MOUNT FASTAPI =====
 @app.function(
     image=image,
@@ -184,6 +694,7 @@ async def pose_score_endpoint(
     timeout=3600,  # Tăng từ 1800
     container_idle_timeout=600,
     memory=8192,  # Thêm memory
+    volumes={ModalConfig.TEMPLATES_DIR: templates_volume} if templates_volume is not None else {},
 )
 @asgi_app()
 def fastapi_app():
@@ -0,0 +1,86 @@
+"""
+Shared fixtures for pytest tests
+"""
+import os
+import sys
+import pytest
+import numpy as np
+
+# `config` và `app` được import từ thư mục ai-server như trong container
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RANDOM_SEED = 42
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(RANDOM_SEED)
+
+
+@pytest.fixture
+def make_sequence(rng):
+    """Chuỗi (n, dim) biến thiên mượt như keypoints thật (random walk)."""
+    def make(n, dim=51, scale=0.05):
+        return np.cumsum(rng.normal(0, scale, size=(n, dim)), axis=0)
+    return make
+
+
+class FakeResult:
+    """Kết quả detect của một ảnh như backend trả về: len() = số box, .cls / .conf."""
+
+    def __init__(self, boxes=()):
+        self.cls = np.array([b[0] for b in boxes], dtype=np.float32)
+        self.conf = np.array([b[1] for b in boxes], dtype=np.float32)
+
+    def __len__(self):
+        return len(self.cls)
+
+
+class FakeWeaponModel:
+    """Model vũ khí giả: box của mỗi frame tra theo độ sáng trung bình (bội số của 50).
+
+    `boxes[level]` là danh sách (class_id, conf) cho frame có độ sáng `level`,
+    nên frame tô một màu trong video nén MJPG vẫn cho đúng box.
+    """
+    names = {0: "Sword", 1: "spear", 2: "stick", 3: "person"}
+
+    def __init__(self):
+        self.boxes = {}
+        self.calls = []
+
+    @staticmethod
+    def level(frame) -> int:
+        return int(round(float(np.mean(frame)) / 50)) * 50
+
+    @staticmethod
+    def frame(level, shape=(48, 64, 3)):
+        return np.full(shape, level, dtype=np.uint8)
+
+    def predict(self, source):
+        frames = source if isinstance(source, list) else [source]
+        self.calls.append(len(frames))
+        return [FakeResult(self.boxes.get(self.level(f), ())) for f in frames]
+
+
+@pytest.fixture
+def weapon_model(monkeypatch):
+    from app.services.weapon_detection.weapon_detector import WeaponDetector
+    model = FakeWeaponModel()
+    monkeypatch.setattr(WeaponDetector, "_model", model)
+    monkeypatch.setattr(WeaponDetector, "_lookup", None)
+    return model
+
+
+@pytest.fixture
+def make_video(tmp_path):
+    """Video MJPG tổng hợp: mỗi frame tô một màu theo `levels` (xem FakeWeaponModel)."""
+    import cv2
+
+    def make(levels, fps=10.0, size=(64, 48), name="video.avi"):
+        path = str(tmp_path / name)
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+        for level in levels:
+            writer.write(np.full((size[1], size[0], 3), level, dtype=np.uint8))
+        writer.release()
+        return path
+    return make
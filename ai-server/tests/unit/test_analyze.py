@@ -0,0 +1,167 @@
+"""
+Unit tests for fused weapon detection + pose scoring (/analyze) and WeaponFrameTap
+"""
+import base64
+import io
+import numpy as np
+import pytest
+from config import ModalConfig
+from app.services.analyze import VideoAnalyzer
+from app.services.pose_scoring.pose_scorer import PoseScorer
+from app.services.weapon_detection.weapon_detector import WeaponDetector, WeaponFrameTap
+from tests.conftest import FakeWeaponModel
+
+SWORD, SPEAR, STICK, PERSON = 0, 1, 2, 3
+FRAMES = 100
+SCORE_FIELDS = ("pose", "speed", "stability", "total")
+
+
+@pytest.fixture
+def sampling(monkeypatch):
+    # Mốc lấy mẫu vũ khí của video 100 frame @ 10 fps: 0, 10, 30, 40, 50, 60, 80, 90
+    monkeypatch.setattr(ModalConfig, "WEAPON_SAMPLE_STRIDE", 1.0)
+    monkeypatch.setattr(ModalConfig, "WEAPON_MAX_SAMPLES", 8)
+    monkeypatch.setattr(ModalConfig, "POSE_MAX_FRAMES", 0)
+    monkeypatch.setattr(ModalConfig, "POSE_STATIC_SKIP", False)
+    monkeypatch.setattr(ModalConfig, "POSE_ROI_TRACKING", False)
+
+
+@pytest.fixture
+def raw_pose(rng):
+    xy = rng.uniform(200, 400, size=(1, 17, 2)) + np.cumsum(rng.normal(0, 3, size=(FRAMES, 17, 2)), axis=0)
+    conf = np.full((FRAMES, 17, 1), 0.9)
+    return np.concatenate([xy, conf], axis=2).reshape(FRAMES, 51).astype(np.float32)
+
+
+@pytest.fixture
+def pose_model(monkeypatch, raw_pose):
+    """Model pose giả: frame thứ i (theo thứ tự giải mã) có keypoints raw_pose[i]."""
+    seen = []
+
+    def detect(model, frames, tracker=None, gate=None):
+        start = len(seen)
+        seen.extend(frames)
+        return [raw_pose[i] for i in range(start, start + len(frames))]
+
+    monkeypatch.setattr(PoseScorer, "_load_pose_model", classmethod(lambda cls: object()))
+    monkeypatch.setattr(PoseScorer, "_detect_keypoints", staticmethod(detect))
+    return seen
+
+
+@pytest.fixture
+def template_path(tmp_path, raw_pose):
+    teacher = PoseScorer.prepare_student_keypoints(raw_pose, "raw")
+    path = tmp_path / "teacher.bin"
+    path.write_bytes(PoseScorer.encode_teacher_template(teacher, fps=10.0))
+    return str(path)
+
+
+class TestAnalyze:
+
+    def test_weapon_and_pose_in_one_decode(self, sampling, weapon_model, pose_model, make_video, template_path):
+        weapon_model.boxes[100] = [(SWORD, 0.95)]
+        video = make_video([100] * FRAMES)
+        result = VideoAnalyzer.analyze(video, template_path)
+        assert result["weapon"]["detected_weapon"] == "Kiếm"
+        assert result["weapon"]["early_stop"] is True
+        assert result["pose"]["decided_by"] == "dtw"
+        # Vũ khí không giải mã video lần nữa: model pose thấy đúng mỗi frame một lần
+        assert len(pose_model) == FRAMES
+        assert "pose_error" not in result and "weapon_error" not in result
+
+    def test_pose_matches_score_video(self, sampling, weapon_model, pose_model, make_video, template_path):
+        video = make_video([100] * FRAMES)
+        fused = VideoAnalyzer.analyze(video, template_path)["pose"]
+        pose_model.clear()
+        alone = PoseScorer.score_video(video, template_path)
+        for field in SCORE_FIELDS:
+            assert fused[field] == alone[field], field
+
+    def test_weapon_matches_detect_from_video(self, sampling, weapon_model, pose_model, make_video, template_path):
+        weapon_model.boxes[200] = [(STICK, 0.9)]
+        video = make_video([0] * 30 + [200] * 70)
+        fused = VideoAnalyzer.analyze(video, template_path)["weapon"]
+        assert fused == WeaponDetector.detect_from_video(video)
+        assert fused["total_samples"] == 3
+
+    def test_return_keypoints(self, sampling, weapon_model, pose_model, make_video, template_path):
+        pose = VideoAnalyzer.analyze(make_video([100] * FRAMES), template_path, return_keypoints=True)["pose"]
+        keypoints = np.load(io.BytesIO(base64.b64decode(pose["keypoints"])))
+        assert keypoints.shape == (FRAMES, 51)
+        assert pose["keypoints_format"] == "normalized"
+
+    def test_pose_error_keeps_weapon(self, sampling, weapon_model, make_video, template_path, monkeypatch):
+        monkeypatch.setattr(PoseScorer, "_load_pose_model", classmethod(lambda cls: object()))
+        monkeypatch.setattr(PoseScorer, "_detect_keypoints",
+                            staticmethod(lambda model, frames, tracker=None, gate=None: [None] * len(frames)))
+        weapon_model.boxes[100] = [(SPEAR, 0.9)]
+        result = VideoAnalyzer.analyze(make_video([100] * FRAMES), template_path)
+        assert result["pose"] is None
+        assert result["pose_error"]
+        assert result["weapon"]["detected_weapon"] == WeaponDetector.WEAPONS[SPEAR]
+
+    def test_weapon_model_unavailable(self, sampling, pose_model, make_video, template_path, monkeypatch):
+        def fail():
+            raise RuntimeError("download failed")
+        monkeypatch.setattr(WeaponDetector, "_load_model", staticmethod(fail))
+        result = VideoAnalyzer.analyze(make_video([100] * FRAMES), template_path)
+        assert result["weapon"] is None
+        assert result["weapon_error"] == "download failed"
+        assert result["pose"]["decided_by"] == "dtw"
+
+    def test_unreadable_video(self, sampling, weapon_model, pose_model, tmp_path, template_path):
+        path = tmp_path / "broken.mp4"
+        path.write_bytes(b"not a video")
+        with pytest.raises(ValueError):
+            VideoAnalyzer.analyze(str(path), template_path)
+
+
+class TestWeaponFrameTap:
+
+    def feed(self, tap, video_levels, idxs, batch=16):
+        idxs = list(idxs)
+        for i in range(0, len(idxs), batch):
+            chunk = idxs[i:i + batch]
+            tap(chunk, [FakeWeaponModel.frame(video_levels[k]) for k in chunk])
+
+    def test_picks_sampling_marks(self, sampling, weapon_model, make_video):
+        levels = [0] * FRAMES
+        tap = WeaponFrameTap(make_video(levels))
+        self.feed(tap, levels, range(FRAMES))
+        assert tap.indices.tolist() == [0, 10, 30, 40, 50, 60, 80, 90]
+        assert tap.result()["total_samples"] == 8
+        # Mỗi batch 16 frame của pipeline pose chỉ một lần suy luận vũ khí (batch 64-79 không có mốc)
+        assert weapon_model.calls == [2, 1, 1, 2, 2]
+
+    def test_sparser_pipeline_uses_next_frame(self, sampling, weapon_model, make_video):
+        levels = [0] * FRAMES
+        tap = WeaponFrameTap(make_video(levels))
+        # Pipeline pose lấy mẫu mỗi 15 frame: 0, 15, 30, ... -> mốc 10 dùng frame 15, mốc 40 dùng frame 45
+        self.feed(tap, levels, range(0, FRAMES, 15), batch=2)
+        assert tap.result()["total_samples"] == 6
+
+    def test_no_inference_after_early_stop(self, sampling, weapon_model, make_video):
+        weapon_model.boxes[100] = [(SWORD, 0.95)]
+        levels = [100] * FRAMES
+        tap = WeaponFrameTap(make_video(levels))
+        self.feed(tap, levels, range(FRAMES), batch=4)
+        assert weapon_model.calls == [1]
+        assert tap.result()["early_stop"] is True
+
+    def test_vote_accumulates_across_batches(self, sampling, weapon_model, make_video):
+        weapon_model.boxes[150] = [(STICK, 0.3)]
+        levels = [150] * FRAMES
+        tap = WeaponFrameTap(make_video(levels))
+        self.feed(tap, levels, range(FRAMES), batch=8)
+        result = tap.result()
+        # 0.3 mỗi mốc: đủ cách biệt 0.8 sau mốc thứ ba (frame 30)
+        assert result["detected_weapon"] == WeaponDetector.WEAPONS[STICK]
+        assert result["total_samples"] == 3
+        assert result["early_stop"] is True
+
+    def test_unreadable_video(self, weapon_model, tmp_path):
+        path = tmp_path / "broken.mp4"
+        path.write_bytes(b"not a video")
+        with pytest.raises(ValueError, match="Cannot open video"):
+            WeaponFrameTap(str(path))
+
@@ -0,0 +1,142 @@
+"""
+Unit tests for the vectorized DTW recurrence (dtw.py) and the DTW backends
+"""
+import numpy as np
+import pytest
+from app.services.pose_scoring import dtw, dtw_backends
+
+
+def naive_dtw(a, b, band=None):
+    """DTW tham chiếu O(n*m): cost[i, j] = d[i, j] + min(trên, trái, chéo), chia n + m."""
+    n, m = len(a), len(b)
+    w = max(int(band), abs(n - m)) if band else None
+    cost = np.full((n + 1, m + 1), np.inf)
+    cost[0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            if w is not None and abs(i - j) > w:
+                continue
+            d = np.linalg.norm(a[i - 1] - b[j - 1])
+            cost[i, j] = d + min(cost[i - 1, j], cost[i, j - 1], cost[i - 1, j - 1])
+    return cost[n, m] / (n + m)
+
+
+def path_cost(a, b, path):
+    return sum(np.linalg.norm(a[i] - b[j]) for i, j in path) / (len(a) + len(b))
+
+
+def assert_valid_path(path, n, m, lo=None, hi=None):
+    assert tuple(path[0]) == (0, 0)
+    assert tuple(path[-1]) == (n - 1, m - 1)
+    steps = np.diff(path, axis=0)
+    assert np.all((steps >= 0) & (steps <= 1))
+    assert np.all(steps.sum(axis=1) >= 1)
+    if lo is not None:
+        assert np.all(path[:, 1] >= lo[path[:, 0]])
+        assert np.all(path[:, 1] <= hi[path[:, 0]])
+
+
+SHAPES = [(1, 1), (1, 7), (7, 1), (12, 12), (20, 33), (41, 17)]
+
+
+class TestDtwDistance:
+    """dtw_distance phải trùng DTW tham chiếu"""
+
+    @pytest.mark.parametrize("n,m", SHAPES)
+    def test_matches_naive(self, make_sequence, n, m):
+        a, b = make_sequence(n, dim=6), make_sequence(m, dim=6)
+        assert dtw.dtw_distance(a, b) == pytest.approx(naive_dtw(a, b), abs=1e-6)
+
+    @pytest.mark.parametrize("n,m", SHAPES)
+    @pytest.mark.parametrize("band", [1, 3, 8])
+    def test_matches_naive_with_band(self, make_sequence, n, m, band):
+        a, b = make_sequence(n, dim=6), make_sequence(m, dim=6)
+        assert dtw.dtw_distance(a, b, band=band) == pytest.approx(naive_dtw(a, b, band=band), abs=1e-6)
+
+    @pytest.mark.parametrize("n,m", SHAPES)
+    @pytest.mark.parametrize("band", [None, 3])
+    def test_backtracked_path_cost_equals_distance(self, make_sequence, n, m, band):
+        a, b = make_sequence(n, dim=6), make_sequence(m, dim=6)
+        distance, path = dtw.dtw_distance(a, b, band=band, return_path=True)
+        lo, hi = dtw.band_limits(n, m, band)
+        assert_valid_path(path, n, m, lo, hi)
+        assert path_cost(a, b, path) == pytest.approx(distance, abs=1e-6)
+
+    def test_empty_sequence(self, make_sequence):
+        assert dtw.dtw_distance(np.empty((0, 6)), make_sequence(5, dim=6)) == np.inf
+
+    def test_identical_sequences(self, make_sequence):
+        a = make_sequence(25, dim=6)
+        distance, path = dtw.dtw_distance(a, a, return_path=True)
+        assert distance == pytest.approx(0.0, abs=1e-9)
+        assert np.array_equal(path, np.stack([np.arange(25)] * 2, axis=1))
+
+
+class TestDtwStep:
+    """dtw_step (chấm trực tiếp) phải cho đúng các hàng của accumulate_cost"""
+
+    def test_rows_match_accumulate_cost(self, make_sequence):
+        a, b = make_sequence(30, dim=6), make_sequence(24, dim=6)
+        D = dtw.frame_distance_matrix(a, b)
+        lo, hi = dtw.band_limits(len(a), len(b))
+        _, rows = dtw.accumulate_cost(lambda i, l, h: D[i, l:h + 1], lo, hi, keep_rows=True)
+        row = None
+        for i in range(len(a)):
+            row = dtw.dtw_step(row, D[i])
+            np.testing.assert_allclose(row, rows[i], atol=1e-9)
+        assert row[-1] / (len(a) + len(b)) == pytest.approx(naive_dtw(a, b), abs=1e-6)
+
+
+class TestMultiscaleDtw:
+
+    @pytest.mark.parametrize("n,m", [(40, 40), (70, 55), (130, 96)])
+    def test_wide_corridor_equals_exact(self, make_sequence, n, m):
+        # Hành lang phủ cả lưới thì multiscale chính là DTW đầy đủ
+        a, b = make_sequence(n, dim=6), make_sequence(m, dim=6)
+        distance = dtw.multiscale_dtw(a, b, radius=max(n, m), min_length=8)
+        assert distance == pytest.approx(naive_dtw(a, b), abs=1e-6)
+
+    @pytest.mark.parametrize("radius", [1, 4, 8])
+    def test_path_cost_equals_distance(self, make_sequence, radius):
+        a, b = make_sequence(150, dim=6), make_sequence(120, dim=6)
+        distance, path = dtw.multiscale_dtw(a, b, radius=radius, min_length=16, return_path=True)
+        assert_valid_path(path, len(a), len(b))
+        assert path_cost(a, b, path) == pytest.approx(distance, abs=1e-6)
+        # Hành lang chỉ thu hẹp không gian tìm kiếm: không thể tốt hơn DTW đầy đủ
+        assert distance >= dtw.dtw_distance(a, b) - 1e-9
+
+    def test_short_sequences_fall_back_to_exact(self, make_sequence):
+        a, b = make_sequence(20, dim=6), make_sequence(18, dim=6)
+        assert dtw.multiscale_dtw(a, b, min_length=64) == pytest.approx(naive_dtw(a, b), abs=1e-6)
+
+    def test_corridor_distances_match_matrix(self, make_sequence):
+        a, b = make_sequence(33, dim=6), make_sequence(27, dim=6)
+        lo, hi = dtw.band_limits(len(a), len(b), 4)
+        cells, offsets = dtw.corridor_distances(a, b, lo, hi, chunk_cells=50)
+        D = dtw.frame_distance_matrix(a, b)
+        for i in range(len(a)):
+            np.testing.assert_allclose(cells[offsets[i]:offsets[i + 1]], D[i, lo[i]:hi[i] + 1], atol=1e-9)
+
+
+class TestBackends:
+    """Các backend đăng ký trong dtw_backends giữ cùng thang khoảng cách"""
+
+    def test_exact_backend(self, make_sequence):
+        a, b = make_sequence(35, dim=6), make_sequence(28, dim=6)
+        distance, path = dtw_backends.compute(a, b, backend="exact", return_path=True)
+        assert distance == pytest.approx(naive_dtw(a, b), abs=1e-6)
+        assert path_cost(a, b, path) == pytest.approx(distance, abs=1e-6)
+
+    def test_banded_backend(self, make_sequence):
+        a, b = make_sequence(35, dim=6), make_sequence(28, dim=6)
+        distance, _ = dtw_backends.compute(a, b, backend="banded", band=5)
+        assert distance == pytest.approx(naive_dtw(a, b, band=5), abs=1e-6)
+
+    def test_multiscale_backend(self, make_sequence):
+        a, b = make_sequence(90, dim=6), make_sequence(80, dim=6)
+        distance, _ = dtw_backends.compute(a, b, backend="multiscale", radius=100, min_length=8)
+        assert distance == pytest.approx(naive_dtw(a, b), abs=1e-6)
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            dtw_backends.get_backend("nope")
@@ -0,0 +1,116 @@
+"""
+Unit tests for target-fps sampling / frame cap and the teacher-template resampling it triggers
+"""
+import cv2
+import numpy as np
+import pytest
+from config import ModalConfig
+from app.services.pose_scoring.pose_scorer import PoseScorer
+from app.services.pose_scoring.streaming import StreamSession
+from app.utils.video_pipeline import plan_frame_indices
+
+FPS = 60.0
+SCORE_FIELDS = ("pose", "speed", "stability", "total")
+
+
+class FakeCapture:
+    def __init__(self, fps, total):
+        self.props = {cv2.CAP_PROP_FPS: fps, cv2.CAP_PROP_FRAME_COUNT: total}
+
+    def get(self, prop):
+        return self.props[prop]
+
+
+@pytest.fixture
+def motion(rng):
+    """Teacher / học viên dao động chậm như bài quyền dài, học viên lệch pha nhẹ và có nhiễu."""
+    def make(n):
+        t = np.arange(n)[:, None] / FPS
+        phase = rng.uniform(0, 2 * np.pi, 51)
+        freq = rng.uniform(0.1, 0.5, 51)
+        amp = rng.uniform(0.2, 1.0, 51)
+        teacher = (amp * np.sin(2 * np.pi * freq * t + phase)).astype(np.float32)
+        student = amp * np.sin(2 * np.pi * freq * t + phase + 0.1) + rng.normal(0, 0.002, (n, 51))
+        student = PoseScorer.smooth_ema(PoseScorer.smooth_sequence(student.astype(np.float32)))
+        return teacher, student
+    return make
+
+
+def write_template(tmp_path, teacher, fps=None):
+    if fps is None:
+        path = tmp_path / "teacher.npy"
+        np.save(path, teacher)
+    else:
+        path = tmp_path / "teacher.wrtt"
+        path.write_bytes(PoseScorer.encode_teacher_template(teacher, fps))
+    return str(path)
+
+
+class TestFrameCap:
+
+    def test_sampling_is_off_by_default(self):
+        assert ModalConfig.POSE_MAX_FRAMES == 0
+        assert ModalConfig.POSE_TARGET_FPS == 0
+        indices, src_fps, effective_fps = plan_frame_indices(
+            FakeCapture(FPS, 12000), ModalConfig.POSE_TARGET_FPS, ModalConfig.POSE_MAX_FRAMES
+        )
+        assert indices is None
+        assert effective_fps == src_fps == FPS
+
+    @pytest.mark.parametrize("max_frames", [3000, 1500])
+    def test_capped_matches_uncapped(self, tmp_path, motion, max_frames):
+        """Bài dài 100 s ở 60 fps: lấy mẫu đều xuống max_frames cho điểm như chấm đủ frame."""
+        n = 6000
+        teacher, student = motion(n)
+        template = write_template(tmp_path, teacher, fps=FPS)
+        uncapped = PoseScorer.score_keypoints(student, template)
+
+        indices, _, effective_fps = plan_frame_indices(FakeCapture(FPS, n), 0, max_frames)
+        assert len(indices) == max_frames
+        capped = PoseScorer.score_keypoints(student[indices], template, student_fps=effective_fps)
+        assert capped["decided_by"] == uncapped["decided_by"] == "dtw"
+        for field in SCORE_FIELDS:
+            assert capped[field] == pytest.approx(uncapped[field], abs=0.5), field
+
+    def test_stream_applies_the_same_time_scale(self, tmp_path, motion):
+        teacher, student = motion(1200)
+        template = write_template(tmp_path, teacher, fps=FPS)
+        indices, _, effective_fps = plan_frame_indices(FakeCapture(FPS, 1200), 0, 600)
+        sampled = student[indices]
+        session = StreamSession(template, input_format="normalized", student_fps=effective_fps)
+        estimate = session.append(sampled)
+        expected = PoseScorer.score_keypoints(sampled, template, student_fps=effective_fps)
+        for field in SCORE_FIELDS:
+            assert estimate[field] == pytest.approx(expected[field], rel=1e-5), field
+            assert session.finish()[field] == pytest.approx(expected[field], rel=1e-12), field
+
+
+class TestTemplateFps:
+
+    def test_header_fps_is_used(self, tmp_path, motion):
+        teacher, _ = motion(100)
+        template = write_template(tmp_path, teacher, fps=FPS)
+        assert PoseScorer.teacher_resample_fps(template, student_fps=30.0) == FPS
+        assert PoseScorer.teacher_resample_fps(template, student_fps=FPS) is None
+        assert PoseScorer.teacher_resample_fps(template, student_fps=None) is None
+
+    def test_legacy_template_without_fps_is_not_resampled(self, tmp_path, motion):
+        """.npy không lưu fps: không đoán 30 fps rồi kéo giãn template 60 fps gấp đôi."""
+        teacher, student = motion(600)
+        template = write_template(tmp_path, teacher)
+        assert PoseScorer.teacher_resample_fps(template, student_fps=30.0) is None
+        with_fps = PoseScorer.score_keypoints(student, template, student_fps=30.0)
+        without = PoseScorer.score_keypoints(student, template)
+        for field in SCORE_FIELDS:
+            assert with_fps[field] == without[field], field
+
+    def test_configured_legacy_fps(self, tmp_path, motion, monkeypatch):
+        monkeypatch.setattr(ModalConfig, "POSE_TEMPLATE_FPS", FPS)
+        teacher, _ = motion(100)
+        template = write_template(tmp_path, teacher)
+        assert PoseScorer.teacher_resample_fps(template, student_fps=30.0) == FPS
+
+    def test_explicit_teacher_fps_wins(self, tmp_path, motion):
+        teacher, _ = motion(100)
+        template = write_template(tmp_path, teacher, fps=FPS)
+        assert PoseScorer.teacher_resample_fps(template, student_fps=30.0, teacher_fps=30.0) is None
@@ -0,0 +1,32 @@
+"""
+Unit tests for the LB_Kim / LB_Keogh early-rejection cascade in PoseScorer
+"""
+import pytest
+from config import ModalConfig
+from app.services.pose_scoring.pose_scorer import PoseScorer
+
+
+class TestLbCascade:
+
+    def test_disabled_by_default(self, make_sequence):
+        """Mặc định luôn dùng DTW thật, kể cả bài có chặn trên tổng điểm rất thấp"""
+        a, b = make_sequence(60), make_sequence(60)
+        assert not PoseScorer.lb_cascade_enabled()
+        score, decided_by = PoseScorer._dtw_cascade(a, b, partial_total=0.0)
+        assert decided_by == "dtw"
+        assert score == pytest.approx(PoseScorer.score_dtw(a, b))
+        assert PoseScorer.scorer_version() == PoseScorer.SCORER_VERSION
+
+    def test_opt_in_rejects_and_changes_version(self, make_sequence, monkeypatch):
+        monkeypatch.setattr(ModalConfig, "POSE_LB_REJECT_TOTAL", 100.0)
+        a, b = make_sequence(60), make_sequence(60)
+        score, decided_by = PoseScorer._dtw_cascade(a, b, partial_total=0.0)
+        assert decided_by.startswith("lb_")
+        # Điểm từ cận dưới không bao giờ thấp hơn điểm DTW thật
+        assert score >= PoseScorer.score_dtw(a, b) - 1e-9
+        assert PoseScorer.scorer_version() != PoseScorer.SCORER_VERSION
+
+    def test_no_stages_means_disabled(self, monkeypatch):
+        monkeypatch.setattr(ModalConfig, "POSE_LB_REJECT_TOTAL", 100.0)
+        monkeypatch.setattr(ModalConfig, "POSE_LB_STAGES", [])
+        assert not PoseScorer.lb_cascade_enabled()
@@ -0,0 +1,107 @@
+"""
+Unit tests for model warm-up status and the lazy model loaders
+"""
+import threading
+import time
+import pytest
+from app.services.warmup import ModelWarmup
+from app.services.pose_scoring import pose_scorer
+from app.services.pose_scoring.pose_scorer import PoseScorer
+from app.services.weapon_detection import weapon_detector
+from app.services.weapon_detection.weapon_detector import WeaponDetector
+
+
+class FakeModel:
+    def predict(self, source):
+        return []
+
+
+@pytest.fixture
+def fresh_warmup(monkeypatch):
+    monkeypatch.setattr(ModelWarmup, "_state", {
+        "status": "pending", "started_at": None, "duration_seconds": None, "models": {},
+    })
+    return ModelWarmup
+
+
+def fail():
+    raise RuntimeError("download failed")
+
+
+class TestModelWarmup:
+
+    def test_all_ready(self, fresh_warmup, monkeypatch):
+        monkeypatch.setattr(ModelWarmup, "_loaders", classmethod(lambda cls: {"pose": FakeModel, "weapon": FakeModel}))
+        ModelWarmup.run()
+        state = ModelWarmup.status()
+        assert state["status"] == "ready" and state["ready"]
+        assert all(m["ready"] for m in state["models"].values())
+
+    def test_one_model_failing_does_not_block_the_other(self, fresh_warmup, monkeypatch):
+        monkeypatch.setattr(ModelWarmup, "_loaders", classmethod(lambda cls: {"pose": FakeModel, "weapon": fail}))
+        ModelWarmup.run()
+        state = ModelWarmup.status()
+        assert state["status"] == "partial"
+        assert not state["ready"]
+        assert ModelWarmup.is_ready("pose")
+        assert not ModelWarmup.is_ready("weapon")
+        assert state["models"]["weapon"]["status"] == "failed"
+        assert "download failed" in state["models"]["weapon"]["error"]
+
+    def test_all_failing(self, fresh_warmup, monkeypatch):
+        monkeypatch.setattr(ModelWarmup, "_loaders", classmethod(lambda cls: {"pose": fail, "weapon": fail}))
+        ModelWarmup.run()
+        assert ModelWarmup.status()["status"] == "failed"
+
+
+def load_concurrently(loader, threads=8):
+    results = []
+    workers = [threading.Thread(target=lambda: results.append(loader())) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return results
+
+
+class TestLazyLoaders:
+    """Warm-up và request đến cùng lúc chỉ được nạp weights một lần"""
+
+    def test_pose_model_loaded_once(self, monkeypatch):
+        calls = []
+
+        def slow_load(*args, **kwargs):
+            calls.append(args)
+            time.sleep(0.05)
+            return FakeModel()
+
+        monkeypatch.setattr(PoseScorer, "_pose_model", None)
+        monkeypatch.setattr(PoseScorer, "_download_pose_weights", classmethod(lambda cls, path: None))
+        monkeypatch.setattr(pose_scorer, "load_backend", slow_load)
+        results = load_concurrently(PoseScorer._load_pose_model)
+        assert len(calls) == 1
+        assert all(r is results[0] for r in results)
+
+    def test_weapon_model_loaded_once(self, monkeypatch, tmp_path):
+        weights = tmp_path / "best.pt"
+        weights.write_bytes(b"")
+        downloads, calls = [], []
+
+        def slow_download():
+            downloads.append(1)
+            time.sleep(0.05)
+            return str(weights)
+
+        def slow_load(*args, **kwargs):
+            calls.append(args)
+            time.sleep(0.05)
+            return FakeModel()
+
+        monkeypatch.setattr(WeaponDetector, "_model", None)
+        monkeypatch.setattr(WeaponDetector, "_model_path", None)
+        monkeypatch.setattr(weapon_detector, "ensure_weapon_model", slow_download)
+        monkeypatch.setattr(weapon_detector, "load_backend", slow_load)
+        results = load_concurrently(WeaponDetector._load_model)
+        assert len(downloads) == 1
+        assert len(calls) == 1
+        assert all(r is results[0] for r in results)
@@ -0,0 +1,54 @@
+"""
+Unit tests for prebuilt ONNX model variants (build at image build time, load at startup)
+"""
+import pytest
+from config import ModalConfig
+from app.services.inference import backends
+from app.services.inference.onnx_runtime import export_onnx
+from app.services.inference.quantization import ensure_variant, variant_path
+
+
+@pytest.fixture
+def onnx_file(tmp_path):
+    path = tmp_path / "model.onnx"
+    path.write_bytes(b"onnx")
+    return str(path)
+
+
+class TestLoadOnly:
+    def test_existing_export_is_returned(self, tmp_path, onnx_file):
+        assert export_onnx(str(tmp_path / "model.pt"), build=False) == onnx_file
+
+    def test_missing_export_raises(self, tmp_path):
+        with pytest.raises(FileNotFoundError, match="QUANT_BUILD_ON_LOAD"):
+            export_onnx(str(tmp_path / "missing.pt"), build=False)
+
+    def test_fp32_needs_no_build(self, onnx_file):
+        assert ensure_variant(onnx_file, "fp32", build=False) == onnx_file
+
+    def test_prebuilt_variant_is_returned(self, onnx_file):
+        path = variant_path(onnx_file, "int8_dynamic")
+        open(path, "wb").close()
+        assert ensure_variant(onnx_file, "int8_dynamic", build=False) == path
+
+    def test_missing_variant_raises(self, onnx_file):
+        with pytest.raises(FileNotFoundError, match="build_model_variants"):
+            ensure_variant(onnx_file, "fp16", build=False)
+
+    def test_unknown_variant_still_rejected(self, onnx_file):
+        with pytest.raises(ValueError):
+            ensure_variant(onnx_file, "int4", build=False)
+
+
+class TestBackends:
+    def test_runtime_load_does_not_build(self, monkeypatch, tmp_path, onnx_file):
+        monkeypatch.setattr(ModalConfig, "QUANT_BUILD_ON_LOAD", False)
+        with pytest.raises(FileNotFoundError):
+            backends.load_backend(str(tmp_path / "model.pt"), backend="onnx", variant="fp16")
+
+    def test_prepare_torch_is_noop(self, tmp_path):
+        assert backends.prepare_backend(str(tmp_path / "model.pt"), backend="torch") is None
+
+    def test_prepare_unknown_backend(self, tmp_path):
+        with pytest.raises(ValueError):
+            backends.prepare_backend(str(tmp_path / "model.pt"), backend="tensorrt")
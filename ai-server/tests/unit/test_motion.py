@@ -0,0 +1,108 @@
+"""
+Unit tests for idle trimming and static-frame skipping in pose extraction
+"""
+import numpy as np
+import pytest
+from app.services.pose_scoring.motion import StaticFrameGate, frame_difference, motion_window, small_gray
+from app.services.pose_scoring.pose_scorer import PoseScorer
+
+FPS = 10.0
+
+
+@pytest.fixture
+def idle_ends_video(make_video):
+    # 3 s đứng yên, 3 s chuyển động (frame 30..59 đổi màu liên tục), 3 s đứng yên
+    levels = [100] * 30 + [150 if i % 2 == 0 else 100 for i in range(30)] + [100] * 30
+    return make_video(levels, fps=FPS)
+
+
+def gray_frame(value, shape=(48, 64, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+class TestMotionWindow:
+
+    def test_trims_idle_ends(self, idle_ends_video):
+        start, stop = motion_window(idle_ends_video, threshold=2.0, pad_seconds=0)
+        # Trung bình trượt 3 mẫu chỉ nới cửa sổ thêm một hai frame
+        assert 27 <= start <= 30
+        assert 60 <= stop <= 62
+
+    def test_padding_in_seconds(self, idle_ends_video):
+        start, stop = motion_window(idle_ends_video, threshold=2.0, pad_seconds=0)
+        padded = motion_window(idle_ends_video, threshold=2.0, pad_seconds=0.5)
+        assert padded == (start - 5, stop + 5)
+
+    def test_threshold_above_motion_keeps_whole_video(self, idle_ends_video):
+        assert motion_window(idle_ends_video, threshold=100.0, pad_seconds=0) is None
+
+    def test_static_video(self, make_video):
+        assert motion_window(make_video([100] * 40, fps=FPS), threshold=2.0, pad_seconds=0) is None
+
+    def test_too_short(self, make_video):
+        assert motion_window(make_video([100, 200, 100], fps=FPS), threshold=2.0, pad_seconds=0) is None
+
+    def test_single_noisy_frame_does_not_open_window(self, make_video):
+        # Một frame nhiễu: năng lượng 2 cặp liền nhau, trung bình 3 mẫu còn 2/3 mức nhảy
+        levels = [100] * 20 + [106] + [100] * 20
+        assert motion_window(make_video(levels, fps=FPS), threshold=5.0, pad_seconds=0) is None
+
+
+class TestStaticFrameGate:
+
+    def test_identical_frames_are_skipped(self):
+        gate = StaticFrameGate(threshold=1.0, width=32)
+        assert gate.select([gray_frame(100)] * 5) == [0]
+        assert gate.stats() == {"static_skipped": 4}
+
+    def test_threshold_is_exclusive(self):
+        gate = StaticFrameGate(threshold=1.0, width=32)
+        frames = [gray_frame(100), gray_frame(101), gray_frame(102)]
+        # Lệch đúng ngưỡng (1.0) vẫn coi là đứng yên; 2.0 so với frame tham chiếu thì suy luận
+        assert gate.select(frames) == [0, 2]
+
+    def test_slow_drift_is_compared_to_last_inferred_frame(self):
+        gate = StaticFrameGate(threshold=2.5, width=32)
+        frames = [gray_frame(100 + i) for i in range(10)]
+        # Mỗi frame chỉ lệch 1 so với frame trước nhưng cộng dồn so với frame đã suy luận
+        assert gate.select(frames) == [0, 3, 6, 9]
+
+    def test_state_carries_across_batches(self):
+        gate = StaticFrameGate(threshold=1.0, width=32)
+        gate.select([gray_frame(100)] * 3)
+        assert gate.select([gray_frame(100)] * 3) == []
+        assert gate.select([gray_frame(150)]) == [0]
+
+    def test_fill_reuses_last_inferred_result(self):
+        gate = StaticFrameGate(threshold=1.0, width=32)
+        assert gate.fill(["a", "b"], [0, 3], 5) == ["a", "a", "a", "b", "b"]
+        # Batch sau không có frame nào chạy model: dùng kết quả cuối của batch trước
+        assert gate.fill([], [], 2) == ["b", "b"]
+
+    def test_detect_keypoints_with_gate(self):
+        calls = []
+
+        class Model:
+            def predict(self, frames):
+                calls.append(len(frames))
+                return [type("R", (), {"keypoints": np.full((1, 17, 3), float(f.mean()), dtype=np.float32)})()
+                        for f in frames]
+
+        gate = StaticFrameGate(threshold=1.0, width=32)
+        frames = [gray_frame(100)] * 3 + [gray_frame(200)] * 2
+        out = PoseScorer._detect_keypoints(Model(), frames, gate=gate)
+        assert calls == [2]
+        assert [float(k[0]) for k in out] == [100.0] * 3 + [200.0] * 2
+
+
+class TestSmallGray:
+
+    def test_downscales_to_width(self):
+        gray = small_gray(np.zeros((480, 640, 3), dtype=np.uint8), width=160)
+        assert gray.shape == (120, 160)
+        assert gray.dtype == np.int16
+
+    def test_difference_is_mean_absolute(self):
+        a = small_gray(gray_frame(100), width=32)
+        b = small_gray(gray_frame(90), width=32)
+        assert frame_difference(a, b) == frame_difference(b, a) == 10.0
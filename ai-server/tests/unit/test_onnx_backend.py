@@ -0,0 +1,125 @@
+"""
+Unit tests for OnnxBackend pre/postprocessing (letterbox, NMS, keypoint visibility).
+
+Dùng output giả lập theo đúng layout YOLOv8 (4 + nc + 17*3, N) nên không cần weights.
+"""
+import numpy as np
+import pytest
+from app.services.inference import onnx_runtime
+from app.services.inference.onnx_runtime import OnnxBackend, letterbox
+
+FRAME_SHAPE = (360, 500, 3)
+
+
+def make_backend(names=None, kpt_shape=(17, 3), imgsz=640):
+    backend = OnnxBackend.__new__(OnnxBackend)
+    backend.names = names or {0: "person"}
+    backend.kpt_shape = kpt_shape
+    backend.imgsz = imgsz
+    return backend
+
+
+def raw_column(box, conf, gain, pad, kpts=None, nc=1, cls=0):
+    """Một cột output của model: (cx, cy, w, h) + điểm lớp + keypoints, theo toạ độ ảnh đã letterbox."""
+    x0, y0, x1, y1 = box
+    col = [
+        (x0 + x1) / 2 * gain + pad[0], (y0 + y1) / 2 * gain + pad[1],
+        (x1 - x0) * gain, (y1 - y0) * gain,
+    ]
+    scores = [0.0] * nc
+    scores[cls] = conf
+    col += scores
+    if kpts is not None:
+        for x, y, v in kpts:
+            col += [x * gain + pad[0], y * gain + pad[1], v]
+    return col
+
+
+def person_keypoints(box, hidden=()):
+    x0, y0, x1, y1 = box
+    xs = np.linspace(x0 + 5, x1 - 5, 17)
+    ys = np.linspace(y0 + 5, y1 - 5, 17)
+    return [(x, y, 0.2 if i in hidden else 0.9) for i, (x, y) in enumerate(zip(xs, ys))]
+
+
+@pytest.fixture
+def geometry():
+    _, gain, pad = letterbox(np.zeros(FRAME_SHAPE, dtype=np.uint8), 640)
+    return gain, pad
+
+
+class TestLetterbox:
+
+    def test_keeps_aspect_and_pads_to_stride(self):
+        img, gain, (left, top) = letterbox(np.zeros(FRAME_SHAPE, dtype=np.uint8), 640)
+        assert gain == pytest.approx(min(640 / 360, 640 / 500))
+        assert img.shape[0] % onnx_runtime.STRIDE == 0 and img.shape[1] % onnx_runtime.STRIDE == 0
+        assert max(img.shape[:2]) == 640
+
+    def test_mixed_sizes_are_not_stacked(self):
+        backend = make_backend()
+        x, boxed = backend._preprocess([np.zeros((360, 500, 3), np.uint8), np.zeros((200, 200, 3), np.uint8)])
+        assert x is None and len(boxed) == 2
+        x, _ = backend._preprocess([np.zeros((360, 500, 3), np.uint8)] * 3)
+        assert x.shape[0] == 3 and x.dtype == np.float32 and x.max() <= 1.0
+
+
+class TestPostprocess:
+
+    def test_pose_boxes_nms_and_keypoints(self, geometry):
+        gain, pad = geometry
+        box_a = (100.0, 50.0, 220.0, 330.0)
+        box_b = (102.0, 52.0, 222.0, 332.0)   # trùng box_a -> bị NMS loại
+        box_c = (300.0, 40.0, 420.0, 300.0)
+        box_d = (10.0, 10.0, 60.0, 60.0)      # dưới CONF_THRES
+        cols = [
+            raw_column(box_b, 0.80, gain, pad, person_keypoints(box_b)),
+            raw_column(box_a, 0.90, gain, pad, person_keypoints(box_a, hidden=(3, 7))),
+            raw_column(box_c, 0.60, gain, pad, person_keypoints(box_c)),
+            raw_column(box_d, 0.10, gain, pad, person_keypoints(box_d)),
+        ]
+        out = np.asarray(cols, dtype=np.float32).T
+        pred = make_backend()._postprocess(out, FRAME_SHAPE, gain, pad)
+
+        assert len(pred) == 2
+        np.testing.assert_allclose(pred.conf, [0.90, 0.60], atol=1e-6)
+        np.testing.assert_allclose(pred.xyxy, [box_a, box_c], atol=1e-3)
+        assert pred.cls.tolist() == [0, 0]
+
+        expected = np.asarray(person_keypoints(box_a, hidden=(3, 7)), dtype=np.float32)
+        kpts = pred.keypoints[0]
+        assert kpts.shape == (17, 3)
+        visible = expected[:, 2] >= onnx_runtime.KPT_VISIBLE_THRES
+        np.testing.assert_allclose(kpts[visible, :2], expected[visible, :2], atol=1e-3)
+        # Ultralytics đặt x, y = 0 cho điểm không chắc chắn
+        assert np.all(kpts[~visible, :2] == 0)
+        np.testing.assert_allclose(kpts[:, 2], expected[:, 2], atol=1e-6)
+
+    def test_boxes_clipped_to_frame(self, geometry):
+        gain, pad = geometry
+        out = np.asarray([raw_column((-30.0, -20.0, 540.0, 400.0), 0.9, gain, pad, person_keypoints((0, 0, 500, 360)))],
+                         dtype=np.float32).T
+        pred = make_backend()._postprocess(out, FRAME_SHAPE, gain, pad)
+        np.testing.assert_allclose(pred.xyxy[0], [0, 0, 500, 360], atol=1e-3)
+
+    def test_nms_is_per_class(self, geometry):
+        gain, pad = geometry
+        names = {0: "sword", 1: "spear", 2: "stick"}
+        box = (100.0, 100.0, 200.0, 200.0)
+        out = np.asarray([
+            raw_column(box, 0.9, gain, pad, nc=3, cls=0),
+            raw_column(box, 0.7, gain, pad, nc=3, cls=1),
+            raw_column((101.0, 101.0, 201.0, 201.0), 0.5, gain, pad, nc=3, cls=0),
+        ], dtype=np.float32).T
+        pred = make_backend(names=names, kpt_shape=None)._postprocess(out, FRAME_SHAPE, gain, pad)
+        assert pred.cls.tolist() == [0, 1]
+        assert pred.keypoints is None
+
+    def test_no_detections(self, geometry):
+        gain, pad = geometry
+        out = np.asarray([raw_column((0, 0, 10, 10), 0.05, gain, pad, person_keypoints((0, 0, 10, 10)))],
+                         dtype=np.float32).T
+        pred = make_backend()._postprocess(out, FRAME_SHAPE, gain, pad)
+        assert len(pred) == 0
+        assert pred.xyxy.shape == (0, 4)
+        assert pred.keypoints.shape == (0, 17, 3)
@@ -0,0 +1,61 @@
+"""
+Unit tests for splitting pose extraction into time chunks
+"""
+import numpy as np
+import pytest
+from app.services.pose_scoring.parallel import split_ranges
+from app.utils.video_pipeline import FramePipeline
+
+
+def covered(ranges, frames):
+    return [f for f in frames if any(start <= f < stop for start, stop in ranges)]
+
+
+class TestSplitRanges:
+
+    @pytest.mark.parametrize("total,parts", [(100, 1), (100, 3), (101, 4), (7, 7), (5, 8)])
+    def test_all_frames_without_gaps_or_overlap(self, total, parts):
+        ranges = split_ranges(None, total, parts)
+        assert len(ranges) == min(parts, total)
+        assert ranges[0][0] == 0
+        assert ranges[-1][1] == total
+        for (_, stop), (start, _) in zip(ranges, ranges[1:]):
+            assert stop == start
+        sizes = [stop - start for start, stop in ranges]
+        assert max(sizes) - min(sizes) <= 1
+
+    @pytest.mark.parametrize("parts", [1, 2, 3, 5])
+    def test_sampled_indices_each_in_exactly_one_range(self, parts):
+        indices = np.array([0, 4, 9, 13, 18, 22, 27, 31, 36, 40, 45])
+        ranges = split_ranges(indices, 50, parts)
+        for idx in indices:
+            assert sum(start <= idx < stop for start, stop in ranges) == 1
+        for (_, stop), (start, _) in zip(ranges, ranges[1:]):
+            assert stop <= start
+
+    def test_trimmed_pool(self):
+        # Đoạn sau khi cắt phần đứng yên: không đoạn nào chứa frame ngoài cửa sổ
+        pool = np.arange(30, 80)
+        ranges = split_ranges(pool, 120, 4)
+        assert ranges[0][0] == 30 and ranges[-1][1] == 80
+        assert covered(ranges, range(120)) == list(range(30, 80))
+
+    def test_empty(self):
+        assert split_ranges(np.array([], dtype=np.int64), 100, 4) == []
+        assert split_ranges(None, 0, 4) == []
+
+
+class TestChunkedRead:
+
+    @pytest.mark.parametrize("target_fps", [None, 7.0])
+    def test_chunks_concatenate_to_full_read(self, make_video, target_fps):
+        """Mỗi tiến trình đọc một đoạn: nối lại phải đúng các frame của một lần đọc cả video."""
+        path = make_video([(i * 50) % 300 for i in range(90)], fps=30.0)
+        with FramePipeline(path, batch_size=8, target_fps=target_fps) as pipe:
+            full = [i for idxs, _ in pipe.batches() for i in idxs]
+            indices, total = pipe.indices, pipe.total_frames
+        chunked = []
+        for frame_range in split_ranges(indices, total, 4):
+            with FramePipeline(path, batch_size=8, target_fps=target_fps, frame_range=frame_range) as pipe:
+                chunked.extend(i for idxs, _ in pipe.batches() for i in idxs)
+        assert chunked == full
@@ -0,0 +1,134 @@
+"""
+Unit tests for performer-ROI cropping in pose extraction
+"""
+import numpy as np
+import pytest
+from app.services.pose_scoring.pose_scorer import PoseScorer
+from app.services.pose_scoring.roi import RoiTracker, offset_keypoints
+
+FRAME_SHAPE = (480, 640, 3)
+
+
+class FakePoseResult:
+    def __init__(self, keypoints):
+        self.keypoints = keypoints
+
+
+class BlobPoseModel:
+    """Model pose giả: 17 keypoints rải trên khung bao vùng sáng, theo toạ độ ảnh đưa vào."""
+
+    def __init__(self):
+        self.shapes = []
+
+    def predict(self, frames):
+        out = []
+        for img in frames:
+            self.shapes.append(img.shape[:2])
+            ys, xs = np.nonzero(img[:, :, 0] > 128)
+            if len(xs) == 0:
+                out.append(FakePoseResult(np.zeros((0, 17, 3), dtype=np.float32)))
+                continue
+            x0, x1, y0, y1 = xs.min(), xs.max(), ys.min(), ys.max()
+            i = np.arange(17)
+            k = np.stack([
+                x0 + (i % 5) / 4 * (x1 - x0),
+                y0 + (i // 5) / 3 * (y1 - y0),
+                np.full(17, 0.9),
+            ], axis=1).astype(np.float32)
+            out.append(FakePoseResult(k[None]))
+        return out
+
+
+def performer(x, y, w=40, h=80):
+    frame = np.zeros(FRAME_SHAPE, dtype=np.uint8)
+    frame[y:y + h, x:x + w] = 255
+    return frame
+
+
+@pytest.fixture
+def tracker():
+    return RoiTracker(pad=0.25, edge_margin=0.02, min_size=256)
+
+
+class TestOffsetKeypoints:
+
+    def test_visible_points_are_shifted(self):
+        k = np.array([10, 20, 0.9, 0, 0, 0.1, 5, 0, 0.5], dtype=np.float32)
+        out = offset_keypoints(k, 100, 50)
+        np.testing.assert_array_equal(out, np.array([110, 70, 0.9, 0, 0, 0.1, 105, 50, 0.5], dtype=np.float32))
+        # Không sửa mảng đầu vào
+        assert k[0] == 10
+
+    def test_round_trip_through_crop(self):
+        model = BlobPoseModel()
+        frame = performer(300, 200)
+        full = PoseScorer._keypoints_from_result(model.predict([frame])[0])
+        x0, y0, x1, y1 = 250, 150, 450, 350
+        crop = PoseScorer._keypoints_from_result(model.predict([frame[y0:y1, x0:x1]])[0])
+        np.testing.assert_allclose(offset_keypoints(crop, x0, y0), full)
+
+
+class TestRoiTracker:
+
+    def test_box_contains_keypoints_with_padding(self, tracker):
+        k = PoseScorer._keypoints_from_result(BlobPoseModel().predict([performer(300, 200)])[0])
+        tracker.update(k, FRAME_SHAPE)
+        x0, y0, x1, y1 = tracker.box
+        assert x0 < 300 and y0 < 200 and x1 > 340 and y1 > 280
+        assert not tracker.touches_edge(k, FRAME_SHAPE)
+
+    def test_box_is_clipped_to_frame(self, tracker):
+        k = PoseScorer._keypoints_from_result(BlobPoseModel().predict([performer(0, 0)])[0])
+        tracker.update(k, FRAME_SHAPE)
+        x0, y0, x1, y1 = tracker.box
+        assert (x0, y0) == (0, 0)
+        assert x1 <= FRAME_SHAPE[1] and y1 <= FRAME_SHAPE[0]
+        # Chạm mép frame không tính là ra khỏi vùng cắt
+        assert not tracker.touches_edge(k, FRAME_SHAPE)
+
+    def test_large_box_falls_back_to_full_frame(self, tracker):
+        k = PoseScorer._keypoints_from_result(BlobPoseModel().predict([performer(20, 20, 600, 440)])[0])
+        tracker.update(k, FRAME_SHAPE)
+        assert tracker.box is None
+
+    def test_no_visible_points_resets(self, tracker):
+        tracker.box = (0, 0, 10, 10)
+        tracker.update(np.zeros(51, dtype=np.float32), FRAME_SHAPE)
+        assert tracker.box is None
+
+
+class TestDetectWithRoi:
+
+    def test_cropped_keypoints_match_full_frame(self, tracker):
+        model = BlobPoseModel()
+        frames = [performer(300 + 3 * i, 200 + 2 * i) for i in range(12)]
+        expected = PoseScorer._detect_keypoints(model, frames)
+        got = []
+        for start in range(0, len(frames), 4):
+            got.extend(PoseScorer._detect_keypoints(model, frames[start:start + 4], tracker))
+        for e, g in zip(expected, got):
+            np.testing.assert_allclose(g, e, rtol=1e-6)
+        # Batch đầu chạy cả frame, các batch sau chỉ đưa vùng cắt vào model
+        assert tracker.stats() == {"roi_frames": 8, "full_frames": 4, "roi_redetects": 0}
+        assert all(shape != FRAME_SHAPE[:2] for shape in model.shapes[-8:])
+
+    def test_performer_leaving_crop_is_redetected(self, tracker):
+        model = BlobPoseModel()
+        first = [performer(100, 100)] * 2
+        jumped = [performer(500, 300)] * 2
+        PoseScorer._detect_keypoints(model, first, tracker)
+        out = PoseScorer._detect_keypoints(model, jumped, tracker)
+        expected = PoseScorer._detect_keypoints(BlobPoseModel(), jumped)
+        for e, g in zip(expected, out):
+            np.testing.assert_allclose(g, e, rtol=1e-6)
+        assert tracker.redetects == 2
+        # Vùng cắt mới bám theo vị trí mới
+        x0, y0, x1, y1 = tracker.box
+        assert x0 < 500 < x1 and y0 < 300 < y1
+
+    def test_lost_performer_resets_tracker(self, tracker):
+        model = BlobPoseModel()
+        PoseScorer._detect_keypoints(model, [performer(300, 200)], tracker)
+        empty = np.zeros(FRAME_SHAPE, dtype=np.uint8)
+        assert PoseScorer._detect_keypoints(model, [empty], tracker) == [None]
+        assert tracker.box is None
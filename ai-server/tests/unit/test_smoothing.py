@@ -0,0 +1,156 @@
+"""
+Unit tests pinning the vectorized smoothing / normalization to the original per-column and per-row loops
+"""
+import numpy as np
+import pytest
+from scipy.signal import savgol_filter
+from app.services.pose_scoring.pose_scorer import PoseScorer
+
+
+def loop_smooth_sequence(seq):
+    if len(seq) < PoseScorer.SMOOTH_WINDOW:
+        return seq
+    out = np.zeros_like(seq)
+    for i in range(seq.shape[1]):
+        out[:, i] = savgol_filter(seq[:, i], PoseScorer.SMOOTH_WINDOW, PoseScorer.SMOOTH_POLY)
+    return out
+
+
+def loop_smooth_ema(data, alpha=0.25):
+    out = data.copy()
+    for i in range(1, len(data)):
+        out[i] = alpha * out[i] + (1 - alpha) * out[i - 1]
+    return out
+
+
+def loop_normalize_keypoints(kpts):
+    k = np.array(kpts).reshape(-1, 3)
+    hip = (k[11, :2] + k[12, :2]) / 2
+    k[:, :2] -= hip
+    torso = np.linalg.norm(k[11, :2] - k[0, :2])
+    if torso < 1:
+        torso = 1
+    k[:, :2] /= torso
+    return k.flatten()
+
+
+@pytest.fixture
+def raw_keypoints(rng):
+    """Keypoints pixel (n, 51): x, y quanh giữa khung hình, conf trong [0, 1]."""
+    def make(n):
+        xy = rng.uniform(100, 500, size=(n, 17, 2))
+        conf = rng.uniform(0, 1, size=(n, 17, 1))
+        return np.concatenate([xy, conf], axis=2).reshape(n, 51)
+    return make
+
+
+class TestSmoothSequence:
+
+    @pytest.mark.parametrize("n", [PoseScorer.SMOOTH_WINDOW, PoseScorer.SMOOTH_WINDOW + 1, 200])
+    @pytest.mark.parametrize("dtype", [np.float64, np.float32])
+    def test_matches_column_loop(self, make_sequence, n, dtype):
+        seq = make_sequence(n).astype(dtype)
+        out = PoseScorer.smooth_sequence(seq)
+        assert out.dtype == seq.dtype
+        tol = 1e-12 if dtype == np.float64 else 1e-5
+        np.testing.assert_allclose(out, loop_smooth_sequence(seq), rtol=tol, atol=tol)
+
+    @pytest.mark.parametrize("n", [0, 1, PoseScorer.SMOOTH_WINDOW - 1])
+    def test_window_longer_than_sequence_is_unchanged(self, make_sequence, n):
+        seq = make_sequence(n)
+        out = PoseScorer.smooth_sequence(seq)
+        np.testing.assert_array_equal(out, loop_smooth_sequence(seq))
+        np.testing.assert_array_equal(out, seq)
+
+    def test_nan_stays_in_its_column(self, make_sequence):
+        seq = make_sequence(60)
+        seq[30, 5] = np.nan
+        out = PoseScorer.smooth_sequence(seq)
+        expected = loop_smooth_sequence(seq)
+        np.testing.assert_array_equal(np.isnan(out), np.isnan(expected))
+        np.testing.assert_allclose(out, expected, rtol=1e-12, atol=1e-12, equal_nan=True)
+        # Các cột khác không bị NaN lan sang
+        assert not np.isnan(np.delete(out, 5, axis=1)).any()
+
+    def test_nan_in_edge_window_raises_like_loop(self, make_sequence):
+        # Hai đầu chuỗi savgol nội suy bằng lstsq, không nhận NaN - bản vòng lặp cũng vậy
+        seq = make_sequence(60)
+        seq[2, 5] = np.nan
+        with pytest.raises(ValueError):
+            loop_smooth_sequence(seq)
+        with pytest.raises(ValueError):
+            PoseScorer.smooth_sequence(seq)
+
+
+class TestSmoothEma:
+
+    @pytest.mark.parametrize("n", [0, 1, 2, 150])
+    def test_matches_row_loop(self, make_sequence, n):
+        seq = make_sequence(n)
+        np.testing.assert_allclose(PoseScorer.smooth_ema(seq), loop_smooth_ema(seq), rtol=1e-12, atol=1e-12)
+
+    def test_float32_and_alpha(self, make_sequence):
+        seq = make_sequence(80).astype(np.float32)
+        out = PoseScorer.smooth_ema(seq, alpha=0.6)
+        assert out.dtype == np.float32
+        np.testing.assert_allclose(out, loop_smooth_ema(seq, alpha=0.6), rtol=1e-5, atol=1e-5)
+
+    def test_does_not_modify_input(self, make_sequence):
+        seq = make_sequence(30)
+        before = seq.copy()
+        PoseScorer.smooth_ema(seq)
+        np.testing.assert_array_equal(seq, before)
+
+    def test_nan_matches_loop(self, make_sequence):
+        seq = make_sequence(40)
+        seq[10, 3] = np.nan
+        np.testing.assert_allclose(PoseScorer.smooth_ema(seq), loop_smooth_ema(seq), rtol=1e-12, equal_nan=True)
+
+    @pytest.mark.parametrize("chunk", [1, 7, 64])
+    def test_blocks_match_whole_sequence(self, make_sequence, chunk):
+        seq = make_sequence(100)
+        parts, zi = [], None
+        for i in range(0, len(seq), chunk):
+            out, zi = PoseScorer.smooth_ema_block(seq[i:i + chunk], zi=zi)
+            parts.append(out)
+        np.testing.assert_allclose(np.concatenate(parts), loop_smooth_ema(seq), rtol=1e-12, atol=1e-12)
+
+
+class TestNormalizeKeypoints:
+
+    def test_batch_matches_row_loop(self, raw_keypoints):
+        kpts = raw_keypoints(50)
+        expected = np.stack([loop_normalize_keypoints(k) for k in kpts])
+        np.testing.assert_allclose(PoseScorer.normalize_keypoints_batch(kpts), expected, rtol=1e-12, atol=1e-12)
+
+    def test_single_frame_matches_loop(self, raw_keypoints):
+        k = raw_keypoints(1)[0]
+        np.testing.assert_allclose(PoseScorer.normalize_keypoints(k), loop_normalize_keypoints(k), rtol=1e-12)
+
+    def test_short_torso_is_clamped(self, raw_keypoints):
+        kpts = raw_keypoints(3)
+        # Frame 1: mũi trùng hông trái -> thân dài 0, chia cho 1 như bản cũ
+        kpts[1, 0:2] = kpts[1, 33:35]
+        kpts[2] = 0
+        expected = np.stack([loop_normalize_keypoints(k) for k in kpts])
+        np.testing.assert_allclose(PoseScorer.normalize_keypoints_batch(kpts), expected, rtol=1e-12, atol=1e-12)
+
+    def test_nan_matches_loop(self, raw_keypoints):
+        kpts = raw_keypoints(4)
+        kpts[2, 33] = np.nan
+        expected = np.stack([loop_normalize_keypoints(k) for k in kpts])
+        out = PoseScorer.normalize_keypoints_batch(kpts)
+        np.testing.assert_allclose(out, expected, rtol=1e-12, equal_nan=True)
+        assert not np.isnan(out[[0, 1, 3]]).any()
+
+    def test_float32_input(self, raw_keypoints):
+        kpts = raw_keypoints(20).astype(np.float32)
+        expected = np.stack([loop_normalize_keypoints(k) for k in kpts])
+        out = PoseScorer.normalize_keypoints_batch(kpts)
+        np.testing.assert_allclose(out, expected, rtol=1e-5, atol=1e-5)
+
+    def test_does_not_modify_input(self, raw_keypoints):
+        kpts = raw_keypoints(5)
+        before = kpts.copy()
+        PoseScorer.normalize_keypoints_batch(kpts)
+        np.testing.assert_array_equal(kpts, before)
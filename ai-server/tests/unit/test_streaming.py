@@ -0,0 +1,269 @@
+"""
+Unit tests for chunked live scoring (StreamSession) and the session registry
+"""
+import os
+import time
+from collections import OrderedDict
+import numpy as np
+import pytest
+from config import ModalConfig
+from app.services.pose_scoring.pose_scorer import PoseScorer
+from app.services.pose_scoring.streaming import StreamSession, StreamSessions
+
+TEACHER_FRAMES = 90
+SCORE_FIELDS = ("pose", "speed", "stability", "total")
+
+
+@pytest.fixture
+def make_raw(rng):
+    """Keypoints pixel (n, 51) dạng x, y, conf như model pose trả về."""
+    def make(n, base=None, noise=2.0):
+        if base is None:
+            xy = rng.uniform(200, 400, size=(1, 17, 2)) + np.cumsum(rng.normal(0, 3, size=(n, 17, 2)), axis=0)
+        else:
+            xy = base.reshape(-1, 17, 3)[:n, :, :2] + rng.normal(0, noise, size=(n, 17, 2))
+        conf = np.full((n, 17, 1), 0.9)
+        return np.concatenate([xy, conf], axis=2).reshape(n, 51).astype(np.float32)
+    return make
+
+
+@pytest.fixture
+def teacher_raw(make_raw):
+    return make_raw(TEACHER_FRAMES)
+
+
+@pytest.fixture
+def template_path(tmp_path, teacher_raw):
+    teacher = PoseScorer.prepare_student_keypoints(teacher_raw, "raw")
+    path = tmp_path / "teacher.bin"
+    path.write_bytes(PoseScorer.encode_teacher_template(teacher, fps=30.0))
+    return str(path)
+
+
+@pytest.fixture
+def student_keypoints(make_raw, teacher_raw):
+    """Học viên tập theo giáo viên (có nhiễu), dài hơn thì nối thêm chuyển động khác."""
+    def make(n, keypoints_format):
+        extra = make_raw(max(0, n - TEACHER_FRAMES))
+        raw = make_raw(n, base=np.concatenate([teacher_raw, extra]))
+        if keypoints_format == "raw":
+            return raw
+        return PoseScorer.prepare_student_keypoints(raw, "raw")
+    return make
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    monkeypatch.setattr(StreamSessions, "_sessions", OrderedDict())
+    return StreamSessions
+
+
+@pytest.fixture
+def shared(sessions, monkeypatch):
+    """Kho dùng chung giữa các container (trên Modal là modal.Dict)."""
+    store = {}
+    monkeypatch.setattr(StreamSessions, "_shared", store)
+    monkeypatch.setattr(StreamSessions, "_resolve_template", None)
+    return store
+
+
+def other_container(monkeypatch):
+    # Container khác: bộ nhớ riêng, cùng kho dùng chung
+    monkeypatch.setattr(StreamSessions, "_sessions", OrderedDict())
+
+
+def stream(session, keypoints, chunk):
+    estimate = None
+    for i in range(0, len(keypoints), chunk):
+        estimate = session.append(session.rows_from_keypoints(keypoints[i:i + chunk]))
+    return estimate
+
+
+def assert_same_scores(actual, expected, rel=1e-6):
+    for field in SCORE_FIELDS:
+        assert actual[field] == pytest.approx(expected[field], rel=rel), field
+
+
+class TestStreamMatchesOneShot:
+
+    @pytest.mark.parametrize("keypoints_format", ["raw", "normalized"])
+    @pytest.mark.parametrize("n", [40, TEACHER_FRAMES, 150], ids=["shorter", "equal", "longer"])
+    @pytest.mark.parametrize("chunk", [1, 7, 64])
+    def test_finish_matches_score_keypoints(self, template_path, student_keypoints, keypoints_format, n, chunk):
+        keypoints = student_keypoints(n, keypoints_format)
+        expected = PoseScorer.score_keypoints(keypoints, template_path, keypoints_format=keypoints_format)
+        # Học viên giống giáo viên: phải chấm đủ các thành phần, không dừng ở bước lọc động tác
+        assert expected["decided_by"] == "dtw"
+        session = StreamSession(template_path, input_format=keypoints_format)
+        stream(session, keypoints, chunk)
+        result = session.finish()
+        assert result["final"] is True
+        assert result["frames_received"] == n
+        assert result["frames_scored"] == min(n, TEACHER_FRAMES)
+        assert_same_scores(result, expected, rel=1e-12)
+
+    @pytest.mark.parametrize("n", [40, TEACHER_FRAMES, 150], ids=["shorter", "equal", "longer"])
+    def test_normalized_estimate_matches_prefix(self, template_path, student_keypoints, n):
+        """Không làm mượt: điểm tạm sau mỗi đoạn bằng chấm một lần trên phần đã nhận."""
+        keypoints = student_keypoints(n, "normalized")
+        session = StreamSession(template_path, input_format="normalized")
+        for i in range(10, n + 10, 10):
+            estimate = session.append(keypoints[i - 10:i])
+            seen = min(i, n)
+            assert estimate["frames_scored"] == min(seen, TEACHER_FRAMES)
+            expected = PoseScorer.score_keypoints(keypoints[:seen], template_path)
+            assert_same_scores(estimate, expected)
+
+    def test_raw_estimate_waits_for_smoothing_window(self, template_path, student_keypoints):
+        keypoints = student_keypoints(40, "raw")
+        session = StreamSession(template_path, input_format="raw")
+        estimate = stream(session, keypoints, 7)
+        assert estimate["final"] is False
+        assert estimate["frames_scored"] == 40 - PoseScorer.SMOOTH_WINDOW // 2
+
+    def test_raw_estimate_matches_final_once_teacher_covered(self, template_path, student_keypoints):
+        """Học viên dài hơn giáo viên nửa cửa sổ làm mượt: điểm tạm cuối trùng điểm chấm một lần."""
+        keypoints = student_keypoints(150, "raw")
+        session = StreamSession(template_path, input_format="raw")
+        estimate = stream(session, keypoints, 16)
+        assert estimate["frames_scored"] == TEACHER_FRAMES
+        assert estimate["progress"] == pytest.approx(1.0)
+        assert_same_scores(estimate, PoseScorer.score_keypoints(keypoints, template_path, keypoints_format="raw"))
+
+    def test_few_frames_give_progress_only(self, template_path, student_keypoints):
+        session = StreamSession(template_path, input_format="normalized")
+        estimate = session.append(student_keypoints(3, "normalized"))
+        assert estimate["frames_scored"] == 3
+        assert "total" not in estimate
+
+    def test_finish_without_frames(self, template_path):
+        with pytest.raises(ValueError):
+            StreamSession(template_path, input_format="normalized").finish()
+
+    def test_unknown_format(self, template_path):
+        with pytest.raises(ValueError):
+            StreamSession(template_path, input_format="pixels")
+
+
+class TestStreamSessions:
+
+    def test_get_and_close(self, sessions, template_path):
+        session = sessions.open(template_path=template_path, input_format="normalized")
+        assert sessions.get(session.id) is session
+        assert sessions.close(session.id) is session
+        assert sessions.get(session.id) is None
+
+    def test_idle_session_expires(self, sessions, template_path, monkeypatch):
+        monkeypatch.setattr(ModalConfig, "POSE_STREAM_TTL_SECONDS", 60)
+        idle = sessions.open(template_path=template_path, input_format="normalized")
+        active = sessions.open(template_path=template_path, input_format="normalized")
+        idle.touched -= 61
+        active.touched -= 59
+        assert sessions.get(idle.id) is None
+        assert sessions.get(active.id) is active
+
+    def test_get_refreshes_ttl(self, sessions, template_path, monkeypatch):
+        monkeypatch.setattr(ModalConfig, "POSE_STREAM_TTL_SECONDS", 60)
+        session = sessions.open(template_path=template_path, input_format="normalized")
+        session.touched -= 59
+        assert sessions.get(session.id) is session
+        session.touched -= 30
+        assert sessions.get(session.id) is session
+
+    def test_append_refreshes_ttl(self, sessions, template_path, student_keypoints, monkeypatch):
+        monkeypatch.setattr(ModalConfig, "POSE_STREAM_TTL_SECONDS", 60)
+        session = sessions.open(template_path=template_path, input_format="normalized")
+        session.touched -= 61
+        session.append(student_keypoints(5, "normalized"))
+        assert sessions.get(session.id) is session
+
+    def test_least_recently_used_is_evicted(self, sessions, template_path, monkeypatch):
+        monkeypatch.setattr(ModalConfig, "POSE_STREAM_MAX_SESSIONS", 2)
+        first = sessions.open(template_path=template_path, input_format="normalized")
+        second = sessions.open(template_path=template_path, input_format="normalized")
+        # Dùng lại session đầu -> session thứ hai thành lâu không dùng nhất
+        assert sessions.get(first.id) is first
+        third = sessions.open(template_path=template_path, input_format="normalized")
+        assert sessions.get(second.id) is None
+        assert sessions.get(first.id) is first
+        assert sessions.get(third.id) is third
+        assert len(sessions._sessions) == 2
+
+
+class TestSharedState:
+
+    @pytest.mark.parametrize("keypoints_format", ["raw", "normalized"])
+    def test_round_trip_keeps_running_state(self, template_path, student_keypoints, keypoints_format):
+        keypoints = student_keypoints(120, keypoints_format)
+        whole = StreamSession(template_path, input_format=keypoints_format)
+        split = StreamSession(template_path, input_format=keypoints_format)
+        stream(whole, keypoints, 7)
+        stream(split, keypoints[:50], 7)
+        restored = StreamSession.from_bytes(split.to_bytes())
+        assert restored.id == split.id
+        assert restored.estimate() == split.estimate()
+        estimate = stream(restored, keypoints[50:], 7)
+        assert estimate["frames_received"] == 120
+        assert_same_scores(estimate, whole.estimate(), rel=1e-9)
+        assert_same_scores(restored.finish(), whole.finish(), rel=1e-9)
+
+    def test_chunk_on_other_container(self, shared, template_path, student_keypoints, monkeypatch):
+        keypoints = student_keypoints(TEACHER_FRAMES, "raw")
+        expected = PoseScorer.score_keypoints(keypoints, template_path, keypoints_format="raw")
+        session = StreamSessions.open(template_path=template_path, input_format="raw")
+        for i in range(0, TEACHER_FRAMES, 30):
+            other_container(monkeypatch)
+            current = StreamSessions.get(session.id)
+            assert current is not None and current is not session
+            assert current.received == i
+            current.append(current.rows_from_keypoints(keypoints[i:i + 30]))
+            StreamSessions.save(current)
+            session = current
+        other_container(monkeypatch)
+        result = StreamSessions.close(session.id)
+        assert_same_scores(result.finish(), expected)
+        assert session.id not in shared
+
+    def test_stale_local_copy_is_replaced(self, shared, template_path, student_keypoints, monkeypatch):
+        keypoints = student_keypoints(40, "normalized")
+        session = StreamSessions.open(template_path=template_path, input_format="normalized")
+        assert StreamSessions.get(session.id) is session
+        # Container khác nhận đoạn tiếp theo
+        elsewhere = StreamSession.from_bytes(shared[session.id][1])
+        elsewhere.append(keypoints)
+        shared[session.id] = (elsewhere.chunks, elsewhere.to_bytes())
+        current = StreamSessions.get(session.id)
+        assert current is not session
+        assert current.received == 40
+
+    def test_closed_elsewhere(self, shared, template_path):
+        session = StreamSessions.open(template_path=template_path, input_format="normalized")
+        del shared[session.id]
+        assert StreamSessions.get(session.id) is None
+        assert session.id not in StreamSessions._sessions
+
+    def test_expired_state_is_not_restored(self, shared, template_path, monkeypatch):
+        monkeypatch.setattr(ModalConfig, "POSE_STREAM_TTL_SECONDS", 60)
+        session = StreamSessions.open(template_path=template_path, input_format="normalized")
+        monkeypatch.setattr(time, "time", lambda now=time.time(): now + 61)
+        other_container(monkeypatch)
+        assert StreamSessions.get(session.id) is None
+        assert session.id not in shared
+
+    def test_template_resolved_on_restore(self, shared, template_path, tmp_path, student_keypoints, monkeypatch):
+        session = StreamSessions.open(template_path=template_path, input_format="normalized", template_id="abc")
+        moved = tmp_path / "elsewhere.bin"
+        os.replace(template_path, moved)
+        resolved = []
+        monkeypatch.setattr(StreamSessions, "_resolve_template",
+                            lambda template_id: resolved.append(template_id) or (str(moved), None))
+        other_container(monkeypatch)
+        restored = StreamSessions.get(session.id)
+        assert resolved == ["abc"]
+        assert restored.template_path == str(moved)
+
+    def test_unknown_template_on_restore(self, shared, template_path, monkeypatch):
+        session = StreamSessions.open(template_path=template_path, input_format="normalized", template_id="abc")
+        monkeypatch.setattr(StreamSessions, "_resolve_template", lambda template_id: (None, None))
+        other_container(monkeypatch)
+        assert StreamSessions.get(session.id) is None
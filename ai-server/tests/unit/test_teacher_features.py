@@ -0,0 +1,59 @@
+"""
+Unit tests for the precomputed teacher feature bundle
+"""
+import io
+import numpy as np
+import pytest
+from app.services.pose_scoring import scoring_kernel, teacher_features
+from app.services.pose_scoring.pose_scorer import PoseScorer
+
+
+@pytest.fixture
+def teacher(make_sequence):
+    return make_sequence(120).astype(np.float32)
+
+
+class TestPrefixFeatures:
+
+    @pytest.mark.parametrize("l", [2, 3, 17, 119, 120])
+    def test_matches_sequence_features_on_slice(self, teacher, l):
+        bundle = teacher_features.build_bundle(teacher)
+        prefix = teacher_features.prefix_features(bundle, l)
+        direct = scoring_kernel.sequence_features(teacher[:l])
+        for key in ("x", "norm", "row_std", "vel"):
+            np.testing.assert_array_equal(prefix[key], direct[key])
+        np.testing.assert_allclose(prefix["col_std"], direct["col_std"], rtol=1e-4, atol=1e-5)
+        vel = direct["vel"].astype(np.float64)
+        assert prefix["vel_sum"] == pytest.approx(vel.sum(), rel=1e-9, abs=1e-9)
+        assert prefix["vel_sq"] == pytest.approx((vel * vel).sum(), rel=1e-9)
+
+    def test_constant_columns_have_zero_std(self):
+        teacher = np.ones((10, 51), dtype=np.float32)
+        prefix = teacher_features.prefix_features(teacher_features.build_bundle(teacher), 10)
+        assert not prefix["col_std"].any()
+
+    @pytest.mark.parametrize("student_len", [40, 120, 200])
+    def test_evaluate_with_bundle_matches_template(self, teacher, make_sequence, student_len):
+        student = (np.concatenate([teacher, teacher])[:student_len]
+                   + make_sequence(student_len, scale=0.001)).astype(np.float32)
+        bundle = teacher_features.build_bundle(teacher)
+        a = PoseScorer.evaluate(student, teacher)
+        b = PoseScorer.evaluate(student, None, teacher_bundle=bundle)
+        for field in ("pose", "speed", "stability", "total"):
+            assert b[field] == pytest.approx(a[field], rel=1e-5), field
+
+
+class TestBundleFile:
+
+    def test_round_trip(self, teacher):
+        bundle = teacher_features.build_bundle(teacher)
+        loaded = teacher_features.load_bundle(io.BytesIO(teacher_features.bundle_to_bytes(bundle)))
+        assert loaded.keys() == bundle.keys()
+        for key in bundle:
+            np.testing.assert_array_equal(loaded[key], bundle[key])
+
+    def test_version_mismatch(self, teacher):
+        bundle = teacher_features.build_bundle(teacher)
+        bundle["version"] = np.array(teacher_features.BUNDLE_VERSION + 1)
+        with pytest.raises(ValueError, match="version"):
+            teacher_features.load_bundle(io.BytesIO(teacher_features.bundle_to_bytes(bundle)))
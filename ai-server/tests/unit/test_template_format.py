@@ -0,0 +1,135 @@
+"""
+Unit tests for the .wrtt teacher template container
+"""
+import struct
+import numpy as np
+import pytest
+from app.services.pose_scoring import template_format
+from app.services.pose_scoring.pose_scorer import PoseScorer
+
+
+@pytest.fixture
+def template(make_sequence):
+    return make_sequence(40).astype(np.float32)
+
+
+def write(tmp_path, data, name="teacher.wrtt"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def with_version(data: bytes, version: int) -> bytes:
+    # version là trường uint16 ngay sau magic 8 byte
+    return data[:8] + struct.pack("<H", version) + data[10:]
+
+
+class TestContainer:
+
+    @pytest.mark.parametrize("dtype", ["float32", "float16"])
+    def test_header_round_trip(self, template, dtype):
+        data = template_format.encode(template, 29.97, normalized=False, dtype=dtype)
+        header, arr = template_format.decode(data)
+        assert header["version"] == template_format.FORMAT_VERSION
+        assert header["normalized"] is False
+        assert header["dtype"] == np.dtype(dtype)
+        assert (header["frames"], header["columns"]) == template.shape
+        assert header["fps"] == pytest.approx(29.97, rel=1e-6)
+        np.testing.assert_array_equal(arr, template.astype(dtype))
+        assert len(data) == template_format.HEADER_SIZE + template.size * np.dtype(dtype).itemsize
+
+    def test_memmap_load(self, tmp_path, template):
+        path = write(tmp_path, template_format.encode(template, 30.0))
+        header, arr = template_format.load(path)
+        assert isinstance(arr, np.memmap)
+        assert not arr.flags.writeable
+        np.testing.assert_array_equal(arr, template)
+        assert template_format.read_header(path) == header
+
+    def test_empty_template(self, tmp_path):
+        path = write(tmp_path, template_format.encode(np.zeros((0, 51), dtype=np.float32), 30.0))
+        _, arr = template_format.load(path)
+        assert arr.shape == (0, 51)
+
+    def test_crc_mismatch_is_rejected(self, tmp_path, template):
+        data = bytearray(template_format.encode(template, 30.0))
+        data[-1] ^= 0xFF
+        with pytest.raises(ValueError, match="checksum"):
+            template_format.decode(bytes(data))
+        path = write(tmp_path, bytes(data))
+        with pytest.raises(ValueError, match="checksum"):
+            template_format.load(path)
+        # Bỏ kiểm tra checksum thì vẫn đọc được
+        template_format.load(path, verify=False)
+
+    def test_truncated_file_is_rejected(self, tmp_path, template):
+        data = template_format.encode(template, 30.0)
+        with pytest.raises(ValueError, match="payload"):
+            template_format.decode(data[:-4])
+        with pytest.raises(ValueError):
+            template_format.load(write(tmp_path, data[:-4]))
+        with pytest.raises(ValueError):
+            template_format.decode(data[:template_format.HEADER_SIZE - 1])
+
+    def test_unknown_version_and_dtype(self, template):
+        data = template_format.encode(template, 30.0)
+        with pytest.raises(ValueError, match="version"):
+            template_format.parse_header(with_version(data, 99))
+        with pytest.raises(ValueError):
+            template_format.encode(template, 30.0, dtype="int8")
+        with pytest.raises(ValueError):
+            template_format.encode(template[0], 30.0)
+
+    def test_legacy_npy_is_not_a_container(self, tmp_path, template):
+        path = tmp_path / "teacher.npy"
+        np.save(path, template)
+        assert not template_format.is_container_file(str(path))
+        assert template_format.read_header(str(path)) is None
+        with pytest.raises(ValueError):
+            template_format.load(str(path))
+
+
+class TestTeacherTemplate:
+    """Cùng một template giáo viên phải chấm ra cùng điểm dù lưu .npy hay .wrtt."""
+
+    @pytest.fixture
+    def extracted(self, make_sequence):
+        # Giống extract_template_from_video: keypoints đã normalize rồi làm mượt
+        raw = np.abs(make_sequence(60, scale=5.0)) + 100
+        return PoseScorer.smooth_ema(PoseScorer.smooth_sequence(PoseScorer.normalize_keypoints_batch(raw))).astype(
+            np.float32
+        )
+
+    def test_wrtt_matches_npy(self, tmp_path, extracted):
+        npy = tmp_path / "teacher.npy"
+        np.save(npy, extracted)
+        wrtt = write(tmp_path, PoseScorer.encode_teacher_template(extracted, 30.0, dtype="float32"))
+        from_npy = PoseScorer.load_teacher_template(str(npy))
+        from_wrtt = PoseScorer.load_teacher_template(wrtt)
+        np.testing.assert_array_equal(from_wrtt, from_npy)
+        # Đọc từ bytes đã nhận cũng như đọc file
+        np.testing.assert_array_equal(PoseScorer.decode_teacher_template(open(wrtt, "rb").read()), from_npy)
+
+    def test_scores_match_across_formats(self, tmp_path, extracted, make_sequence):
+        npy = tmp_path / "teacher.npy"
+        np.save(npy, extracted)
+        wrtt = write(tmp_path, PoseScorer.encode_teacher_template(extracted, 30.0, dtype="float32"))
+        student = extracted + make_sequence(60, scale=0.002).astype(np.float32)
+        a = PoseScorer.score_keypoints(student, str(npy))
+        b = PoseScorer.score_keypoints(student, wrtt)
+        for field in ("pose", "speed", "stability", "total"):
+            assert a[field] == b[field], field
+
+    def test_version_1_file_is_normalized_like_npy(self, tmp_path, extracted):
+        v1 = with_version(template_format.encode(extracted, 30.0, normalized=True), 1)
+        from_v1 = PoseScorer.load_teacher_template(write(tmp_path, v1))
+        np.testing.assert_array_equal(from_v1, PoseScorer.prepare_teacher_template(extracted))
+
+    def test_raw_container_is_normalized(self, tmp_path, make_sequence):
+        raw = (np.abs(make_sequence(20, scale=5.0)) + 100).astype(np.float32)
+        path = write(tmp_path, template_format.encode(raw, 30.0, normalized=False))
+        np.testing.assert_array_equal(PoseScorer.load_teacher_template(path), PoseScorer.normalize_keypoints_batch(raw))
+
+    def test_normalized_v2_payload_is_not_copied(self, tmp_path, extracted):
+        path = write(tmp_path, PoseScorer.encode_teacher_template(extracted, 30.0, dtype="float32"))
+        assert isinstance(PoseScorer.load_teacher_template(path), np.memmap)
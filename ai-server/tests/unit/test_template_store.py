@@ -0,0 +1,149 @@
+"""
+Unit tests for the content-addressed teacher template store
+"""
+import hashlib
+import io
+import os
+import numpy as np
+import pytest
+from config import ModalConfig
+from app.services.pose_scoring import teacher_features
+from app.services.pose_scoring.pose_scorer import PoseScorer
+from app.services.pose_scoring.template_store import TemplateStore
+
+SCORE_FIELDS = ("pose", "speed", "stability", "total")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(ModalConfig, "TEMPLATES_DIR", str(tmp_path / "templates"))
+    return TemplateStore
+
+
+class TestTemplateId:
+
+    @pytest.mark.parametrize("template_id", [
+        None,
+        "",
+        "abc",
+        "../" + "0" * 61,
+        "0" * 63 + "/",
+        "A" * 64,
+        "g" * 64,
+        "0" * 65,
+        "0" * 64 + "\n",
+    ])
+    def test_bad_ids_are_rejected(self, store, template_id):
+        with pytest.raises(ValueError):
+            store.template_path(template_id)
+        with pytest.raises(ValueError):
+            store.features_path(template_id)
+
+    def test_unknown_valid_id(self, store):
+        assert store.template_path("0" * 64) is None
+        assert store.features_path("0" * 64) is None
+
+
+@pytest.fixture
+def extracted(make_sequence):
+    # Giống extract_template_from_video: keypoints đã normalize rồi làm mượt
+    raw = np.abs(make_sequence(80, scale=5.0)) + 100
+    return PoseScorer.smooth_ema(PoseScorer.smooth_sequence(PoseScorer.normalize_keypoints_batch(raw))).astype(
+        np.float32
+    )
+
+
+def register(store, content: bytes) -> str:
+    # Như /pose/templates: bundle dựng từ đúng template AI server sẽ nạp
+    bundle = teacher_features.build_bundle(PoseScorer.decode_teacher_template(content))
+    return store.put(content, teacher_features.bundle_to_bytes(bundle))
+
+
+class TestPutGet:
+
+    def test_content_addressed(self, store, extracted):
+        content = PoseScorer.encode_teacher_template(extracted, 30.0)
+        template_id = store.put(content)
+        assert template_id == hashlib.sha256(content).hexdigest()
+        path = store.template_path(template_id)
+        assert path.endswith(".wrtt")
+        with open(path, "rb") as f:
+            assert f.read() == content
+
+    def test_same_content_same_id(self, store, extracted):
+        content = PoseScorer.encode_teacher_template(extracted, 30.0)
+        assert store.put(content) == store.put(content)
+        assert len(os.listdir(ModalConfig.TEMPLATES_DIR)) == 1
+
+    def test_different_content_different_id(self, store, extracted):
+        a = store.put(PoseScorer.encode_teacher_template(extracted, 30.0))
+        b = store.put(PoseScorer.encode_teacher_template(extracted, 25.0))
+        assert a != b
+
+    def test_legacy_npy(self, store, extracted):
+        template_id = store.put(TemplateStore.template_to_bytes(extracted))
+        path = store.template_path(template_id)
+        assert path.endswith(".npy")
+        np.testing.assert_array_equal(np.load(path), extracted)
+
+    def test_features_stored_next_to_template(self, store, extracted):
+        template_id = register(store, PoseScorer.encode_teacher_template(extracted, 30.0))
+        bundle = teacher_features.load_bundle(store.features_path(template_id))
+        np.testing.assert_array_equal(bundle["x"], PoseScorer.load_teacher_template(store.template_path(template_id)))
+
+    def test_no_temp_files_left(self, store, extracted):
+        register(store, PoseScorer.encode_teacher_template(extracted, 30.0))
+        assert not [name for name in os.listdir(ModalConfig.TEMPLATES_DIR) if ".tmp-" in name]
+
+
+class TestScoreKeypoints:
+    """/pose/score-keypoints chấm ra đúng điểm evaluate trên cùng chuỗi học viên và template."""
+
+    @pytest.fixture
+    def student(self, extracted, make_sequence):
+        return (extracted + make_sequence(80, scale=0.002)).astype(np.float32)
+
+    @pytest.mark.parametrize("encode", ["wrtt", "npy"])
+    def test_matches_evaluate(self, store, extracted, student, encode):
+        if encode == "wrtt":
+            content = PoseScorer.encode_teacher_template(extracted, 30.0)
+        else:
+            content = TemplateStore.template_to_bytes(extracted)
+        template_id = register(store, content)
+        template_path, bundle_path = store.template_path(template_id), store.features_path(template_id)
+
+        expected = PoseScorer.evaluate(student, PoseScorer.load_teacher_template(template_path))
+        # Client gửi .npy qua HTTP: dựng lại đúng như endpoint đọc bằng np.load
+        keypoints = np.load(io.BytesIO(TemplateStore.template_to_bytes(student)))
+        with_bundle = PoseScorer.score_keypoints(keypoints, template_path, teacher_bundle_path=bundle_path)
+        without = PoseScorer.score_keypoints(keypoints, template_path)
+        for field in SCORE_FIELDS:
+            assert without[field] == expected[field], field
+            assert with_bundle[field] == pytest.approx(expected[field], rel=1e-5), field
+        assert with_bundle["scorer_version"] == PoseScorer.scorer_version()
+
+    def test_raw_format_matches_evaluate(self, store, extracted, make_sequence):
+        template_id = register(store, PoseScorer.encode_teacher_template(extracted, 30.0))
+        template_path = store.template_path(template_id)
+        raw = (np.abs(make_sequence(80, scale=5.0)) + 100).astype(np.float32)
+        expected = PoseScorer.evaluate(
+            PoseScorer.prepare_student_keypoints(raw, "raw"), PoseScorer.load_teacher_template(template_path)
+        )
+        result = PoseScorer.score_keypoints(raw, template_path, keypoints_format="raw")
+        for field in SCORE_FIELDS:
+            assert result[field] == expected[field], field
+
+    @pytest.mark.parametrize("keypoints,error", [
+        (np.zeros((10, 17)), "shape"),
+        (np.zeros(51), "shape"),
+        (np.zeros((0, 51)), "No valid pose frames"),
+    ])
+    def test_bad_keypoints(self, store, extracted, keypoints, error):
+        template_id = register(store, PoseScorer.encode_teacher_template(extracted, 30.0))
+        with pytest.raises(ValueError, match=error):
+            PoseScorer.score_keypoints(keypoints, store.template_path(template_id))
+
+    def test_unknown_format(self, store, extracted, student):
+        template_id = register(store, PoseScorer.encode_teacher_template(extracted, 30.0))
+        with pytest.raises(ValueError, match="keypoints_format"):
+            PoseScorer.score_keypoints(student, store.template_path(template_id), keypoints_format="pixels")
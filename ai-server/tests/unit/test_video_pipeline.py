@@ -0,0 +1,101 @@
+"""
+Unit tests for the threaded decode / inference FramePipeline
+"""
+import time
+import numpy as np
+import pytest
+from app.utils import video_pipeline
+from app.utils.video_pipeline import FramePipeline, merge_stats
+from tests.conftest import FakeWeaponModel
+
+LEVELS = [0, 50, 100, 150, 200, 250]
+
+
+@pytest.fixture
+def video(make_video):
+    # Frame i tô màu LEVELS[i % 6] để kiểm tra đúng thứ tự frame
+    return make_video([LEVELS[i % len(LEVELS)] for i in range(60)], fps=30.0)
+
+
+def collect(pipe):
+    idxs, levels, sizes = [], [], []
+    for batch_idxs, frames in pipe.batches():
+        idxs.extend(batch_idxs)
+        levels.extend(FakeWeaponModel.level(f) for f in frames)
+        sizes.append(len(frames))
+    return idxs, levels, sizes
+
+
+class TestFramePipeline:
+
+    @pytest.mark.parametrize("batch_size", [1, 7, 16, 100])
+    def test_order_and_batch_sizes(self, video, batch_size):
+        with FramePipeline(video, batch_size=batch_size, queue_size=4) as pipe:
+            idxs, levels, sizes = collect(pipe)
+        assert idxs == list(range(60))
+        assert levels == [LEVELS[i % len(LEVELS)] for i in range(60)]
+        # Mọi batch đầy trừ batch cuối
+        assert all(s == batch_size for s in sizes[:-1])
+        assert sum(sizes) == 60
+        assert pipe.stats()["decode_frames"] == pipe.stats()["inference_frames"] == 60
+
+    def test_sampled_frames_follow_plan(self, video):
+        with FramePipeline(video, batch_size=4, target_fps=10.0) as pipe:
+            planned = pipe.indices.tolist()
+            idxs, levels, _ = collect(pipe)
+        assert pipe.sampled
+        assert idxs == planned == list(range(0, 60, 3))
+        assert levels == [LEVELS[i % len(LEVELS)] for i in planned]
+
+    def test_frame_range(self, video):
+        with FramePipeline(video, batch_size=8, frame_range=(20, 35)) as pipe:
+            idxs, levels, _ = collect(pipe)
+        assert idxs == list(range(20, 35))
+        assert levels == [LEVELS[i % len(LEVELS)] for i in idxs]
+        assert pipe.expected_frames == 15
+
+    def test_queue_is_bounded(self, video):
+        queue_size = 4
+        with FramePipeline(video, batch_size=1, queue_size=queue_size) as pipe:
+            batches = pipe.batches()
+            next(batches)
+            # Tầng suy luận đứng yên: thread giải mã phải dừng khi hàng đợi đầy
+            deadline = time.time() + 2
+            while pipe._queue.qsize() < queue_size and time.time() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.1)
+            assert pipe._queue.qsize() == queue_size
+            # 1 frame đã lấy + hàng đợi đầy + 1 frame đang chờ put()
+            assert pipe._decode_frames <= 1 + queue_size + 1
+        assert not pipe._thread.is_alive()
+
+    def test_queue_holds_at_least_one_batch(self, video):
+        with FramePipeline(video, batch_size=16, queue_size=2) as pipe:
+            assert pipe._queue.maxsize == 16
+
+    def test_decoder_error_is_raised_in_consumer(self, video, monkeypatch):
+        def broken(*args, **kwargs):
+            yield 0, np.zeros((4, 4, 3), dtype=np.uint8)
+            raise RuntimeError("decode failed")
+        monkeypatch.setattr(video_pipeline, "iter_frames", broken)
+        with pytest.raises(RuntimeError, match="decode failed"):
+            with FramePipeline(video, batch_size=4) as pipe:
+                collect(pipe)
+
+    def test_missing_video(self, tmp_path):
+        with pytest.raises(ValueError):
+            FramePipeline(str(tmp_path / "missing.mp4"))
+
+
+class TestMergeStats:
+
+    def test_sums_and_rates(self):
+        a = {"decode_frames": 10, "decode_seconds": 1.0, "decoder_blocked_seconds": 0.5,
+             "inference_frames": 10, "inference_seconds": 2.0, "inference_wait_seconds": 0.1}
+        b = {"decode_frames": 30, "decode_seconds": 1.0, "decoder_blocked_seconds": 0.5,
+             "inference_frames": 30, "inference_seconds": 2.0, "inference_wait_seconds": 0.1}
+        merged = merge_stats([a, b])
+        assert merged["decode_frames"] == 40
+        assert merged["decode_fps"] == 20.0
+        assert merged["inference_fps"] == 10.0
+        assert merged["bottleneck"] == "inference"
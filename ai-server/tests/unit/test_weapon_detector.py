@@ -0,0 +1,233 @@
+"""
+Unit tests for WeaponDetector postprocessing, image decoding and batch detection
+"""
+import cv2
+import numpy as np
+import pytest
+from app.services.weapon_detection.weapon_detector import WeaponDetector
+from tests.conftest import FakeResult
+
+
+def loop_frame_detections(model, r) -> dict:
+    # Vòng lặp từng box trước khi vector hoá: confidence cao nhất của từng loại vũ khí trong một frame
+    best = {}
+    if len(r) > 0:
+        for cls_id, conf in zip(r.cls, r.conf):
+            weapon_name = WeaponDetector._map_weapon_name(model.names[int(cls_id)].lower())
+            if weapon_name and float(conf) > best.get(weapon_name, 0.0):
+                best[weapon_name] = float(conf)
+    return best
+
+
+def loop_weapon_count(model, r) -> int:
+    return sum(1 for cls_id in r.cls if WeaponDetector._map_weapon_name(model.names[int(cls_id)].lower()))
+
+
+class TestDetections:
+
+    @pytest.fixture
+    def results(self, rng, weapon_model):
+        def make(n_results):
+            out = []
+            for _ in range(n_results):
+                n = int(rng.integers(0, 6))
+                ids = rng.integers(0, len(weapon_model.names), size=n)
+                out.append(FakeResult(list(zip(ids, rng.uniform(0.05, 1.0, size=n)))))
+            return out
+        return make
+
+    @pytest.mark.parametrize("n_results", [1, 3, 32])
+    def test_matches_per_box_loop(self, weapon_model, results, n_results):
+        batch = results(n_results)
+        best, counts = WeaponDetector._detections(weapon_model, batch)
+        assert best.shape == (n_results, len(WeaponDetector.WEAPONS))
+        for i, r in enumerate(batch):
+            expected = loop_frame_detections(weapon_model, r)
+            got = {w: float(c) for w, c in zip(WeaponDetector.WEAPONS, best[i]) if c > 0}
+            assert got == pytest.approx(expected)
+            assert counts[i] == loop_weapon_count(weapon_model, r)
+
+    def test_empty_results(self, weapon_model):
+        best, counts = WeaponDetector._detections(weapon_model, [FakeResult(), FakeResult()])
+        assert not best.any()
+        assert counts.tolist() == [0, 0]
+
+    def test_unknown_class_id_is_ignored(self, weapon_model):
+        best, counts = WeaponDetector._detections(weapon_model, [FakeResult([(99, 0.9), (0, 0.4)])])
+        assert best[0].tolist() == pytest.approx([0.4, 0.0, 0.0])
+        assert counts[0] == 1
+
+    def test_class_names_are_case_insensitive(self, weapon_model):
+        # names[0] là "Sword"
+        best, _ = WeaponDetector._detections(weapon_model, [FakeResult([(0, 0.7)])])
+        assert WeaponDetector.WEAPONS[int(np.argmax(best[0]))] == "Kiếm"
+
+    def test_lookup_is_rebuilt_for_a_new_model(self, weapon_model):
+        WeaponDetector._detections(weapon_model, [FakeResult([(0, 0.5)])])
+        other = type(weapon_model)()
+        other.names = {0: "stick", 1: "person"}
+        best, _ = WeaponDetector._detections(other, [FakeResult([(0, 0.5)])])
+        assert WeaponDetector.WEAPONS[int(np.argmax(best[0]))] == "Côn"
+
+    def test_image_result_matches_baseline_shape(self, weapon_model):
+        weapon_model.boxes[100] = [(1, 0.3), (1, 0.8), (3, 0.99), (2, 0.5)]
+        _, data = cv2.imencode(".png", weapon_model.frame(100))
+        result = WeaponDetector.detect_from_image_bytes(data.tobytes())
+        # Như bản cũ: box tốt nhất trong mọi box vũ khí, detection_count = số box vũ khí
+        assert result == {
+            'detected_weapon': 'Thương', 'confidence': pytest.approx(0.8), 'detection_count': 3, 'total_samples': 1
+        }
+
+
+def encode_cv2(ext, image):
+    ok, data = cv2.imencode(ext, image)
+    assert ok
+    return data.tobytes()
+
+
+def encode_pil(fmt, image):
+    from PIL import Image
+    import io
+    buf = io.BytesIO()
+    Image.fromarray(image[:, :, ::-1]).save(buf, fmt)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def image(rng):
+    return rng.integers(0, 256, size=(24, 32, 3), dtype=np.uint8)
+
+
+class TestImageBytes:
+
+    @pytest.mark.parametrize("ext", [".jpg", ".png", ".bmp", ".webp"])
+    def test_signature_detection(self, image, ext):
+        assert WeaponDetector.is_image(encode_cv2(ext, image))
+
+    def test_jfif(self, image):
+        data = encode_pil("JPEG", image)
+        assert data[6:10] == b"JFIF"
+        # Tên .jfif hay tên video thì vẫn nhận ra là ảnh qua chữ ký đầu file
+        assert WeaponDetector.is_image(data, "photo.jfif")
+        assert WeaponDetector.is_image(data, "upload.mp4")
+
+    def test_non_image(self):
+        mp4 = b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom"
+        assert not WeaponDetector.is_image(mp4)
+        assert not WeaponDetector.is_image(mp4, "clip.mp4")
+        assert not WeaponDetector.is_image(b"")
+        assert not WeaponDetector.is_image(b"RIFF\x00\x00\x00\x00AVI LIST")
+
+    def test_extension_fallback(self):
+        assert WeaponDetector.is_image(b"not-a-known-signature", "scan.WEBP")
+
+    @pytest.mark.parametrize("ext", [".png", ".bmp"])
+    def test_lossless_decode_round_trip(self, image, ext):
+        decoded = WeaponDetector.decode_image(encode_cv2(ext, image))
+        np.testing.assert_array_equal(decoded, image)
+        assert decoded.flags.c_contiguous
+
+    def test_pil_fallback(self, image):
+        # TGA: OpenCV không giải mã được, PIL thì được
+        data = encode_pil("TGA", image)
+        assert cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR) is None
+        decoded = WeaponDetector.decode_image(data)
+        np.testing.assert_array_equal(decoded, image)
+        assert decoded.flags.c_contiguous
+
+    def test_pil_fallback_is_bgr(self, monkeypatch):
+        monkeypatch.setattr(cv2, "imdecode", lambda *args: None)
+        red = np.zeros((4, 4, 3), dtype=np.uint8)
+        red[:, :, 2] = 255
+        decoded = WeaponDetector.decode_image(encode_cv2(".png", red))
+        np.testing.assert_array_equal(decoded, red)
+
+    def test_undecodable_bytes(self):
+        with pytest.raises(ValueError, match="Cannot decode image"):
+            WeaponDetector.decode_image(b"\xff\xd8\xff garbage")
+
+    def test_detect_from_image_file(self, tmp_path, weapon_model):
+        weapon_model.boxes[200] = [(2, 0.6)]
+        path = tmp_path / "photo.jfif"
+        path.write_bytes(encode_pil("JPEG", weapon_model.frame(200)))
+        assert WeaponDetector.detect_from_image(str(path))["detected_weapon"] == "Côn"
+        # Không tạo file .jpg tạm cạnh ảnh như bản cũ
+        assert [p.name for p in tmp_path.iterdir()] == ["photo.jfif"]
+        with pytest.raises(FileNotFoundError):
+            WeaponDetector.detect_from_image(str(tmp_path / "missing.jpg"))
+
+
+class TestImageBatches:
+
+    @pytest.fixture
+    def images(self, weapon_model):
+        weapon_model.boxes[50] = [(0, 0.9)]
+        weapon_model.boxes[150] = [(1, 0.7)]
+        weapon_model.boxes[250] = []
+
+        def make(levels):
+            # None: file hỏng, không giải mã được
+            return [
+                (f"img_{i}.png", encode_cv2(".png", weapon_model.frame(level)) if level is not None else b"broken")
+                for i, level in enumerate(levels)
+            ]
+        return make
+
+    def test_order_and_batching(self, weapon_model, images):
+        levels = [50, 150, 250, 50, 150, 250, 50]
+        rows = list(WeaponDetector.batch_rows(images(levels), batch_size=3))
+        assert [r["index"] for r in rows] == list(range(len(levels)))
+        assert [r["filename"] for r in rows] == [f"img_{i}.png" for i in range(len(levels))]
+        assert [r["result"]["detected_weapon"] for r in rows] == ["Kiếm", "Thương", None] * 2 + ["Kiếm"]
+        # Mỗi lô một lần suy luận
+        assert weapon_model.calls == [3, 3, 1]
+
+    def test_results_match_single_image_path(self, images):
+        batch = images([50, 150, 250])
+        rows = list(WeaponDetector.batch_rows(batch, batch_size=16))
+        assert [r["result"] for r in rows] == [WeaponDetector.detect_from_image_bytes(data) for _, data in batch]
+
+    def test_invalid_items_get_error_rows(self, weapon_model, images):
+        rows = list(WeaponDetector.batch_rows(images([None, 50, None, 150, None]), batch_size=2))
+        assert [r["index"] for r in rows] == [0, 1, 2, 3, 4]
+        for i in (0, 2, 4):
+            assert "result" not in rows[i]
+            assert rows[i]["error"].startswith("Cannot decode image")
+        assert rows[1]["result"]["detected_weapon"] == "Kiếm"
+        assert rows[3]["result"]["detected_weapon"] == "Thương"
+        # Lô [None, None] ở cuối không gọi model
+        assert weapon_model.calls == [1, 1]
+
+    def test_all_invalid_batch(self, weapon_model, images):
+        rows = list(WeaponDetector.batch_rows(images([None, None]), batch_size=4))
+        assert all("error" in r for r in rows)
+        assert weapon_model.calls == []
+
+    def test_batch_size_defaults_to_config(self, weapon_model, images, monkeypatch):
+        from config import ModalConfig
+        monkeypatch.setattr(ModalConfig, "WEAPON_BATCH_SIZE", 2)
+        list(WeaponDetector.batch_rows(images([50] * 5)))
+        assert weapon_model.calls == [2, 2, 1]
+
+    def test_zip_archive(self, tmp_path, weapon_model, images):
+        import zipfile
+        path = tmp_path / "images.zip"
+        with zipfile.ZipFile(path, "w") as zf:
+            for name, data in images([150, None, 50]):
+                zf.writestr(f"batch/{name}", data)
+            zf.writestr("batch/.DS_Store", b"junk")
+            zf.writestr("__MACOSX/batch/._img_0.png", b"junk")
+            zf.writestr("batch/empty/", b"")
+        with zipfile.ZipFile(path) as zf:
+            members = WeaponDetector.archive_members(zf)
+            assert [m.filename for m in members] == [f"batch/img_{i}.png" for i in range(3)]
+            rows = list(WeaponDetector.batch_rows(((m.filename, zf.read(m)) for m in members), batch_size=2))
+        assert [r["filename"] for r in rows] == [f"batch/img_{i}.png" for i in range(3)]
+        assert rows[0]["result"]["detected_weapon"] == "Thương"
+        assert "error" in rows[1]
+        assert rows[2]["result"]["detected_weapon"] == "Kiếm"
+
+    def test_rows_are_json_serializable(self, images):
+        import json
+        for row in WeaponDetector.batch_rows(images([50, None]), batch_size=2):
+            assert json.loads(json.dumps(row, ensure_ascii=False)) == row
@@ -0,0 +1,153 @@
+"""
+Unit tests for multi-frame weapon voting with early stop
+"""
+import threading
+import numpy as np
+import pytest
+from config import ModalConfig
+from app.services.weapon_detection.weapon_detector import WeaponDetector, WeaponVote
+from app.utils.video_pipeline import FramePipeline, iter_frames
+
+SWORD, SPEAR, STICK, PERSON = 0, 1, 2, 3
+
+
+class TestWeaponVote:
+
+    def test_one_confident_frame_stops(self, weapon_model):
+        weapon_model.boxes[100] = [(SWORD, 0.9)]
+        vote = WeaponVote(margin=0.8)
+        assert vote.add([weapon_model.frame(100)]) is True
+        result = vote.result()
+        assert result["detected_weapon"] == "Kiếm"
+        assert result["confidence"] == pytest.approx(0.9)
+        assert result["early_stop"] is True
+        assert result["total_samples"] == 1
+
+    def test_margin_reached_across_frames(self, weapon_model):
+        weapon_model.boxes[100] = [(SPEAR, 0.5)]
+        vote = WeaponVote(margin=0.8)
+        assert vote.add([weapon_model.frame(100)]) is False
+        assert vote.add([weapon_model.frame(100)]) is True
+        result = vote.result()
+        assert result["detected_weapon"] == "Thương"
+        # Confidence trung bình trên các frame thấy vũ khí, không phải tổng phiếu
+        assert result["confidence"] == pytest.approx(0.5)
+        assert result["detection_count"] == 2
+
+    def test_margin_is_inclusive(self, weapon_model):
+        weapon_model.boxes[100] = [(STICK, 0.5)]
+        vote = WeaponVote(margin=0.5)
+        assert vote.add([weapon_model.frame(100)]) is True
+
+    def test_runner_up_delays_stop(self, weapon_model):
+        weapon_model.boxes[100] = [(SWORD, 0.9), (SPEAR, 0.4)]
+        vote = WeaponVote(margin=0.8)
+        assert vote.add([weapon_model.frame(100)]) is False
+        assert vote.add([weapon_model.frame(100)]) is True
+        assert vote.result()["votes"] == pytest.approx({"Kiếm": 1.8, "Thương": 0.8})
+
+    def test_tie_never_stops_and_breaks_by_weapon_order(self, weapon_model):
+        weapon_model.boxes[100] = [(SPEAR, 0.7), (SWORD, 0.7)]
+        vote = WeaponVote(margin=0.1)
+        for _ in range(5):
+            assert vote.add([weapon_model.frame(100)]) is False
+        result = vote.result()
+        assert result["early_stop"] is False
+        assert result["detected_weapon"] == WeaponDetector.WEAPONS[0]
+        assert result["total_samples"] == 5
+
+    def test_only_best_box_per_class_counts(self, weapon_model):
+        weapon_model.boxes[100] = [(SWORD, 0.3), (SWORD, 0.6), (SWORD, 0.2)]
+        vote = WeaponVote(margin=10)
+        vote.add([weapon_model.frame(100)])
+        assert vote.result()["votes"] == pytest.approx({"Kiếm": 0.6})
+
+    @pytest.mark.parametrize("boxes", [(), [(PERSON, 0.99)]], ids=["no_boxes", "non_weapon"])
+    def test_all_negative(self, weapon_model, boxes):
+        weapon_model.boxes[100] = list(boxes)
+        vote = WeaponVote(margin=0.8)
+        for _ in range(3):
+            assert vote.add([weapon_model.frame(100)]) is False
+        assert vote.result() == {
+            'detected_weapon': None, 'confidence': 0.0, 'detection_count': 0, 'total_samples': 3
+        }
+
+    def test_uses_configured_margin(self, weapon_model, monkeypatch):
+        monkeypatch.setattr(ModalConfig, "WEAPON_VOTE_MARGIN", 2.0)
+        weapon_model.boxes[100] = [(SWORD, 0.9)]
+        assert WeaponVote().add([weapon_model.frame(100)]) is False
+
+
+class TestDetectFromVideo:
+
+    def test_early_stop_after_first_sample(self, weapon_model, make_video, monkeypatch):
+        monkeypatch.setattr(ModalConfig, "WEAPON_SAMPLE_STRIDE", 1.0)
+        monkeypatch.setattr(ModalConfig, "WEAPON_MAX_SAMPLES", 8)
+        weapon_model.boxes[100] = [(SWORD, 0.95)]
+        result = WeaponDetector.detect_from_video(make_video([100] * 100))
+        assert result["detected_weapon"] == "Kiếm"
+        assert result["early_stop"] is True
+        assert result["total_samples"] == 1
+
+    def test_weapon_hidden_in_first_frames(self, weapon_model, make_video, monkeypatch):
+        monkeypatch.setattr(ModalConfig, "WEAPON_SAMPLE_STRIDE", 1.0)
+        monkeypatch.setattr(ModalConfig, "WEAPON_MAX_SAMPLES", 8)
+        weapon_model.boxes[200] = [(STICK, 0.9)]
+        result = WeaponDetector.detect_from_video(make_video([0] * 30 + [200] * 70))
+        assert result["detected_weapon"] == "Côn"
+        # Mốc lấy mẫu 0, 10, 30, ... (8 trong 10 mốc mỗi giây): frame 0 và 10 chưa thấy vũ khí
+        assert result["total_samples"] == 3
+
+
+class CountingCapture:
+    def __init__(self, total):
+        self.total = total
+        self.pos = 0
+        self.grabs = 0
+
+    def grab(self):
+        if self.pos >= self.total:
+            return False
+        self.pos += 1
+        self.grabs += 1
+        return True
+
+    def retrieve(self):
+        return True, np.zeros((2, 2, 3), dtype=np.uint8)
+
+    def read(self):
+        return (True, self.retrieve()[1]) if self.grab() else (False, None)
+
+
+class TestStopEvent:
+
+    def test_stop_interrupts_grab_between_samples(self):
+        cap = CountingCapture(10000)
+        stop = threading.Event()
+        frames = iter_frames(cap, np.array([0, 9000]), stop_event=stop)
+        assert next(frames)[0] == 0
+        stop.set()
+        assert next(frames, None) is None
+        # Không grab() tiếp tới frame mẫu thứ hai
+        assert cap.grabs == 1
+
+    def test_stop_interrupts_sequential_read(self):
+        cap = CountingCapture(100)
+        stop = threading.Event()
+        frames = iter_frames(cap, stop_event=stop)
+        next(frames)
+        stop.set()
+        assert next(frames, None) is None
+        assert cap.grabs == 1
+
+    def test_without_stop_event_reads_all_samples(self):
+        cap = CountingCapture(100)
+        assert [i for i, _ in iter_frames(cap, np.array([3, 50, 99]))] == [3, 50, 99]
+        assert cap.grabs == 100
+
+    def test_pipeline_close_stops_decoder(self, make_video):
+        path = make_video([100] * 200, fps=10.0)
+        with FramePipeline(path, batch_size=1, target_fps=0.1, max_frames=2) as pipe:
+            next(pipe.batches())
+        assert not pipe._thread.is_alive()
+        assert pipe.stats()["decode_frames"] <= 2
@@ -0,0 +1,89 @@
+"""So sánh tốc độ và kết quả giữa cách chấm điểm cũ (vòng lặp Python) và scoring kernel.
+
+Chạy từ thư mục ai-server:
+    python tools/bench_scoring.py --frames 1800 5400 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.pose_scoring import scoring_kernel  # noqa: E402
+
+
+# ===== Cách tính trước khi có scoring kernel, giữ lại làm mốc so sánh =====
+def legacy_terms(student, teacher):
+    v1 = np.std(student, axis=0)
+    v2 = np.std(teacher, axis=0)
+    s = np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2) + 1e-8)
+    action = (s + 1) / 2
+
+    base = np.mean([
+        np.dot(student[i], teacher[i]) / (np.linalg.norm(student[i]) * np.linalg.norm(teacher[i]) + 1e-8)
+        for i in range(len(student))
+    ])
+    d1 = np.std(student, axis=1)
+    d2 = np.std(teacher, axis=1)
+    penalty = np.exp(-np.mean(np.abs(d1 - d2)) * 8)
+    cos = max(base * penalty * 0.9, 0.55)
+
+    va = np.diff(student, axis=0)
+    vb = np.diff(teacher, axis=0)
+    c = np.corrcoef(va.flatten(), vb.flatten())[0, 1]
+    if np.isnan(c):
+        c = -1
+    vel = ((c + 1) / 2) ** 1.7
+
+    v = np.diff(student, axis=0)
+    a = np.diff(v, axis=0)
+    j = np.diff(a, axis=0)
+    mse = np.mean(v ** 2) + 3 * np.mean(a ** 2) + 15 * np.mean(j ** 2)
+    stab = 1 / (1 + 200 * mse)
+    return {"action_similarity": action, "cosine": cos, "velocity": vel, "stability": stab}
+
+
+def kernel_terms(student, teacher):
+    return scoring_kernel.score_terms(
+        scoring_kernel.sequence_features(student), scoring_kernel.sequence_features(teacher)
+    )
+
+
+def make_pair(n, rng):
+    t = np.linspace(0, 8 * np.pi, n)[:, None]
+    phase = rng.uniform(0, 2 * np.pi, 51)[None, :]
+    teacher = np.sin(t + phase).astype(np.float32)
+    student = (teacher + rng.normal(0, 0.05, teacher.shape)).astype(np.float32)
+    return student, teacher
+
+
+def timeit(fn, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, nargs="+", default=[900, 1800, 5400])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'frames':>8} {'legacy ms':>10} {'kernel ms':>10} {'speedup':>8} {'max |diff|':>11}")
+    for n in args.frames:
+        student, teacher = make_pair(n, rng)
+        t_old, old = timeit(legacy_terms, student, teacher, repeat=args.repeat)
+        t_new, new = timeit(kernel_terms, student, teacher, repeat=args.repeat)
+        diff = max(abs(float(old[k]) - float(new[k])) for k in old)
+        print(f"{n:>8} {t_old * 1e3:>10.2f} {t_new * 1e3:>10.2f} {t_old / t_new:>7.1f}x {diff:>11.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Báo cáo độ chính xác / độ trễ của các DTW backend trên các template đã lưu.
+
+Mỗi cặp template (giáo viên, "học viên") được chạy qua mọi backend; backend
+`exact` là mốc để tính sai số. Cột "pose pts" là độ lệch tối đa của điểm pose
+(0.3 * 50 * exp(-2 * d)) so với exact.
+
+Chạy từ thư mục ai-server:
+    python tools/dtw_backend_report.py path/to/templates --pairs 20 --radius 5 10 --ms-radius 2 8
+"""
+import argparse
+import glob
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.pose_scoring import dtw_backends  # noqa: E402
+from app.services.pose_scoring.pose_scorer import PoseScorer  # noqa: E402
+
+
+def load_templates(paths):
+    templates = []
+    for p in paths:
+        try:
+            templates.append((os.path.basename(p), PoseScorer.load_teacher_template(p)))
+        except Exception as e:
+            print(f"Bỏ qua {p}: {e}")
+    return templates
+
+
+def backend_configs(radii, bands, ms_radii=()):
+    configs = [("exact", {})]
+    for b in bands:
+        configs.append((f"banded(band={b})", {"backend": "banded", "band": b}))
+    for r in radii:
+        configs.append((f"fastdtw(radius={r})", {"backend": "fastdtw", "radius": r}))
+    for r in ms_radii:
+        configs.append((f"multiscale(radius={r})", {"backend": "multiscale", "radius": r}))
+    return configs
+
+
+def run(seqA, seqB, options):
+    options = dict(options)
+    backend = options.pop("backend", "exact")
+    if backend == "exact":
+        options.setdefault("band", 0)
+    t0 = time.perf_counter()
+    distance, _ = dtw_backends.compute(seqA, seqB, backend=backend, **options)
+    return distance, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("templates_dir")
+    parser.add_argument("--pairs", type=int, default=20, help="số cặp template tối đa")
+    parser.add_argument("--radius", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--band", type=int, nargs="+", default=[15, 30, 60])
+    parser.add_argument("--ms-radius", type=int, nargs="+", default=[2, 8], help="radius của backend multiscale")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.templates_dir, "*.npy")) + glob.glob(os.path.join(args.templates_dir, "*.wrtt")))
+    templates = load_templates(paths)
+    if len(templates) < 2:
+        print("Cần ít nhất 2 template (.npy/.wrtt) để so sánh")
+        return
+
+    pairs = list(itertools.combinations(templates, 2))[:args.pairs]
+    configs = backend_configs(args.radius, args.band, args.ms_radius)
+    latency = {name: [] for name, _ in configs}
+    rel_err = {name: [] for name, _ in configs}
+    pts_err = {name: [] for name, _ in configs}
+
+    for (name_a, a), (name_b, b) in pairs:
+        # Giống evaluate: cắt về cùng độ dài
+        l = min(len(a), len(b))
+        a, b = a[:l], b[:l]
+        exact_d = None
+        for name, options in configs:
+            d, dt = run(a, b, options)
+            if exact_d is None:
+                exact_d = d
+            latency[name].append(dt)
+            rel_err[name].append(abs(d - exact_d) / exact_d if exact_d > 0 else 0.0)
+            pts_err[name].append(abs(np.exp(-2 * d) - np.exp(-2 * exact_d)) * 0.3 * 50)
+        print(f"  {name_a} vs {name_b}: {l} frames")
+
+    print()
+    print(f"{'backend':<22} {'mean ms':>9} {'p95 ms':>9} {'speedup':>8} {'mean rel err':>13} {'max pose pts':>13}")
+    exact_ms = np.mean(latency["exact"]) * 1e3
+    for name, _ in configs:
+        ms = np.array(latency[name]) * 1e3
+        print(f"{name:<22} {ms.mean():>9.2f} {np.percentile(ms, 95):>9.2f} {exact_ms / ms.mean():>7.1f}x "
+              f"{np.mean(rel_err[name]):>13.2e} {np.max(pts_err[name]):>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
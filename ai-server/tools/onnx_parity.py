@@ -0,0 +1,122 @@
+"""So sánh backend ONNX Runtime với đường PyTorch (Ultralytics) trên cùng các frame.
+
+Với model pose: sai số pixel của keypoints người đầu tiên (chỉ tính các điểm
+cả hai backend đều thấy) và sai khác của vector đã normalize mà PoseScorer dùng.
+Với model vũ khí: lớp có confidence cao nhất trên mỗi frame có trùng nhau không.
+Thoát với mã 1 nếu sai số trung bình vượt --tolerance (pixel).
+
+Chạy từ thư mục ai-server:
+    python tools/onnx_parity.py path/to/video.mp4 --frames 60 --threads 4
+    python tools/onnx_parity.py path/to/video.mp4 --weapon
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.inference.backends import load_backend  # noqa: E402
+from app.services.inference.onnx_runtime import OnnxBackend, export_onnx  # noqa: E402
+from app.services.pose_scoring.pose_scorer import PoseScorer, MODELS_DIR  # noqa: E402
+
+
+def sample_frames(video_path, count):
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    indices = set(np.linspace(0, max(total - 1, 0), count).astype(int).tolist())
+    frames = []
+    idx = 0
+    while cap.grab():
+        if idx in indices:
+            ok, frame = cap.retrieve()
+            if ok:
+                frames.append(frame)
+        idx += 1
+    cap.release()
+    return frames
+
+
+def timed_predict(model, frames):
+    t0 = time.perf_counter()
+    preds = [model.predict(f)[0] for f in frames]
+    return preds, (time.perf_counter() - t0) / max(len(frames), 1)
+
+
+def compare_pose(ref, test):
+    px_err, vec_err, mismatched = [], [], 0
+    for a, b in zip(ref, test):
+        ka = PoseScorer._keypoints_from_result(a)
+        kb = PoseScorer._keypoints_from_result(b)
+        if (ka is None) != (kb is None):
+            mismatched += 1
+            continue
+        if ka is None:
+            continue
+        ka, kb = ka.reshape(17, 3), kb.reshape(17, 3)
+        both = (ka[:, :2] != 0).all(axis=1) & (kb[:, :2] != 0).all(axis=1)
+        if both.any():
+            px_err.append(np.linalg.norm(ka[both, :2] - kb[both, :2], axis=1).mean())
+        vec_err.append(np.abs(PoseScorer.normalize_keypoints(ka.ravel()) -
+                              PoseScorer.normalize_keypoints(kb.ravel())).max())
+    return px_err, vec_err, mismatched
+
+
+def compare_weapon(ref, test):
+    agree = 0
+    for a, b in zip(ref, test):
+        top_a = int(a.cls[np.argmax(a.conf)]) if len(a) else None
+        top_b = int(b.cls[np.argmax(b.conf)]) if len(b) else None
+        agree += top_a == top_b
+    return agree
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video")
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--threads", type=int, default=None, help="ONNX intra-op threads")
+    parser.add_argument("--weapon", action="store_true", help="so sánh model vũ khí thay vì pose")
+    parser.add_argument("--tolerance", type=float, default=2.0, help="sai số keypoint trung bình tối đa (px)")
+    args = parser.parse_args()
+
+    if args.weapon:
+        from app.utils.model_loader import ensure_weapon_model
+        weights = ensure_weapon_model()
+    else:
+        PoseScorer._load_pose_model()
+        weights = os.path.join(MODELS_DIR, PoseScorer._model_name)
+
+    frames = sample_frames(args.video, args.frames)
+    if not frames:
+        print(f"Không đọc được frame nào từ {args.video}")
+        sys.exit(1)
+
+    torch_model = load_backend(weights, "torch")
+    onnx_model = OnnxBackend(export_onnx(weights), threads=args.threads)
+    # Chạy một lần trước để không tính thời gian khởi tạo
+    torch_model.predict(frames[0])
+    onnx_model.predict(frames[0])
+    ref, torch_s = timed_predict(torch_model, frames)
+    test, onnx_s = timed_predict(onnx_model, frames)
+
+    print(f"{len(frames)} frames  torch {torch_s * 1e3:.1f} ms/frame  onnx {onnx_s * 1e3:.1f} ms/frame  "
+          f"speedup {torch_s / onnx_s:.2f}x")
+    if args.weapon:
+        agree = compare_weapon(ref, test)
+        print(f"top class agreement: {agree}/{len(frames)}")
+        sys.exit(0 if agree == len(frames) else 1)
+
+    px_err, vec_err, mismatched = compare_pose(ref, test)
+    mean_px = float(np.mean(px_err)) if px_err else 0.0
+    print(f"keypoints: mean {mean_px:.3f} px  max {np.max(px_err) if px_err else 0.0:.3f} px  "
+          f"normalized max abs diff {np.max(vec_err) if vec_err else 0.0:.5f}  "
+          f"detection mismatches {mismatched}")
+    sys.exit(0 if mean_px <= args.tolerance and mismatched == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
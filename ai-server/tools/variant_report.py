@@ -0,0 +1,128 @@
+"""Độ trễ / độ lệch keypoints / thay đổi điểm của các model variant (fp32, fp16, int8).
+
+Mốc so sánh là bản fp32 chạy bằng ONNX Runtime. Với mỗi variant:
+  - ms/frame: suy luận từng frame một trên các frame lấy mẫu từ video học viên
+  - drift: sai số pixel trung bình của keypoints (các điểm cả hai bản đều thấy)
+  - Δtotal: thay đổi của PoseScorer.evaluate(...)["total"] khi trích xuất bằng
+    variant đó và so với cùng template giáo viên
+
+int8_static được hiệu chỉnh bằng frame lấy từ --calibration (thư mục video giáo viên).
+
+Chạy từ thư mục ai-server:
+    python tools/variant_report.py student1.mp4 student2.mp4 --teacher teacher.wrtt \\
+        --calibration path/to/teacher_videos --variants fp32 fp16 int8_dynamic int8_static
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.inference.backends import load_backend  # noqa: E402
+from app.services.inference.onnx_runtime import export_onnx  # noqa: E402
+from app.services.inference.quantization import VARIANTS, calibration_frames, ensure_variant  # noqa: E402
+from app.services.pose_scoring import template_format  # noqa: E402
+from app.services.pose_scoring.pose_scorer import PoseScorer, MODELS_DIR  # noqa: E402
+from onnx_parity import sample_frames  # noqa: E402
+
+
+def raw_keypoints(model, frames):
+    kpts, latency = [], []
+    for f in frames:
+        t0 = time.perf_counter()
+        res = model.predict(f)[0]
+        latency.append(time.perf_counter() - t0)
+        k = PoseScorer._keypoints_from_result(res)
+        kpts.append(None if k is None else k.reshape(17, 3))
+    return kpts, np.array(latency)
+
+
+def drift(ref, test):
+    errors, mismatched = [], 0
+    for a, b in zip(ref, test):
+        if (a is None) != (b is None):
+            mismatched += 1
+            continue
+        if a is None:
+            continue
+        both = (a[:, :2] != 0).all(axis=1) & (b[:, :2] != 0).all(axis=1)
+        if both.any():
+            errors.append(np.linalg.norm(a[both, :2] - b[both, :2], axis=1).mean())
+    return np.array(errors), mismatched
+
+
+def totals(videos, teacher, max_frames):
+    out = []
+    for v in videos:
+        try:
+            student = PoseScorer.extract_template_from_video(v, max_frames=max_frames, workers=0)
+            out.append(PoseScorer.evaluate(student, teacher)["total"])
+        except ValueError as e:
+            print(f"  {os.path.basename(v)}: {e}")
+            out.append(np.nan)
+    return np.array(out, dtype=np.float64)
+
+
+def load_teacher(path, max_frames):
+    if path.endswith((".npy", template_format.EXTENSION)):
+        return PoseScorer.load_teacher_template(path)
+    # Template giáo viên luôn trích bằng fp32, giống template đã lưu trên hệ thống
+    weights = os.path.join(MODELS_DIR, PoseScorer._model_name)
+    PoseScorer._pose_model = load_backend(weights, "onnx", "fp32")
+    raw = PoseScorer.extract_template_from_video(path, max_frames=max_frames, workers=0)
+    return PoseScorer.prepare_teacher_template(raw)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("videos", nargs="+", help="video học viên")
+    parser.add_argument("--teacher", required=True, help="template giáo viên (.wrtt/.npy) hoặc video giáo viên")
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=VARIANTS)
+    parser.add_argument("--calibration", help="thư mục video giáo viên cho int8_static")
+    parser.add_argument("--rebuild", action="store_true", help="tạo lại các file variant")
+    parser.add_argument("--frames", type=int, default=30, help="số frame mỗi video để đo latency/drift")
+    parser.add_argument("--max-frames", type=int, default=None, help="giới hạn frame khi trích xuất để chấm")
+    args = parser.parse_args()
+
+    PoseScorer._load_pose_model()
+    weights = os.path.join(MODELS_DIR, PoseScorer._model_name)
+    onnx_path = export_onnx(weights)
+    variants = ["fp32"] + [v for v in args.variants if v != "fp32"]
+    for v in variants:
+        options = {}
+        if v == "int8_static" and args.calibration:
+            options["frames"] = calibration_frames(args.calibration)
+        ensure_variant(onnx_path, v, rebuild=args.rebuild and v != "fp32", **options)
+
+    frames = [f for v in args.videos for f in sample_frames(v, args.frames)]
+    teacher = load_teacher(args.teacher, args.max_frames)
+
+    rows = []
+    ref_kpts = ref_totals = None
+    for v in variants:
+        model = load_backend(weights, "onnx", v)
+        model.predict(frames[0])
+        kpts, latency = raw_keypoints(model, frames)
+        PoseScorer._pose_model = model
+        t = totals(args.videos, teacher, args.max_frames)
+        if ref_kpts is None:
+            ref_kpts, ref_totals = kpts, t
+        err, mismatched = drift(ref_kpts, kpts)
+        delta = np.abs(t - ref_totals)
+        rows.append((v, latency * 1e3, err, mismatched, delta))
+
+    print()
+    print(f"{'variant':<14} {'ms/frame':>9} {'p95 ms':>8} {'speedup':>8} {'drift px':>9} {'max px':>8} "
+          f"{'miss':>5} {'mean Δtotal':>12} {'max Δtotal':>11}")
+    base_ms = rows[0][1].mean()
+    for v, ms, err, mismatched, delta in rows:
+        print(f"{v:<14} {ms.mean():>9.2f} {np.percentile(ms, 95):>8.2f} {base_ms / ms.mean():>7.2f}x "
+              f"{(err.mean() if len(err) else 0.0):>9.3f} {(err.max() if len(err) else 0.0):>8.3f} "
+              f"{mismatched:>5} {np.nanmean(delta):>12.3f} {np.nanmax(delta):>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
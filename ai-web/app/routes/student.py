@@ -615,7 +615,7 @@ def weapon_detect():
                     original_filename = filename
                     ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
                     
-                    if ext not in ['mp4', 'avi', 'mov', 'jpg', 'jpeg', 'png']:
+                    if ext not in ['mp4', 'avi', 'mov', 'jpg', 'jpeg', 'jfif', 'png']:
                         error = 'File không hợp lệ. Vui lòng chọn video (MP4, AVI, MOV) hoặc ảnh (JPG, PNG)'
                     else:
                         temp_path = None
@@ -636,7 +636,7 @@ def weapon_detect():
                             result_image_url = None
                             result_video_url = None
                             
-                            if ext in ['jpg', 'jpeg', 'png']:
+                            if ext in ['jpg', 'jpeg', 'jfif', 'png']:
                                 file_type = 'image'
                                 if annotated_image_url:
                                     result_image_url = annotated_image_url
@@ -1,11 +1,15 @@
 import requests
+import json
 import os
-from flask import current_app
+import time
 from app.utils.storage_service import StorageService
 
 
 class AIClientService:
     
+    # Hạn cache trạng thái sẵn sàng theo từng model ('*' = mọi model)
+    _ready_until = {}
+    
     @staticmethod
     def _get_ai_server_url():
         url = os.getenv('AI_SERVER_URL', 'http://localhost:5001')
@@ -16,9 +20,59 @@ class AIClientService:
         ai_server_url = AIClientService._get_ai_server_url()
         return f"{ai_server_url}/{path.lstrip('/')}"
     
+    @staticmethod
+    def wait_until_ready(timeout: float = None, models: tuple = None) -> dict:
+        """Chờ AI server nạp xong model (GET /ready) trước khi gửi request.
+
+        `models` là các model request cần ('pose', 'weapon'); chỉ chờ các model đó,
+        model khác đang nạp hay bị lỗi không ảnh hưởng. None = chờ mọi model.
+        """
+        keys = tuple(models) if models else ('*',)
+        now = time.time()
+        if all(AIClientService._ready_until.get(k, 0.0) > now for k in keys):
+            return {'ready': True, 'cached': True}
+        if timeout is None:
+            timeout = float(os.getenv('AI_SERVER_READY_TIMEOUT', '600'))
+        poll_interval = float(os.getenv('AI_SERVER_READY_POLL_INTERVAL', '5'))
+        endpoint = AIClientService._get_endpoint_url("ready")
+        params = {'model': keys[0]} if models and len(keys) == 1 else None
+        deadline = time.time() + timeout
+        last_status = None
+        while True:
+            try:
+                response = requests.get(endpoint, params=params, timeout=30)
+                if response.status_code == 404:
+                    # AI server bản cũ chưa có /ready
+                    return {'ready': True, 'status': 'unknown'}
+                last_status = response.json()
+                model_states = last_status.get('models') or {}
+                if models:
+                    states = {m: (model_states.get(m) or {}).get('status') for m in keys}
+                    failed = [m for m, state in states.items() if state == 'failed']
+                    if failed:
+                        errors = {m: model_states[m].get('error') for m in failed}
+                        raise Exception(f"AI server failed to load model(s): {errors}")
+                    ready = last_status.get('ready') or all(state == 'ready' for state in states.values())
+                else:
+                    if last_status.get('status') in ('failed', 'partial'):
+                        raise Exception(f"AI server failed to load models: {model_states}")
+                    ready = response.status_code == 200 and last_status.get('ready')
+                if ready:
+                    ttl = float(os.getenv('AI_SERVER_READY_TTL', '300'))
+                    for k in keys:
+                        AIClientService._ready_until[k] = time.time() + ttl
+                    return last_status
+            except (requests.exceptions.RequestException, ValueError) as e:
+                last_status = {'error': str(e)}
+            if time.time() + poll_interval > deadline:
+                raise Exception(f"AI server not ready after {timeout:.0f}s: {last_status}")
+            print(f"[AIClientService] Waiting for AI server to be ready: {last_status}", flush=True)
+            time.sleep(poll_interval)
+    
     @staticmethod
     def detect_weapon(video_url: str) -> dict:
         endpoint = AIClientService._get_endpoint_url("weapon/detect")
+        AIClientService.wait_until_ready(models=('weapon',))
         
         temp_path = None
         try:
@@ -29,14 +83,18 @@ class AIClientService:
                 video_file_path = video_url
             
             video_filename = os.path.basename(video_file_path)
-            if not video_filename or not video_filename.endswith(('.mp4', '.avi', '.mov')):
+            content_type = 'video/mp4'
+            if video_filename.lower().endswith(('.jpg', '.jpeg', '.jfif', '.png')):
+                # AI server giải mã ảnh ngay trong bộ nhớ, không xử lý như video
+                content_type = 'image/png' if video_filename.lower().endswith('.png') else 'image/jpeg'
+            elif not video_filename or not video_filename.endswith(('.mp4', '.avi', '.mov')):
                 video_filename = 'video.mp4'
             
             print(f"[AIClientService] Calling endpoint: {endpoint}", flush=True)
             print(f"[AIClientService] Video file: {video_filename}", flush=True)
             
             with open(video_file_path, 'rb') as f:
-                files = {'video': (video_filename, f, 'video/mp4')}
+                files = {'video': (video_filename, f, content_type)}
                 data = {}
                 response = requests.post(
                     endpoint,
@@ -63,9 +121,66 @@ class AIClientService:
             if temp_path and os.path.exists(temp_path):
                 os.remove(temp_path)
     
+    @staticmethod
+    def detect_weapons_batch(image_paths: list, batch_size: int = None, on_result=None) -> list:
+        """Nhận diện vũ khí cho nhiều ảnh (hoặc file .zip) trong một request.
+
+        AI server trả kết quả dạng NDJSON theo thứ tự gửi lên; on_result(row) được
+        gọi ngay khi từng ảnh có kết quả. Trả về danh sách
+        {'index', 'filename', 'result' | 'error'} theo thứ tự đầu vào.
+        """
+        endpoint = AIClientService._get_endpoint_url("weapon/detect-batch")
+        AIClientService.wait_until_ready(models=('weapon',))
+
+        temp_paths = []
+        opened = []
+        try:
+            files = []
+            for path in image_paths:
+                if path.startswith('https://storage.railway.app'):
+                    local_path = StorageService.download_file_to_temp(path)
+                    temp_paths.append(local_path)
+                else:
+                    local_path = path
+                f = open(local_path, 'rb')
+                opened.append(f)
+                filename = os.path.basename(path)
+                if filename.lower().endswith('.zip'):
+                    files.append(('archive', (filename, f, 'application/zip')))
+                else:
+                    content_type = 'image/png' if filename.lower().endswith('.png') else 'image/jpeg'
+                    files.append(('images', (filename, f, content_type)))
+            data = {'batch_size': str(batch_size)} if batch_size else {}
+
+            print(f"[AIClientService] Calling endpoint: {endpoint} ({len(files)} files)", flush=True)
+            results = []
+            with requests.post(endpoint, files=files, data=data, stream=True, timeout=1200) as response:
+                if response.status_code != 200:
+                    print(f"[AIClientService] Response text: {response.text[:500]}", flush=True)
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    row = json.loads(line)
+                    results.append(row)
+                    if on_result:
+                        on_result(row)
+            return results
+
+        except requests.exceptions.RequestException as e:
+            print(f"[AIClientService] Error: {e}", flush=True)
+            raise Exception(f"Failed to detect weapons: {str(e)}")
+        finally:
+            for f in opened:
+                f.close()
+            for temp_path in temp_paths:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
     @staticmethod
     def extract_template(video_url: str) -> dict:
         endpoint = AIClientService._get_endpoint_url("pose/extract-template")
+        AIClientService.wait_until_ready(models=('pose',))
         
         temp_path = None
         try:
@@ -100,10 +215,14 @@ class AIClientService:
                 os.remove(temp_path)
     
     @staticmethod
-    def score_pose(student_video_url: str, teacher_template_path: str) -> dict:
-        endpoint = AIClientService._get_endpoint_url("pose/score")
+    def _post_student_video(path: str, student_video_url: str, teacher_template_path: str,
+                            teacher_features_path: str = None, return_keypoints: bool = False,
+                            models: tuple = ('pose',)) -> dict:
+        endpoint = AIClientService._get_endpoint_url(path)
+        AIClientService.wait_until_ready(models=models)
         
         temp_video_path = None
+        tf = None
         try:
             if student_video_url.startswith('https://storage.railway.app'):
                 temp_video_path = StorageService.download_file_to_temp(student_video_url)
@@ -114,9 +233,14 @@ class AIClientService:
             with open(student_file_path, 'rb') as sv, open(teacher_template_path, 'rb') as tt:
                 files = {
                     'student_video': ('student.mp4', sv, 'video/mp4'),
-                    'teacher_template': ('template.npy', tt, 'application/octet-stream')
+                    'teacher_template': (os.path.basename(teacher_template_path), tt, 'application/octet-stream')
                 }
+                if teacher_features_path:
+                    tf = open(teacher_features_path, 'rb')
+                    files['teacher_features'] = ('teacher_features.npz', tf, 'application/octet-stream')
                 data = {}
+                if return_keypoints:
+                    data['return_keypoints'] = 'true'
                 response = requests.post(
                     endpoint,
                     files=files,
@@ -126,11 +250,120 @@ class AIClientService:
             
             response.raise_for_status()
             return response.json()
-            
-        except requests.exceptions.RequestException as e:
-            print(f"[AIClientService] Error: {e}", flush=True)
-            raise Exception(f"Failed to score pose: {str(e)}")
         finally:
+            if tf:
+                tf.close()
             if temp_video_path and os.path.exists(temp_video_path):
                 os.remove(temp_video_path)
+    
+    @staticmethod
+    def score_pose(student_video_url: str, teacher_template_path: str, teacher_features_path: str = None,
+                   return_keypoints: bool = False) -> dict:
+        try:
+            return AIClientService._post_student_video(
+                "pose/score", student_video_url, teacher_template_path, teacher_features_path, return_keypoints
+            )
+        except requests.exceptions.RequestException as e:
+            print(f"[AIClientService] Error: {e}", flush=True)
+            raise Exception(f"Failed to score pose: {str(e)}")
+    
+    @staticmethod
+    def analyze(student_video_url: str, teacher_template_path: str, teacher_features_path: str = None,
+                return_keypoints: bool = False) -> dict:
+        """Nhận diện vũ khí + chấm pose trong một request (AI server giải mã video một lần).
 
+        Trả về {'weapon': ..., 'pose': ...}; 'pose' là None kèm 'pose_error' khi không chấm được.
+        Chỉ chờ model pose: model vũ khí lỗi thì 'weapon' là None kèm 'weapon_error'.
+        """
+        try:
+            return AIClientService._post_student_video(
+                "analyze", student_video_url, teacher_template_path, teacher_features_path, return_keypoints
+            )
+        except requests.exceptions.RequestException as e:
+            print(f"[AIClientService] Error: {e}", flush=True)
+            raise Exception(f"Failed to analyze video: {str(e)}")
+    
+    @staticmethod
+    def register_template(teacher_template_path: str) -> str:
+        """Đăng ký template giáo viên với AI server, trả về template_id để chấm nhiều lần."""
+        endpoint = AIClientService._get_endpoint_url("pose/templates")
+        # Không dùng model nào trên AI server nên không cần chờ warm-up
+        try:
+            with open(teacher_template_path, 'rb') as tt:
+                files = {'teacher_template': (os.path.basename(teacher_template_path), tt, 'application/octet-stream')}
+                response = requests.post(endpoint, files=files, timeout=120)
+            response.raise_for_status()
+            return response.json()['template_id']
+        except requests.exceptions.RequestException as e:
+            print(f"[AIClientService] Error: {e}", flush=True)
+            raise Exception(f"Failed to register template: {str(e)}")
+    
+    @staticmethod
+    def get_scorer_version() -> str:
+        endpoint = AIClientService._get_endpoint_url("pose/version")
+        try:
+            response = requests.get(endpoint, timeout=30)
+            response.raise_for_status()
+            return str(response.json().get('scorer_version'))
+        except requests.exceptions.RequestException as e:
+            print(f"[AIClientService] Error: {e}", flush=True)
+            raise Exception(f"Failed to get scorer version: {str(e)}")
+    
+    @staticmethod
+    def score_keypoints(keypoints_path: str, teacher_template_path: str = None, template_id: str = None,
+                        keypoints_format: str = 'normalized', student_fps: float = None,
+                        teacher_features_path: str = None) -> dict:
+        """Chấm điểm từ chuỗi keypoints (.npy) đã có, không upload video.
+
+        Template giáo viên gửi dạng file hoặc template_id đã đăng ký trên AI server.
+        """
+        if not teacher_template_path and not template_id:
+            raise ValueError("teacher_template_path or template_id is required")
+        endpoint = AIClientService._get_endpoint_url("pose/score-keypoints")
+        # Chấm từ keypoints có sẵn, không suy luận -> không chờ warm-up model
+        
+        temp_path = None
+        opened = []
+        try:
+            if keypoints_path.startswith('https://storage.railway.app'):
+                temp_path = StorageService.download_file_to_temp(keypoints_path)
+                keypoints_file_path = temp_path
+            else:
+                keypoints_file_path = keypoints_path
+            
+            kf = open(keypoints_file_path, 'rb')
+            opened.append(kf)
+            files = {'student_keypoints': ('keypoints.npy', kf, 'application/octet-stream')}
+            data = {'keypoints_format': keypoints_format}
+            if student_fps:
+                data['student_fps'] = str(student_fps)
+            if template_id:
+                data['template_id'] = template_id
+            else:
+                tt = open(teacher_template_path, 'rb')
+                opened.append(tt)
+                files['teacher_template'] = (os.path.basename(teacher_template_path), tt, 'application/octet-stream')
+            if teacher_features_path:
+                tf = open(teacher_features_path, 'rb')
+                opened.append(tf)
+                files['teacher_features'] = ('teacher_features.npz', tf, 'application/octet-stream')
+            response = requests.post(
+                endpoint,
+                files=files,
+                data=data,
+                timeout=120
+            )
+            
+            if response.status_code != 200:
+                print(f"[AIClientService] Response text: {response.text[:500]}", flush=True)
+            response.raise_for_status()
+            return response.json()
+            
+        except requests.exceptions.RequestException as e:
+            print(f"[AIClientService] Error: {e}", flush=True)
+            raise Exception(f"Failed to score keypoints: {str(e)}")
+        finally:
+            for f in opened:
+                f.close()
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
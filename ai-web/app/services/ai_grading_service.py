@@ -10,11 +10,18 @@ import os
 import sys
 import base64
 import tempfile
+import shutil
+import json
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 _template_locks = {}
 _template_lock = threading.Lock()
 
+KEYPOINTS_FOLDER = 'keypoints'
+# Keypoints là dữ liệu tư thế của học viên: không public, chỉ tải về qua StorageService
+KEYPOINTS_ACL = 'private'
+
 
 class AIGradingService:
     
@@ -29,8 +36,11 @@ class AIGradingService:
         templates_dir = os.path.join(project_root, 'static', 'uploads', 'templates')
         os.makedirs(templates_dir, exist_ok=True)
         
-        template_filename = f"teacher_template_assignment_{assignment_id}.npy"
-        template_path = os.path.join(templates_dir, template_filename)
+        template_path = os.path.join(templates_dir, f"teacher_template_assignment_{assignment_id}.wrtt")
+        # Template .npy cũ (trước khi có định dạng .wrtt) vẫn dùng được, AI server tự nhận dạng
+        legacy_template_path = os.path.join(templates_dir, f"teacher_template_assignment_{assignment_id}.npy")
+        if not os.path.exists(template_path) and os.path.exists(legacy_template_path):
+            return legacy_template_path
         
         if not os.path.exists(template_path):
             with _template_lock:
@@ -41,6 +51,8 @@ class AIGradingService:
             with lock:
                 if os.path.exists(template_path):
                     return template_path
+                if os.path.exists(legacy_template_path):
+                    return legacy_template_path
                 
                 print(f"[AIGradingService] Teacher template not found, generating from instructor video...", flush=True)
                 
@@ -78,15 +90,27 @@ class AIGradingService:
                     template_base64 = template_result['template']
                     template_bytes = base64.b64decode(template_base64)
                     shape = tuple(template_result.get('shape', ()))
-                    dtype_str = template_result.get('dtype', 'float32')
-                    dtype = np.dtype(dtype_str)
-                    teacher_template = np.frombuffer(template_bytes, dtype=dtype)
-                    if shape:
-                        teacher_template = teacher_template.reshape(shape)
-                    
-                    np.save(template_path, teacher_template)
+                    if template_result.get('format') == 'wrtt':
+                        # File .wrtt đã có header (fps, normalize, checksum), ghi nguyên byte
+                        with open(template_path, 'wb') as f:
+                            f.write(template_bytes)
+                    else:
+                        # AI server cũ trả mảng thô -> lưu .npy như trước
+                        dtype = np.dtype(template_result.get('dtype', 'float32'))
+                        teacher_template = np.frombuffer(template_bytes, dtype=dtype)
+                        if shape:
+                            teacher_template = teacher_template.reshape(shape)
+                        template_path = legacy_template_path
+                        np.save(template_path, teacher_template)
                     print(f"[AIGradingService] Teacher template saved to: {template_path}", flush=True)
-                    print(f"[AIGradingService] Template shape: {teacher_template.shape}", flush=True)
+                    
+                    features_base64 = template_result.get('features')
+                    if features_base64:
+                        features_path = AIGradingService._get_teacher_features_path(template_path)
+                        with open(features_path, 'wb') as f:
+                            f.write(base64.b64decode(features_base64))
+                        print(f"[AIGradingService] Teacher features saved to: {features_path}", flush=True)
+                    print(f"[AIGradingService] Template shape: {shape}", flush=True)
                     sys.stdout.flush()
                     
                 except Exception as e:
@@ -102,7 +126,259 @@ class AIGradingService:
                         except:
                             pass
         
-        return template_path if os.path.exists(template_path) else None
+        if os.path.exists(template_path):
+            return template_path
+        return legacy_template_path if os.path.exists(legacy_template_path) else None
+    
+    @staticmethod
+    def _get_teacher_features_path(template_path: str) -> str:
+        return os.path.splitext(template_path)[0] + '_features.npz'
+    
+    @staticmethod
+    def _save_ai_evaluation(video_id: int, assignment, result: dict):
+        total_score = result.get('total_score')
+        if total_score is None:
+            total_score = result.get('total', 0)
+        accuracy_score = result.get('accuracy_score')
+        if accuracy_score is None:
+            accuracy_score = result.get('pose', 0)
+        speed_score = result.get('speed_score')
+        if speed_score is None:
+            speed_score = result.get('speed', 0)
+        stability_score = result.get('stability_score')
+        if stability_score is None:
+            stability_score = result.get('stability', 0)
+        feedback_raw = result.get('feedback', [])
+        if isinstance(feedback_raw, dict):
+            feedback_list = [v for v in feedback_raw.values()]
+        else:
+            feedback_list = list(feedback_raw)
+        comments = "\n".join(str(fb) for fb in feedback_list)
+
+        print(f"\n[AIGradingService] Kết quả chấm điểm:", flush=True)
+        print(f"  - Điểm tổng: {total_score}/100", flush=True)
+        print(f"  - Điểm độ chính xác (Kỹ thuật): {accuracy_score}/50", flush=True)
+        print(f"  - Điểm tốc độ (Tinh thần): {speed_score}/30", flush=True)
+        print(f"  - Điểm ổn định (Tư thế): {stability_score}/20", flush=True)
+
+        metrics = result.get('metrics')
+        if isinstance(metrics, dict):
+            print(f"\n[AIGradingService] Metrics chi tiết:", flush=True)
+            cs = metrics.get('cosine_similarity')
+            dtw = metrics.get('dtw_distance')
+            jitter = metrics.get('jitter_mse')
+            if cs is not None:
+                print(f"  - Cosine Similarity: {cs:.4f}", flush=True)
+            if dtw is not None:
+                print(f"  - DTW Distance: {dtw:.2f}", flush=True)
+            if jitter is not None:
+                print(f"  - Jitter MSE: {jitter:.6f}", flush=True)
+
+        print(f"\n[AIGradingService] Feedback:", flush=True)
+        for i, fb in enumerate(feedback_list, 1):
+            print(f"  {i}. {fb}", flush=True)
+        
+        existing = ManualEvaluation.query.filter_by(
+            video_id=video_id,
+            evaluation_method='ai'
+        ).first()
+        
+        if existing:
+            print(f"\n[AIGradingService] Cập nhật đánh giá AI hiện có...", flush=True)
+            existing.overall_score = total_score
+            existing.technique_score = accuracy_score
+            existing.posture_score = stability_score
+            existing.spirit_score = speed_score
+            existing.comments = comments
+            from app.utils.helpers import get_vietnam_time
+            existing.evaluated_at = get_vietnam_time()
+        else:
+            print(f"\n[AIGradingService] Tạo đánh giá AI mới...", flush=True)
+            from app.utils.helpers import get_vietnam_time
+            evaluation = ManualEvaluation(
+                video_id=video_id,
+                instructor_id=assignment.assigned_by,
+                overall_score=total_score,
+                technique_score=accuracy_score,
+                posture_score=stability_score,
+                spirit_score=speed_score,
+                comments=comments,
+                evaluation_method='ai',
+                evaluated_at=get_vietnam_time()
+            )
+            db.session.add(evaluation)
+        return total_score
+    
+    @staticmethod
+    def _keypoints_storage_enabled() -> bool:
+        return os.getenv('AI_STORE_KEYPOINTS', 'true').lower() in ('1', 'true', 'yes')
+    
+    @staticmethod
+    def _analyze_enabled() -> bool:
+        # Gọi /analyze: nhận diện vũ khí + chấm pose trong một lần upload / giải mã video.
+        # Mặc định tắt: bài nộp theo assignment trước nay chỉ chấm pose, không nhận diện vũ khí
+        return os.getenv('AI_FUSED_ANALYZE', 'false').lower() in ('1', 'true', 'yes')
+    
+    @staticmethod
+    def _keypoints_key(video_id: int, ext: str = 'npy') -> str:
+        return f"{KEYPOINTS_FOLDER}/video_{video_id}.{ext}"
+    
+    @staticmethod
+    def _upload_keypoints_manifest(manifest: dict):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, f"video_{manifest['video_id']}.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            StorageService.upload_file_from_path(
+                path, folder=KEYPOINTS_FOLDER, filename=os.path.basename(path), acl=KEYPOINTS_ACL
+            )
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    @staticmethod
+    def _store_keypoints(video_id: int, assignment_id: int, result: dict):
+        """Lưu chuỗi keypoints học viên (keypoints/video_<id>.npy) kèm manifest .json lên storage.
+
+        Lỗi lưu trữ không làm hỏng lần chấm; video đó chỉ không chấm lại được từ keypoints.
+        """
+        keypoints_b64 = result.pop('keypoints', None)
+        if not keypoints_b64:
+            return None
+        temp_dir = tempfile.mkdtemp()
+        try:
+            npy_path = os.path.join(temp_dir, f"video_{video_id}.npy")
+            with open(npy_path, 'wb') as f:
+                f.write(base64.b64decode(keypoints_b64))
+            keypoints_url = StorageService.upload_file_from_path(
+                npy_path, folder=KEYPOINTS_FOLDER, filename=os.path.basename(npy_path), acl=KEYPOINTS_ACL
+            )
+            from app.utils.helpers import get_vietnam_time
+            manifest = {
+                'video_id': video_id,
+                'assignment_id': assignment_id,
+                'keypoints_key': AIGradingService._keypoints_key(video_id),
+                'keypoints_url': keypoints_url,
+                'keypoints_format': result.pop('keypoints_format', 'normalized'),
+                'fps': result.pop('keypoints_fps', None),
+                'sampled': result.pop('keypoints_sampled', False),
+                'scorer_version': result.get('scorer_version'),
+                'total': result.get('total'),
+                'scored_at': get_vietnam_time().isoformat(),
+            }
+            AIGradingService._upload_keypoints_manifest(manifest)
+            print(f"[AIGradingService] Student keypoints saved to: {keypoints_url}", flush=True)
+            return manifest
+        except Exception as e:
+            print(f"[AIGradingService] WARNING: could not store keypoints for video {video_id}: {e}", flush=True)
+            return None
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    @staticmethod
+    def _load_keypoints_manifest(video_id: int):
+        temp_path = None
+        try:
+            temp_path = StorageService.download_file_to_temp(AIGradingService._keypoints_key(video_id, 'json'))
+            with open(temp_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return None
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    @staticmethod
+    def rescore_from_keypoints(assignment_id: int = None, force: bool = False, workers: int = None, app=None) -> dict:
+        """Chấm lại đánh giá AI từ keypoints đã lưu (không cần video, không chạy model).
+
+        Bỏ qua video có manifest đã chấm bằng đúng scorer_version hiện tại của AI server,
+        trừ khi force=True. Mỗi template giáo viên chỉ upload một lần (template_id).
+        """
+        if app is None:
+            try:
+                app = current_app._get_current_object()
+            except RuntimeError:
+                from app import create_app
+                app = create_app()
+        if workers is None:
+            workers = int(os.getenv('AI_RESCORE_WORKERS', '4'))
+        
+        with app.app_context():
+            query = TrainingVideo.query.filter(TrainingVideo.assignment_id.isnot(None))
+            if assignment_id is not None:
+                query = query.filter(TrainingVideo.assignment_id == assignment_id)
+            videos = query.all()
+            current_version = AIClientService.get_scorer_version()
+            summary = {
+                'scorer_version': current_version,
+                'videos': len(videos),
+                'rescored': 0,
+                'up_to_date': 0,
+                'missing_keypoints': 0,
+                'failed': 0,
+            }
+            print(f"[AIGradingService] Rescoring {len(videos)} videos with scorer version {current_version}", flush=True)
+            
+            template_ids = {}
+            tasks = []
+            for video in videos:
+                manifest = AIGradingService._load_keypoints_manifest(video.video_id)
+                if manifest is None:
+                    summary['missing_keypoints'] += 1
+                    continue
+                if not force and str(manifest.get('scorer_version')) == current_version:
+                    summary['up_to_date'] += 1
+                    continue
+                if video.assignment_id not in template_ids:
+                    try:
+                        template_path = AIGradingService._get_teacher_template_path(video.assignment_id)
+                        template_ids[video.assignment_id] = AIClientService.register_template(template_path)
+                    except Exception as e:
+                        print(f"[AIGradingService] ERROR: {e}", flush=True)
+                        template_ids[video.assignment_id] = None
+                if template_ids[video.assignment_id] is None:
+                    print(f"[AIGradingService] No teacher template for assignment {video.assignment_id}", flush=True)
+                    summary['failed'] += 1
+                    continue
+                tasks.append((video.video_id, video.assignment_id, manifest, template_ids[video.assignment_id]))
+            
+            def score(task):
+                _, _, manifest, template_id = task
+                return AIClientService.score_keypoints(
+                    manifest.get('keypoints_url') or manifest['keypoints_key'],
+                    template_id=template_id,
+                    keypoints_format=manifest.get('keypoints_format', 'normalized'),
+                    # Giống /pose/score: chỉ resample template khi video học viên đã bị lấy mẫu lại
+                    student_fps=manifest.get('fps') if manifest.get('sampled') else None,
+                )
+            
+            assignments = {}
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                futures = {pool.submit(score, task): task for task in tasks}
+                for future in as_completed(futures):
+                    video_id, video_assignment_id, manifest, _ = futures[future]
+                    try:
+                        result = future.result()
+                        if video_assignment_id not in assignments:
+                            assignments[video_assignment_id] = Assignment.query.get(video_assignment_id)
+                        previous = manifest.get('total')
+                        AIGradingService._save_ai_evaluation(video_id, assignments[video_assignment_id], result)
+                        db.session.commit()
+                        from app.utils.helpers import get_vietnam_time
+                        manifest['scorer_version'] = result.get('scorer_version', current_version)
+                        manifest['total'] = result.get('total')
+                        manifest['scored_at'] = get_vietnam_time().isoformat()
+                        AIGradingService._upload_keypoints_manifest(manifest)
+                        summary['rescored'] += 1
+                        print(f"[AIGradingService] Video {video_id}: {previous} -> {result.get('total')}", flush=True)
+                    except Exception as e:
+                        db.session.rollback()
+                        summary['failed'] += 1
+                        print(f"[AIGradingService] ERROR rescoring video {video_id}: {e}", flush=True)
+            
+            print(f"[AIGradingService] Rescoring finished: {summary}", flush=True)
+            return summary
     
     @staticmethod
     def _grade_core(video_id: int, app=None):
@@ -191,79 +467,32 @@ class AIGradingService:
                 
                 print("\n[AIGradingService] Đang gọi AI server để chấm điểm...", flush=True)
                 sys.stdout.flush()
-                result = AIClientService.score_pose(student_video_path, teacher_template_path)
-
-                total_score = result.get('total_score')
-                if total_score is None:
-                    total_score = result.get('total', 0)
-                accuracy_score = result.get('accuracy_score')
-                if accuracy_score is None:
-                    accuracy_score = result.get('pose', 0)
-                speed_score = result.get('speed_score')
-                if speed_score is None:
-                    speed_score = result.get('speed', 0)
-                stability_score = result.get('stability_score')
-                if stability_score is None:
-                    stability_score = result.get('stability', 0)
-                feedback_raw = result.get('feedback', [])
-                if isinstance(feedback_raw, dict):
-                    feedback_list = [v for v in feedback_raw.values()]
-                else:
-                    feedback_list = list(feedback_raw)
-                comments = "\n".join(str(fb) for fb in feedback_list)
-
-                print(f"\n[AIGradingService] Kết quả chấm điểm:", flush=True)
-                print(f"  - Điểm tổng: {total_score}/100", flush=True)
-                print(f"  - Điểm độ chính xác (Kỹ thuật): {accuracy_score}/50", flush=True)
-                print(f"  - Điểm tốc độ (Tinh thần): {speed_score}/30", flush=True)
-                print(f"  - Điểm ổn định (Tư thế): {stability_score}/20", flush=True)
-
-                metrics = result.get('metrics')
-                if isinstance(metrics, dict):
-                    print(f"\n[AIGradingService] Metrics chi tiết:", flush=True)
-                    cs = metrics.get('cosine_similarity')
-                    dtw = metrics.get('dtw_distance')
-                    jitter = metrics.get('jitter_mse')
-                    if cs is not None:
-                        print(f"  - Cosine Similarity: {cs:.4f}", flush=True)
-                    if dtw is not None:
-                        print(f"  - DTW Distance: {dtw:.2f}", flush=True)
-                    if jitter is not None:
-                        print(f"  - Jitter MSE: {jitter:.6f}", flush=True)
-
-                print(f"\n[AIGradingService] Feedback:", flush=True)
-                for i, fb in enumerate(feedback_list, 1):
-                    print(f"  {i}. {fb}", flush=True)
-                
-                existing = ManualEvaluation.query.filter_by(
-                    video_id=video_id,
-                    evaluation_method='ai'
-                ).first()
-                
-                if existing:
-                    print(f"\n[AIGradingService] Cập nhật đánh giá AI hiện có...", flush=True)
-                    existing.overall_score = total_score
-                    existing.technique_score = accuracy_score
-                    existing.posture_score = stability_score
-                    existing.spirit_score = speed_score
-                    existing.comments = comments
-                    from app.utils.helpers import get_vietnam_time
-                    existing.evaluated_at = get_vietnam_time()
+                teacher_features_path = AIGradingService._get_teacher_features_path(teacher_template_path)
+                if not os.path.exists(teacher_features_path):
+                    teacher_features_path = None
+                store_keypoints = AIGradingService._keypoints_storage_enabled()
+                if AIGradingService._analyze_enabled():
+                    from app.services.weapon_detection_service import WeaponDetectionService
+                    analysis = AIClientService.analyze(
+                        student_video_path, teacher_template_path, teacher_features_path,
+                        return_keypoints=store_keypoints
+                    )
+                    if analysis.get('weapon') is not None:
+                        WeaponDetectionService.apply_detection(video, analysis['weapon'])
+                    result = analysis.get('pose')
+                    if result is None:
+                        # Vẫn lưu kết quả vũ khí dù không chấm được pose
+                        db.session.commit()
+                        raise Exception(f"AI server could not score pose: {analysis.get('pose_error')}")
                 else:
-                    print(f"\n[AIGradingService] Tạo đánh giá AI mới...", flush=True)
-                    from app.utils.helpers import get_vietnam_time
-                    evaluation = ManualEvaluation(
-                        video_id=video_id,
-                        instructor_id=assignment.assigned_by,
-                        overall_score=total_score,
-                        technique_score=accuracy_score,
-                        posture_score=stability_score,
-                        spirit_score=speed_score,
-                        comments=comments,
-                        evaluation_method='ai',
-                        evaluated_at=get_vietnam_time()
+                    result = AIClientService.score_pose(
+                        student_video_path, teacher_template_path, teacher_features_path,
+                        return_keypoints=store_keypoints
                     )
-                    db.session.add(evaluation)
+                if store_keypoints:
+                    AIGradingService._store_keypoints(video_id, video.assignment_id, result)
+
+                total_score = AIGradingService._save_ai_evaluation(video_id, assignment, result)
                 
                 video.processing_status = 'completed'
                 from app.utils.helpers import get_vietnam_time
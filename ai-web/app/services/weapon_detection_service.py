@@ -10,6 +10,57 @@ import tempfile
 
 class WeaponDetectionService:
 
+    @staticmethod
+    def apply_detection(video, detection_result: dict):
+        """Ghi detected_weapon / weapon_match_status của video từ kết quả nhận diện (chưa commit)."""
+        detected_weapon = detection_result.get('detected_weapon')
+        confidence = detection_result.get('confidence', 0.0)
+        detection_count = detection_result.get('detection_count', 0)
+        total_samples = detection_result.get('total_samples', 0)
+        
+        print(f"\n[WeaponDetectionService] Kết quả phát hiện:", flush=True)
+        print(f"  - Vũ khí phát hiện: {detected_weapon}", flush=True)
+        print(f"  - Độ tin cậy: {confidence:.2%}", flush=True)
+        print(f"  - Số frame phát hiện: {detection_count}/{total_samples}", flush=True)
+        
+        expected_weapon = None
+        weapon_match = False
+        
+        if video.assignment_id:
+            assignment = Assignment.query.get(video.assignment_id)
+            if assignment and assignment.routine:
+                routine = assignment.routine
+                if routine.weapon:
+                    expected_weapon = routine.weapon.weapon_name_vi or routine.weapon.weapon_name_en
+                    
+                    print(f"\n[WeaponDetectionService] Thông tin assignment:", flush=True)
+                    print(f"  - Bài võ: {routine.routine_name}", flush=True)
+                    print(f"  - Vũ khí yêu cầu: {expected_weapon}", flush=True)
+                    
+                    if detected_weapon and expected_weapon:
+                        weapon_match = (detected_weapon.lower().strip() == expected_weapon.lower().strip())
+        
+        if detected_weapon == 'Thương' and expected_weapon == 'Giáo':
+            print(f"[WeaponDetectionService] Detected 'Thương' but expected 'Giáo' - treating as match (spear type)", flush=True)
+            detected_weapon = 'Giáo'
+            weapon_match = True
+        elif detected_weapon == 'Giáo' and expected_weapon == 'Thương':
+            print(f"[WeaponDetectionService] Detected 'Giáo' but expected 'Thương' - treating as match (spear type)", flush=True)
+            detected_weapon = 'Thương'
+            weapon_match = True
+        
+        video.detected_weapon = detected_weapon
+        
+        if expected_weapon:
+            video.weapon_match_status = 'matched' if weapon_match else 'mismatched'
+        else:
+            video.weapon_match_status = 'pending'
+        
+        print(f"\n[WeaponDetectionService] Kết quả so sánh:", flush=True)
+        print(f"  - Vũ khí phát hiện: {detected_weapon}", flush=True)
+        print(f"  - Vũ khí yêu cầu: {expected_weapon}", flush=True)
+        print(f"  - Trạng thái khớp: {'✓ KHỚP' if weapon_match else '✗ KHÔNG KHỚP' if expected_weapon else 'CHƯA XÁC ĐỊNH'}", flush=True)
+
     @staticmethod
     def _detect_core(video_id: int, app=None):
         if app is None:
@@ -63,55 +114,9 @@ class WeaponDetectionService:
                 print("\n[WeaponDetectionService] Đang gọi AI server để detect vũ khí...", flush=True)
                 sys.stdout.flush()
                 detection_result = AIClientService.detect_weapon(video_path)
-                detected_weapon = detection_result.get('detected_weapon')
-                confidence = detection_result.get('confidence', 0.0)
-                detection_count = detection_result.get('detection_count', 0)
-                total_samples = detection_result.get('total_samples', 0)
-                
-                print(f"\n[WeaponDetectionService] Kết quả phát hiện:", flush=True)
-                print(f"  - Vũ khí phát hiện: {detected_weapon}", flush=True)
-                print(f"  - Độ tin cậy: {confidence:.2%}", flush=True)
-                print(f"  - Số frame phát hiện: {detection_count}/{total_samples}", flush=True)
-                
-                expected_weapon = None
-                weapon_match = False
-                
-                if video.assignment_id:
-                    assignment = Assignment.query.get(video.assignment_id)
-                    if assignment and assignment.routine:
-                        routine = assignment.routine
-                        if routine.weapon:
-                            expected_weapon = routine.weapon.weapon_name_vi or routine.weapon.weapon_name_en
-                            
-                            print(f"\n[WeaponDetectionService] Thông tin assignment:", flush=True)
-                            print(f"  - Bài võ: {routine.routine_name}", flush=True)
-                            print(f"  - Vũ khí yêu cầu: {expected_weapon}", flush=True)
-                            
-                            if detected_weapon and expected_weapon:
-                                weapon_match = (detected_weapon.lower().strip() == expected_weapon.lower().strip())
-                
-                if detected_weapon == 'Thương' and expected_weapon == 'Giáo':
-                    print(f"[WeaponDetectionService] Detected 'Thương' but expected 'Giáo' - treating as match (spear type)", flush=True)
-                    detected_weapon = 'Giáo'
-                    weapon_match = True
-                elif detected_weapon == 'Giáo' and expected_weapon == 'Thương':
-                    print(f"[WeaponDetectionService] Detected 'Giáo' but expected 'Thương' - treating as match (spear type)", flush=True)
-                    detected_weapon = 'Thương'
-                    weapon_match = True
-                
-                video.detected_weapon = detected_weapon
-                
-                if expected_weapon:
-                    video.weapon_match_status = 'matched' if weapon_match else 'mismatched'
-                else:
-                    video.weapon_match_status = 'pending'
-                
+                WeaponDetectionService.apply_detection(video, detection_result)
                 db.session.commit()
                 
-                print(f"\n[WeaponDetectionService] Kết quả so sánh:", flush=True)
-                print(f"  - Vũ khí phát hiện: {detected_weapon}", flush=True)
-                print(f"  - Vũ khí yêu cầu: {expected_weapon}", flush=True)
-                print(f"  - Trạng thái khớp: {'✓ KHỚP' if weapon_match else '✗ KHÔNG KHỚP' if expected_weapon else 'CHƯA XÁC ĐỊNH'}", flush=True)
                 print("="*60, flush=True)
                 print("[WeaponDetectionService] Hoàn thành phát hiện vũ khí\n", flush=True)
                 sys.stdout.flush()
@@ -74,7 +74,7 @@ class StorageService:
             raise Exception(f"Error uploading file to storage: {str(e)}")
     
     @staticmethod
-    def upload_file_from_path(file_path, folder='uploads', filename=None):
+    def upload_file_from_path(file_path, folder='uploads', filename=None, acl='public-read'):
         try:
             s3_client, bucket_name, endpoint_url = StorageService._get_s3_client()
             
@@ -96,13 +96,14 @@ class StorageService:
             elif filename.endswith('.png'):
                 content_type = 'image/png'
             
+            # acl='private': chỉ đọc được qua client có credentials (download_file_to_temp / presigned URL)
             s3_client.upload_file(
                 file_path,
                 bucket_name,
                 s3_key,
                 ExtraArgs={
                     'ContentType': content_type,
-                    'ACL': 'public-read'
+                    'ACL': acl
                 }
             )
             
@@ -0,0 +1,28 @@
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.services.ai_grading_service import AIGradingService
+
+
+def run_rescore():
+    parser = argparse.ArgumentParser(description='Chấm lại đánh giá AI từ keypoints đã lưu (không chạy lại model)')
+    parser.add_argument('--assignment-id', type=int, help='chỉ chấm lại video của bài tập này')
+    parser.add_argument('--all', action='store_true', help='chấm lại video của mọi bài tập')
+    parser.add_argument('--force', action='store_true', help='chấm lại cả video đã chấm bằng scorer_version hiện tại')
+    parser.add_argument('--workers', type=int, default=None, help='số request chấm song song (mặc định AI_RESCORE_WORKERS)')
+    args = parser.parse_args()
+    if args.assignment_id is None and not args.all:
+        parser.error('cần --assignment-id hoặc --all')
+
+    app = create_app()
+    summary = AIGradingService.rescore_from_keypoints(
+        assignment_id=args.assignment_id, force=args.force, workers=args.workers, app=app
+    )
+    print(summary)
+
+
+if __name__ == '__main__':
+    run_rescore()
@@ -0,0 +1,276 @@
+"""
+Unit tests for AIGradingService keypoints storage and rescoring
+"""
+import base64
+import io
+import json
+import os
+import sys
+import tempfile
+import numpy as np
+import pytest
+from app.services.ai_grading_service import AIGradingService
+from app.services.ai_client_service import AIClientService
+from app.utils.storage_service import StorageService
+from app.models.assignment import Assignment
+from app.models.training_video import TrainingVideo
+from app.models.manual_evaluation import ManualEvaluation
+
+
+class FakeStorage:
+    """Storage trong bộ nhớ, ghi lại ACL của từng lần upload"""
+
+    def __init__(self):
+        self.objects = {}
+        self.acl = {}
+
+    def upload_file_from_path(self, file_path, folder='uploads', filename=None, acl='public-read'):
+        key = f"{folder}/{filename or os.path.basename(file_path)}"
+        with open(file_path, 'rb') as f:
+            self.objects[key] = f.read()
+        self.acl[key] = acl
+        return f"https://storage.railway.app/bucket/{key}"
+
+    def download_file_to_temp(self, file_url):
+        key = file_url.split("bucket/", 1)[1] if "bucket/" in file_url else file_url
+        if key not in self.objects:
+            raise Exception(f"Error downloading file from storage: {key}")
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.objects[key])
+        return path
+
+    def manifest(self, video_id):
+        return json.loads(self.objects[f"keypoints/video_{video_id}.json"])
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    fake = FakeStorage()
+    monkeypatch.setattr(StorageService, 'upload_file_from_path', staticmethod(fake.upload_file_from_path))
+    monkeypatch.setattr(StorageService, 'download_file_to_temp', staticmethod(fake.download_file_to_temp))
+    return fake
+
+
+def npy_b64(keypoints):
+    buf = io.BytesIO()
+    np.save(buf, keypoints)
+    return base64.b64encode(buf.getvalue()).decode('ascii')
+
+
+def score_result(total, version='2'):
+    return {
+        'total': total,
+        'pose': total * 0.5,
+        'speed': total * 0.3,
+        'stability': total * 0.2,
+        'feedback': ['ok'],
+        'scorer_version': version,
+    }
+
+
+class TestStoreKeypoints:
+    """Test AIGradingService._store_keypoints"""
+
+    def test_uploads_private(self, storage):
+        """Keypoints và manifest là dữ liệu học viên, không được public-read"""
+        keypoints = np.zeros((5, 51), dtype=np.float32)
+        result = dict(score_result(80.0, '1'), keypoints=npy_b64(keypoints), keypoints_fps=10.0, keypoints_sampled=True)
+
+        manifest = AIGradingService._store_keypoints(7, 3, result)
+
+        assert manifest is not None
+        assert storage.acl == {
+            'keypoints/video_7.npy': 'private',
+            'keypoints/video_7.json': 'private',
+        }
+        np.testing.assert_array_equal(np.load(io.BytesIO(storage.objects['keypoints/video_7.npy'])), keypoints)
+
+    def test_manifest_fields(self, storage):
+        """Manifest ghi đủ thông tin để chấm lại và bỏ các trường keypoints khỏi kết quả"""
+        result = dict(score_result(80.0, '1'), keypoints=npy_b64(np.zeros((5, 51))), keypoints_fps=10.0,
+                      keypoints_sampled=True, keypoints_format='normalized')
+
+        AIGradingService._store_keypoints(7, 3, result)
+
+        manifest = storage.manifest(7)
+        assert manifest['video_id'] == 7
+        assert manifest['assignment_id'] == 3
+        assert manifest['keypoints_key'] == 'keypoints/video_7.npy'
+        assert manifest['keypoints_format'] == 'normalized'
+        assert manifest['fps'] == 10.0
+        assert manifest['sampled'] is True
+        assert manifest['scorer_version'] == '1'
+        assert manifest['total'] == 80.0
+        assert not any(key.startswith('keypoints') for key in result)
+
+    def test_no_keypoints(self, storage):
+        """Kết quả không kèm keypoints thì không upload gì"""
+        assert AIGradingService._store_keypoints(7, 3, score_result(80.0)) is None
+        assert storage.objects == {}
+
+    def test_storage_error_does_not_fail(self, monkeypatch):
+        """Lỗi storage chỉ bỏ qua việc lưu keypoints"""
+        def fail(*args, **kwargs):
+            raise Exception("Error uploading file to storage: offline")
+        monkeypatch.setattr(StorageService, 'upload_file_from_path', staticmethod(fail))
+
+        result = dict(score_result(80.0), keypoints=npy_b64(np.zeros((5, 51))))
+        assert AIGradingService._store_keypoints(7, 3, result) is None
+
+
+class TestRescoreFromKeypoints:
+    """Test AIGradingService.rescore_from_keypoints"""
+
+    @pytest.fixture
+    def ai_client(self, monkeypatch, tmp_path):
+        calls = {'register': [], 'score': []}
+        template = tmp_path / 'teacher.npy'
+        template.write_bytes(b'template')
+
+        def register_template(path):
+            calls['register'].append(path)
+            return f"tpl-{len(calls['register'])}"
+
+        def score_keypoints(keypoints_path, teacher_template_path=None, template_id=None,
+                            keypoints_format='normalized', student_fps=None, teacher_features_path=None):
+            calls['score'].append({'keypoints_path': keypoints_path, 'template_id': template_id,
+                                   'keypoints_format': keypoints_format, 'student_fps': student_fps})
+            return score_result(90.0, '2')
+
+        monkeypatch.setattr(AIClientService, 'get_scorer_version', staticmethod(lambda: '2'))
+        monkeypatch.setattr(AIClientService, 'register_template', staticmethod(register_template))
+        monkeypatch.setattr(AIClientService, 'score_keypoints', staticmethod(score_keypoints))
+        monkeypatch.setattr(AIGradingService, '_get_teacher_template_path', staticmethod(lambda assignment_id: str(template)))
+        return calls
+
+    @pytest.fixture
+    def assignment(self, db_session, sample_user, instructor_user, sample_routine):
+        assignment = Assignment(
+            routine_id=sample_routine.routine_id,
+            assigned_by=instructor_user.user_id,
+            assignment_type='individual',
+            assigned_to_student=sample_user.user_id,
+            instructor_video_url='/static/uploads/demo.mp4',
+            grading_method='ai'
+        )
+        db_session.add(assignment)
+        db_session.commit()
+        return assignment
+
+    def add_video(self, db_session, assignment, sample_user, sample_routine):
+        video = TrainingVideo(
+            student_id=sample_user.user_id,
+            assignment_id=assignment.assignment_id,
+            routine_id=sample_routine.routine_id,
+            video_url='/static/uploads/video.mp4',
+            processing_status='completed'
+        )
+        db_session.add(video)
+        db_session.commit()
+        return video
+
+    def store(self, video, version, sampled=False):
+        result = dict(score_result(70.0, version), keypoints=npy_b64(np.zeros((5, 51))), keypoints_fps=10.0,
+                      keypoints_sampled=sampled)
+        AIGradingService._store_keypoints(video.video_id, video.assignment_id, result)
+
+    def test_rescore_outdated(self, app, db_session, storage, ai_client, assignment, sample_user, sample_routine):
+        """Video chấm bằng scorer_version cũ được chấm lại, manifest cập nhật và vẫn private"""
+        video = self.add_video(db_session, assignment, sample_user, sample_routine)
+        self.store(video, '1', sampled=True)
+
+        summary = AIGradingService.rescore_from_keypoints(assignment.assignment_id, workers=1, app=app)
+
+        assert summary['rescored'] == 1
+        assert summary['failed'] == 0
+        assert ai_client['score'][0]['template_id'] == 'tpl-1'
+        assert ai_client['score'][0]['student_fps'] == 10.0
+        manifest = storage.manifest(video.video_id)
+        assert manifest['scorer_version'] == '2'
+        assert manifest['total'] == 90.0
+        assert storage.acl[f"keypoints/video_{video.video_id}.json"] == 'private'
+        evaluation = ManualEvaluation.query.filter_by(video_id=video.video_id, evaluation_method='ai').first()
+        assert evaluation.overall_score == 90.0
+
+    def test_skip_up_to_date_and_missing(self, app, db_session, storage, ai_client, assignment, sample_user,
+                                         sample_routine):
+        """Bỏ qua video đã chấm bằng version hiện tại và video chưa có keypoints"""
+        current = self.add_video(db_session, assignment, sample_user, sample_routine)
+        self.store(current, '2')
+        self.add_video(db_session, assignment, sample_user, sample_routine)
+
+        summary = AIGradingService.rescore_from_keypoints(assignment.assignment_id, workers=1, app=app)
+
+        assert summary['up_to_date'] == 1
+        assert summary['missing_keypoints'] == 1
+        assert summary['rescored'] == 0
+        assert ai_client['register'] == []
+        assert ai_client['score'] == []
+
+    def test_force_registers_template_once(self, app, db_session, storage, ai_client, assignment, sample_user,
+                                           sample_routine):
+        """force=True chấm lại tất cả, template chỉ đăng ký một lần cho mỗi bài tập"""
+        for _ in range(3):
+            self.store(self.add_video(db_session, assignment, sample_user, sample_routine), '2')
+
+        summary = AIGradingService.rescore_from_keypoints(assignment.assignment_id, force=True, workers=2, app=app)
+
+        assert summary['rescored'] == 3
+        assert len(ai_client['register']) == 1
+        assert all(call['student_fps'] is None for call in ai_client['score'])
+
+    def test_score_error_counts_failed(self, app, db_session, storage, ai_client, assignment, sample_user,
+                                       sample_routine, monkeypatch):
+        """Lỗi chấm một video không dừng cả lượt và không ghi đè manifest"""
+        video = self.add_video(db_session, assignment, sample_user, sample_routine)
+        self.store(video, '1')
+
+        def fail(*args, **kwargs):
+            raise Exception("Failed to score keypoints: 500")
+        monkeypatch.setattr(AIClientService, 'score_keypoints', staticmethod(fail))
+
+        summary = AIGradingService.rescore_from_keypoints(assignment.assignment_id, workers=1, app=app)
+
+        assert summary['failed'] == 1
+        assert storage.manifest(video.video_id)['scorer_version'] == '1'
+
+
+class TestRescoreCli:
+    """Test database/rescore_ai.py"""
+
+    @pytest.fixture
+    def cli(self, monkeypatch):
+        from database import rescore_ai
+        calls = []
+        monkeypatch.setattr(rescore_ai, 'create_app', lambda: 'app')
+        monkeypatch.setattr(AIGradingService, 'rescore_from_keypoints',
+                            staticmethod(lambda **kwargs: calls.append(kwargs) or {}))
+        return rescore_ai, calls
+
+    def test_requires_scope(self, cli, monkeypatch):
+        rescore_ai, calls = cli
+        monkeypatch.setattr(sys, 'argv', ['rescore_ai.py'])
+        with pytest.raises(SystemExit):
+            rescore_ai.run_rescore()
+        assert calls == []
+
+    def test_passes_arguments(self, cli, monkeypatch):
+        rescore_ai, calls = cli
+        monkeypatch.setattr(sys, 'argv', ['rescore_ai.py', '--assignment-id', '5', '--force', '--workers', '3'])
+        rescore_ai.run_rescore()
+        assert calls == [{'assignment_id': 5, 'force': True, 'workers': 3, 'app': 'app'}]
+
+
+class TestAnalyzeFlag:
+    """Test AI_FUSED_ANALYZE"""
+
+    def test_off_by_default(self, monkeypatch):
+        """Mặc định chỉ chấm pose như trước, không nhận diện vũ khí cho bài nộp assignment"""
+        monkeypatch.delenv('AI_FUSED_ANALYZE', raising=False)
+        assert AIGradingService._analyze_enabled() is False
+
+    @pytest.mark.parametrize('value,enabled', [('true', True), ('1', True), ('yes', True), ('false', False)])
+    def test_env_value(self, monkeypatch, value, enabled):
+        monkeypatch.setenv('AI_FUSED_ANALYZE', value)
+        assert AIGradingService._analyze_enabled() is enabled